@@ -0,0 +1,67 @@
+import numpy as np
+import scipy.stats
+
+import microarray_functions as mic_fun
+import randomization_functions as rand_fun
+import zscore_functions as zscore_fun
+import fdr_functions as fdr_fun
+
+# Adaptive number of randomizations per path
+# Trials are run in rounds of trial_batch. After each round, the z-score of every path still being randomized is
+# computed on all its trials so far (see zscore_fun.get_zscores_pvals), and the path is settled (no more trials)
+# when its |z-score| is far enough from the significance cutoff:
+#	| |z| - z_cutoff | > settle_sigma x sqrt((1 + max(|z|, z_cutoff)^2/2) / (trials + 1))
+# The square root is the standard error of a z-score estimated from that many values of a normal distribution, taken
+# at the cutoff for a path below it: the question is whether its z-score could be at the cutoff, not whether it is at
+# its own estimate. With few trials, the Box-Cox z-scores of outlying paths also come out closer to 0 than with
+# many (about 0.2 lower at |z| = 2 with 100 trials), so settle_sigma is best kept at 4 or more.
+# z_cutoff is the z-score of the Benjamini-Hochberg p-value cutoff at qscore_thresh, estimated from the current
+# p-values of all paths (see fdr_fun.get_bh_pval_cutoff). Paths with a NaN z-score are settled at once.
+# Borderline paths keep going until max_trials.
+# No path is settled before min_trials trials: with few trials, neither the z-scores nor the cutoff (which falls back to
+# the strictest BH cutoff, qscore_thresh / number of paths, while no path is significant yet) can be trusted.
+# The actual cost is one of the n + 1 values its z-score is computed on, so |z| is at most n / sqrt(n + 1). While the
+# cutoff is above that, no path can be significant yet, and none is settled as non-significant
+# Every round draws randomized SI values for all genes, whichever paths are left, so the first n trials of a path
+# are the same values a fixed run of n trials with the same seed gives
+
+# Default number of trials every path gets before it can be settled
+ADAPTIVE_MIN_TRIALS = 100
+
+# Returns (costs, num_trials): costs -> array (paths x max_trials), with the randomized cost of every path in
+# the trials it was run for (columns 0 to num_trials - 1) and NaN after that; num_trials -> trials run for every path
+def get_adaptive_randomized_path_costs(G, SI, paths, nw_type, max_trials, trial_batch, qscore_thresh, settle_sigma, rng, workers = 1, min_trials = ADAPTIVE_MIN_TRIALS):
+	num_paths = len(paths)
+	src_rows, dst_rows, incidence = rand_fun.get_path_cost_inputs(G, SI.index, paths)
+	costs = np.full((num_paths, max_trials), np.nan)
+	num_trials = np.zeros(num_paths, dtype = np.int64)
+	pvals = np.full(num_paths, np.nan)
+	active = np.arange(num_paths)
+
+	done_trials = 0
+	while done_trials < max_trials and len(active) > 0:
+		end = min(done_trials + trial_batch, max_trials)
+		randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, end - done_trials, rng)
+		costs[active, done_trials:end] = rand_fun.get_path_costs_from_SI((src_rows, dst_rows, incidence[active]), randomized_SI, nw_type)
+		num_trials[active] = end
+		done_trials = end
+		if done_trials == max_trials:
+			break
+		if done_trials < min_trials:
+			continue
+
+		zscores = zscore_fun.get_zscores_pvals(np.column_stack((paths.costs[active], costs[active, :done_trials])), 'batched', workers)
+		zscore, pvals[active] = zscores[:, 2], zscores[:, 3]
+		pval_cutoff = fdr_fun.get_bh_pval_cutoff(pvals, qscore_thresh)
+		if pval_cutoff == 0: # no path is significant yet: the cutoff is at least as strict as for the top-ranked path
+			pval_cutoff = qscore_thresh / max(1, np.sum(~np.isnan(pvals)))
+		zscore_cutoff = scipy.stats.norm.isf(pval_cutoff/2)
+		std_err = np.sqrt((1 + np.maximum(np.abs(zscore), zscore_cutoff)**2/2) / (done_trials + 1))
+		max_zscore = done_trials / np.sqrt(done_trials + 1)
+		with np.errstate(invalid = 'ignore'):
+			significant = np.abs(zscore) - zscore_cutoff > settle_sigma * std_err
+			non_significant = (zscore_cutoff - np.abs(zscore) > settle_sigma * std_err) & (zscore_cutoff < max_zscore)
+			settled = np.isnan(zscore) | significant | non_significant
+		active = active[~settled]
+		print("After ", done_trials, " trials, ", len(active), " of ", num_paths, " paths are still being randomized")
+	return costs, num_trials
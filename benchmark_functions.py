@@ -0,0 +1,145 @@
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+import graph_functions as graph_fun
+import network_functions as net_fun
+import microarray_functions as mic_fun
+import percentile_functions as perc_fun
+import randomization_functions as rand_fun
+import zscore_functions as zscore_fun
+import fdr_functions as fdr_fun
+import topnet_functions as topnet_fun
+import profile_functions as prof_fun
+
+# Benchmarks of the stages of the activated response pipeline on synthetic data (see benchmark_pipeline.py)
+# Every network size is run as a stage 'nodes_<size>', and its steps as stages nested under it
+# (eg: 'nodes_1000/shortest_paths'), so the results are a profile_functions report and any report can be
+# kept as the baseline of later runs
+
+# Default network sizes (number of nodes)
+BENCHMARK_SIZES = '1000,5000'
+# Synthetic SI values: every gene has a log-normal expression level (log mean SI_LOG_MEAN and sigma SI_LOG_SIGMA),
+# and every sample a log-normal deviation from it (log sigma SI_SAMPLE_LOG_SIGMA). This fraction of them is missing (NaN)
+SI_LOG_MEAN = 5.0
+SI_LOG_SIGMA = 1.5
+SI_SAMPLE_LOG_SIGMA = 0.3
+SI_MISSING_FRACTION = 0.02
+# So that the TopNet is not empty, a connected module of this fraction of the genes is up-regulated in sample S0
+# by SI_ACTIVATED_FOLD
+SI_ACTIVATED_FRACTION = 0.3
+SI_ACTIVATED_FOLD = 8.0
+# A stage is flagged as slower than its baseline when it takes more than (1 + tolerance) times as long,
+# and at least MIN_SLOWDOWN_S seconds more (shorter differences are noise)
+SLOWDOWN_TOLERANCE = 0.2
+MIN_SLOWDOWN_S = 0.05
+
+# Directed scale-free network with num_nodes nodes (networkx's Bollobas et al. model), without
+# parallel edges and self loops. Nodes are named g0, g1, ...
+def get_scale_free_network(num_nodes, seed):
+	nw = nx.DiGraph(nx.scale_free_graph(num_nodes, seed = seed))
+	nw.remove_edges_from(list(nx.selfloop_edges(nw)))
+	return nx.relabel_nodes(nw, {node: 'g' + str(node) for node in nw.nodes()})
+
+# Synthetic microarray data for the genes of nw, as read by mic_fun.read_SI: indexed by gene, columns S0 to S<num_samples - 1>
+# S0 is the perturbed sample: the genes first reached by a breadth-first search (ignoring edge directions) from a
+# random gene are up-regulated in it (see SI_ACTIVATED_FRACTION). The search runs on an undirected copy of nw, as the
+# undirected view of networkx lists neighbours in set order, which changes from run to run with string hashing
+def get_synthetic_SI(nw, num_samples, rng, missing_fraction = SI_MISSING_FRACTION):
+	genes = list(nw.nodes())
+	values = rng.lognormal(SI_LOG_MEAN, SI_LOG_SIGMA, (len(genes), 1)) * rng.lognormal(0.0, SI_SAMPLE_LOG_SIGMA, (len(genes), num_samples))
+	module = list(nx.bfs_tree(nw.to_undirected(), genes[rng.integers(len(genes))]))[:int(SI_ACTIVATED_FRACTION*len(genes))]
+	gene_rows = {gene: row for row, gene in enumerate(genes)}
+	values[[gene_rows[gene] for gene in module], 0] *= SI_ACTIVATED_FOLD
+	values[rng.random(values.shape) < missing_fraction] = np.nan
+	return pd.DataFrame(values, index = pd.Index(genes, name = 'gene'), columns = ['S' + str(i) for i in range(num_samples)])
+
+# Write the network and SI files of a benchmark, in the formats the PathExt scripts read
+def write_benchmark_data(data_dir, nw, SI):
+	os.makedirs(data_dir, exist_ok = True)
+	nw_fname = os.path.join(data_dir, 'network_' + str(nw.number_of_nodes()) + '.txt')
+	SI_fname = os.path.join(data_dir, 'SI_' + str(nw.number_of_nodes()) + '.txt')
+	nx.write_edgelist(nw, nw_fname, delimiter = '\t', data = False)
+	SI.to_csv(SI_fname, sep = '\t')
+	print("Wrote benchmark network to ", nw_fname, " and microarray data to ", SI_fname)
+
+# Run every step of the activated response pipeline on a synthetic network of num_nodes nodes, each as a stage
+# Samples S0 and S1 are the perturbed and control samples, the others are the other perturbations
+# The steps are those of activated_response_Pijs.py (with output=npz), fdr_rand_pijs_boxcox.py,
+# benjamini_hochberg_boxcox.py and extract_fdr_network.py, run on arrays in memory (no file is written or read)
+# plus the networkx network builder and the replicate shuffling of the multi-sample randomizations
+# percentile_mode -> as for perc_fun.get_sp_paths_percentile_norm_cost. streaming or bounded are needed for the
+# largest networks, whose shortest paths do not all fit in memory
+def run_benchmark(num_nodes, num_samples, num_trials, percentile, path_length_thresh, qscore_thresh, seed, workers = 1, percentile_mode = 'in_memory', data_dir = None):
+	rng = np.random.default_rng(seed)
+	with prof_fun.stage('generate') as record:
+		nw = get_scale_free_network(num_nodes, seed)
+		SI = get_synthetic_SI(nw, num_samples, rng)
+		record['items'] = nw.number_of_edges()
+	print("Generated network with ", nw.number_of_nodes(), " nodes and ", nw.number_of_edges(), " edges")
+	if data_dir is not None:
+		write_benchmark_data(data_dir, nw, SI)
+
+	SI_relevant = mic_fun.get_relevant_SI(SI)
+	with prof_fun.stage('networkx_network') as record:
+		record['items'] = net_fun.get_activated_response_network(SI_relevant, nw).number_of_edges()
+	with prof_fun.stage('response_network') as record:
+		G_response = graph_fun.CompactGraph.from_networkx(nw).get_weighted_graph(SI_relevant, 'activated_response')
+		SI = SI.loc[G_response.get_active_node_names()]
+		record['items'] = G_response.edge_mask().sum()
+
+	# Stages shortest_paths and percentile_selection (or shortest_paths_percentile), see perc_fun.get_sp_paths_percentile_norm_cost
+	paths = perc_fun.get_sp_paths_percentile_norm_cost(G_response, percentile, path_length_thresh, 'dijkstra', workers, percentile_mode)
+	print("Kept ", len(paths), " shortest paths")
+
+	with prof_fun.stage('randomize') as record:
+		randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, num_trials, rng)
+		record['items'] = randomized_SI.size
+	with prof_fun.stage('shuffle_replicates') as record:
+		record['items'] = mic_fun.shuffle_disease_healthy_trials(SI.to_numpy(dtype = float), num_trials, rng).size
+	with prof_fun.stage('randomized_path_costs') as record:
+		randomized_costs = rand_fun.get_randomized_path_costs(G_response, randomized_SI, SI.index, paths, 'activated_response')
+		record['items'] = randomized_costs.size
+	randomized_SI = None
+
+	with prof_fun.stage('zscores') as record:
+		zscores = zscore_fun.get_zscores_pvals(np.column_stack((paths.costs, randomized_costs)), 'batched', workers)
+		record['items'] = randomized_costs.size
+	randomized_costs = None
+	with prof_fun.stage('bh') as record:
+		tested, reject, bh_pvals = fdr_fun.get_bh_corrected_pvals(zscores[:, 2], zscores[:, 3], qscore_thresh)
+		record['items'] = tested.sum()
+	with prof_fun.stage('topnet') as record:
+		significant = np.flatnonzero(tested)[bh_pvals <= qscore_thresh]
+		support = topnet_fun.get_edge_support(G_response, paths.subset(significant))
+		record['items'] = (support > 0).sum()
+	print("Got ", len(significant), " significant paths and ", (support > 0).sum(), " edges in TopNet")
+
+# Wall time of every stage of a report written by prof_fun.write_report, keyed by stage name
+def read_stage_times(report_fname):
+	with open(report_fname) as f:
+		report = json.load(f)
+	return {record['name']: record['wall_time_s'] for record in report['stages']}
+
+# Compare the stage times of the current run (prof_fun.stages) with those of a baseline report
+# Returns a list of (stage name, baseline time, current time, slower) for the stages found in both
+def compare_with_baseline(baseline_fname, tolerance = SLOWDOWN_TOLERANCE, min_slowdown = MIN_SLOWDOWN_S):
+	baseline_times = read_stage_times(baseline_fname)
+	comparison = []
+	for record in prof_fun.stages:
+		if record['name'] not in baseline_times:
+			continue
+		baseline_time = baseline_times[record['name']]
+		current_time = record['wall_time_s']
+		slower = current_time > baseline_time*(1 + tolerance) and current_time - baseline_time >= min_slowdown
+		comparison.append((record['name'], baseline_time, current_time, slower))
+	return comparison
+
+def print_comparison(comparison):
+	print("stage\tbaseline_s\tcurrent_s\tratio\tslower")
+	for name, baseline_time, current_time, slower in comparison:
+		ratio = current_time/baseline_time if baseline_time > 0 else np.inf
+		print(name + "\t" + "{:.3f}\t{:.3f}\t{:.2f}".format(baseline_time, current_time, ratio) + ("\tSLOWER" if slower else ""))
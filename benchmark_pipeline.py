@@ -0,0 +1,50 @@
+import sys
+
+import benchmark_functions as bench_fun
+import option_functions as opt_fun
+import profile_functions as prof_fun
+import percentile_functions as perc_fun
+
+if len(sys.argv) < 2:
+	print("argv[1] = output file for the benchmark report (JSON, as written by the profile option of the other scripts)")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("sizes = comma separated numbers of nodes of the synthetic scale-free networks (default " + bench_fun.BENCHMARK_SIZES + ")")
+	print("samples = number of samples of the synthetic microarray data (default 8)")
+	print("trials = number of randomizations (default 100)")
+	print("percentile = percentile threshold (default 90)")
+	print("path_length = path length threshold (default 2)")
+	print("qscore = q-score cutoff of the TopNet (default 0.05)")
+	print("seed = seed of the synthetic data and of the randomizations (default 1)")
+	print("workers = number of processes for the shortest path search and the z-scores (default 1)")
+	print("percentile_mode = in_memory, streaming or bounded, as for the Pij scripts (default in_memory, use streaming or bounded for the largest networks)")
+	print("data_dir = folder to write the synthetic network and microarray files to, to run the scripts on them (default: not written)")
+	print("baseline = report of an earlier benchmark to compare the stage times with")
+	print("tolerance = a stage is flagged as slower when it takes more than (1 + tolerance) times its baseline time, and at least " + str(bench_fun.MIN_SLOWDOWN_S) + " s more (default " + str(bench_fun.SLOWDOWN_TOLERANCE) + ")")
+	print("cprofile_stage = name of a stage to run under cProfile, as named in the report (eg: nodes_1000/shortest_paths)")
+	print("Exits with status 2 if a stage is slower than its baseline")
+	sys.exit(1)
+
+# Set inputs
+report_fname = sys.argv[1]
+options = opt_fun.parse_options(sys.argv[2:], {'sizes': bench_fun.BENCHMARK_SIZES, 'samples': 8, 'trials': 100, 'percentile': 90.0, 'path_length': 2, 'qscore': 0.05, 'seed': 1, 'workers': 1, 'percentile_mode': 'in_memory', 'data_dir': None, 'baseline': None, 'tolerance': bench_fun.SLOWDOWN_TOLERANCE, 'cprofile_stage': None})
+opt_fun.check_choice(options, 'percentile_mode', perc_fun.PERCENTILE_MODES)
+sizes = [int(size) for size in options['sizes'].split(',')]
+prof_fun.init_profiling(report_fname, options['cprofile_stage'])
+
+# Run the benchmark on every network size
+for num_nodes in sizes:
+	print("######################## ", num_nodes, " nodes ########################")
+	with prof_fun.stage('nodes_' + str(num_nodes)) as record:
+		bench_fun.run_benchmark(num_nodes, options['samples'], options['trials'], options['percentile'], options['path_length'], options['qscore'], options['seed'], options['workers'], options['percentile_mode'], options['data_dir'])
+		record['items'] = num_nodes
+prof_fun.write_report()
+
+# Compare with the baseline
+if options['baseline'] is not None:
+	comparison = bench_fun.compare_with_baseline(options['baseline'], options['tolerance'])
+	bench_fun.print_comparison(comparison)
+	slower_stages = [name for name, baseline_time, current_time, slower in comparison if slower]
+	if slower_stages:
+		print(len(slower_stages), " stages are slower than in ", options['baseline'], ": ", ", ".join(slower_stages))
+		sys.exit(2)
+	print("No stage is slower than in ", options['baseline'])
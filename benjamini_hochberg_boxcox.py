@@ -1,46 +1,47 @@
-import pandas as pd
-import statsmodels.stats.multitest as bh
 import sys
 
-if len(sys.argv) != 4:
+import fdr_functions as fdr_fun
+import option_functions as opt_fun
+import profile_functions as prof_fun
+
+if len(sys.argv) < 4:
 	print("argv[1] = file with i#j and z-score p-values")
 	print("argv[2] = alpha value (family-wise error rate)")
 	print("argv[3] = output file")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("sidecar = 1 to also write <output file>" + fdr_fun.BH_SIDECAR_SUFFIX + ", which extract_fdr_network.py reads instead of parsing the output file, 0 not to (default 1)")
+	print("profile = JSON file for a report of the wall time, peak memory and item counts of every stage (default: no report)")
+	print("cprofile_stage = name of a stage to run under cProfile, as named in the report (eg: write_bh)")
 	sys.exit(1)
 
 # Set inputs
 zscore_pvals_fname = sys.argv[1]
 alpha_val = float(sys.argv[2])
 out_fname = sys.argv[3]
+options = opt_fun.parse_options(sys.argv[4:], {'sidecar': True, 'profile': None, 'cprofile_stage': None})
+prof_fun.init_profiling(options['profile'], options['cprofile_stage'])
 
 # Read z-scores and corresponding p-values
-zscore_pvals = pd.read_table(zscore_pvals_fname)
-zscore_pvals.columns = ('ij', 'normaltest_before_boxcox', 'normaltest_after_boxcox', 'zscore_after_boxcox', 'two_sided_pval_for_zscore')
-zscore_pvals = zscore_pvals.drop(['normaltest_before_boxcox', 'normaltest_after_boxcox'], axis = 1)
-zscore_pvals = zscore_pvals.set_index(zscore_pvals.columns.values[0])
-zscore_pvals = zscore_pvals.dropna()
-print(zscore_pvals.head())
+# Only the path, z-score and p-value columns are parsed
+with prof_fun.stage('read_zscores') as record:
+	path_strings, zscores, pvals = fdr_fun.read_zscores(zscore_pvals_fname)
+	record['items'] = len(path_strings)
+print("Read z-scores of ", len(path_strings), " paths")
 print("Done reading input file")
-print("After dropping nans, shape of dataframe is ", zscore_pvals.shape)
 
 # Carry out Benjamini-Hochberg p-value correction
-bh_output = bh.multipletests(zscore_pvals['two_sided_pval_for_zscore'], alpha = alpha_val, method = 'fdr_bh')
-reject = bh_output[0]
-bh_pval = bh_output[1]
+# Rows with a NaN z-score or p-value are dropped
+with prof_fun.stage('bh') as record:
+	tested, reject, bh_pval = fdr_fun.get_bh_corrected_pvals(zscores, pvals, alpha_val)
+	record['items'] = tested.sum()
+print("After dropping nans, ", int(tested.sum()), " paths are tested")
 print("Done with BH test")
 
 # Print output
-with open(out_fname, 'w') as f:
-	f.write("i#j" + "\t")
-	f.write("zscore_after_boxcox" + "\t")
-	f.write("zscore_pval" + "\t")
-	f.write("bh_corrected_pval" + "\t")
-	f.write("reject" + "\n")
-	index = 0
-	for row in zscore_pvals.itertuples():
-		f.write(row[0] + "\t")
-		f.write(str(row[1]) + "\t")
-		f.write(str(row[2]) + "\t")
-		f.write(str(bh_pval[index]) + "\t")
-		f.write(str(reject[index]) + "\n")
-		index += 1
+with prof_fun.stage('write_bh'):
+	tested_paths = path_strings[tested]
+	fdr_fun.write_bh_output(out_fname, tested_paths, zscores[tested], pvals[tested], bh_pval, reject)
+	if options['sidecar']:
+		fdr_fun.write_bh_sidecar(out_fname, tested_paths, bh_pval)
+
+prof_fun.write_report()
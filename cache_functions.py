@@ -0,0 +1,55 @@
+import hashlib
+import os
+
+import numpy as np
+
+# Inputs that are re-read by every run (the unweighted network, the microarray data) are cached as .npz files
+# of preprocessed arrays. A cache file is keyed by the SHA-256 of the input file's contents and by CACHE_FORMAT_VERSION,
+# so an edited input is parsed again, and a cache file is reused for any copy of the same input
+# By default, cache files go to a folder named CACHE_DIR_NAME next to the input file
+CACHE_DIR_NAME = '.pathext_cache'
+
+# Version of the preprocessed arrays, part of every cache file name. Bump it when the way an input is parsed or
+# the arrays stored for it change, so that cache files written by earlier versions are not reused
+CACHE_FORMAT_VERSION = 1
+
+# Input files are hashed this many bytes at a time
+HASH_BLOCK_SIZE = 2**20
+
+def get_file_hash(fname):
+	file_hash = hashlib.sha256()
+	with open(fname, 'rb') as f:
+		for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+			file_hash.update(block)
+	return file_hash.hexdigest()
+
+# Cache file for the input file fname, holding the data of the given kind (eg: 'network')
+def get_cache_fname(fname, kind, cache_dir = None):
+	if cache_dir is None:
+		cache_dir = os.path.join(os.path.dirname(os.path.abspath(fname)), CACHE_DIR_NAME)
+	return os.path.join(cache_dir, kind + '_v' + str(CACHE_FORMAT_VERSION) + '_' + get_file_hash(fname) + '.npz')
+
+# Return a dict of the arrays in the cache file, or None if there is no (readable) cache file
+def read_cache(cache_fname):
+	if not os.path.isfile(cache_fname):
+		return None
+	try:
+		with np.load(cache_fname, allow_pickle = False) as cache_file:
+			return {key: cache_file[key] for key in cache_file.files}
+	except (OSError, ValueError) as e:
+		print("Could not read cache file ", cache_fname, ": ", e)
+		return None
+
+# Write the arrays to the cache file. The file is written under a temporary name and then renamed,
+# so concurrent runs never read a partly written file. Failing to write the cache is not an error
+def write_cache(cache_fname, **arrays):
+	temp_fname = cache_fname + '.' + str(os.getpid()) + '.tmp'
+	try:
+		os.makedirs(os.path.dirname(cache_fname), exist_ok = True)
+		with open(temp_fname, 'wb') as f:
+			np.savez(f, **arrays)
+		os.replace(temp_fname, cache_fname)
+	except OSError as e:
+		print("Could not write cache file ", cache_fname, ": ", e)
+		if os.path.exists(temp_fname):
+			os.remove(temp_fname)
@@ -0,0 +1,75 @@
+import sys
+
+import networkx as nx
+import numpy as np
+
+import benchmark_functions as bench_fun
+import graph_functions as graph_fun
+import microarray_functions as mic_fun
+import option_functions as opt_fun
+import percentile_functions as perc_fun
+import randomization_functions as rand_fun
+import adaptive_functions as adapt_fun
+import zscore_functions as zscore_fun
+import fdr_functions as fdr_fun
+
+# Regression check of randomization=adaptive against a fixed number of randomizations: both runs draw the same trials
+# (same seed), and the paths significant at the q-score cutoff (Benjamini-Hochberg) must be the same, on the activated
+# response paths of a network with synthetic microarray data (see bench_fun.get_synthetic_SI)
+
+if len(sys.argv) < 2:
+	print("argv[1] = unweighted (directed) network file (eg: test_data/small_Mtb_network.txt)")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("trials = number of randomizations of the fixed run, and largest number of randomizations of a path in the adaptive run (default 1000)")
+	print("trial_batch = number of randomizations per round of the adaptive run (default 100)")
+	print("min_trials = number of randomizations every path gets in the adaptive run before it can be settled (default " + str(adapt_fun.ADAPTIVE_MIN_TRIALS) + ")")
+	print("qscore = q-score cutoff (default 0.05)")
+	print("settle_sigma = settle_sigma of the adaptive run, see activated_response_Pijs.py (default 4)")
+	print("samples = number of samples of the synthetic microarray data (default 8)")
+	print("percentile = percentile threshold (default 90)")
+	print("path_length = path length threshold (default 2)")
+	print("seed = seed of the synthetic data and of the randomizations (default 1)")
+	print("Exits with status 2 if the runs find different significant paths")
+	sys.exit(1)
+
+# Paths significant at qscore_thresh, from the randomized costs of the paths (num_trials -> see zscore_fun.get_zscores_pvals)
+def get_significant_paths(paths, randomized_costs, qscore_thresh, num_trials = None):
+	zscores = zscore_fun.get_zscores_pvals(np.column_stack((paths.costs, randomized_costs)), 'batched', 1, num_trials)
+	tested, reject, bh_pvals = fdr_fun.get_bh_corrected_pvals(zscores[:, 2], zscores[:, 3], qscore_thresh)
+	return np.flatnonzero(tested)[bh_pvals <= qscore_thresh]
+
+# Set inputs
+unweighted_nw_fname = sys.argv[1]
+options = opt_fun.parse_options(sys.argv[2:], {'trials': 1000, 'trial_batch': 100, 'min_trials': adapt_fun.ADAPTIVE_MIN_TRIALS, 'qscore': 0.05, 'settle_sigma': 4.0, 'samples': 8, 'percentile': 90.0, 'path_length': 2, 'seed': 1})
+rng = np.random.default_rng(options['seed'])
+
+# Top paths of the activated response network
+nw = nx.read_edgelist(unweighted_nw_fname, delimiter = "\t", nodetype = str, create_using = nx.DiGraph())
+SI = bench_fun.get_synthetic_SI(nw, options['samples'], rng)
+G_unweighted = graph_fun.CompactGraph.from_networkx(nw)
+G_response = G_unweighted.get_weighted_graph(mic_fun.get_relevant_SI(SI), 'activated_response')
+SI = SI.loc[G_response.get_active_node_names()]
+paths = perc_fun.get_sp_paths_percentile_norm_cost(G_response, options['percentile'], options['path_length'])
+
+# Both runs start from the same generator state, so they draw the same trials
+state = rng.bit_generator.state
+randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, options['trials'], rng)
+fixed_costs = rand_fun.get_randomized_path_costs(G_unweighted, randomized_SI, SI.index, paths, 'activated_response')
+del randomized_SI
+rng.bit_generator.state = state
+adaptive_costs, num_trials = adapt_fun.get_adaptive_randomized_path_costs(G_unweighted, SI, paths, 'activated_response', options['trials'], options['trial_batch'], options['qscore'], options['settle_sigma'], rng, 1, options['min_trials'])
+print("The adaptive run scored ", num_trials.sum(), " (path, trial) pairs instead of ", len(paths) * options['trials'])
+
+# Compare the significant paths
+fixed_significant = get_significant_paths(paths, fixed_costs, options['qscore'])
+adaptive_significant = get_significant_paths(paths, adaptive_costs, options['qscore'], num_trials)
+different = np.setxor1d(fixed_significant, adaptive_significant)
+print(len(fixed_significant), " of ", len(paths), " paths are significant with ", options['trials'], " randomizations, ", len(adaptive_significant), " with adaptive randomizations")
+if len(different) > 0:
+	print("path\tfixed\tadaptive\tadaptive_trials")
+	path_strings = paths.subset(different).get_path_strings()
+	for path_string, k in zip(path_strings, different):
+		print(path_string + "\t" + str(k in fixed_significant) + "\t" + str(k in adaptive_significant) + "\t" + str(num_trials[k]))
+	print(len(different), " paths are significant in only one of the runs")
+	sys.exit(2)
+print("Both runs find the same significant paths")
@@ -0,0 +1,56 @@
+import sys
+
+import networkx as nx
+import numpy as np
+
+import benchmark_functions as bench_fun
+import graph_functions as graph_fun
+import microarray_functions as mic_fun
+import option_functions as opt_fun
+import percentile_functions as perc_fun
+import randomization_functions as rand_fun
+import zscore_functions as zscore_fun
+
+# Regression check of the batched Box-Cox z-scores (fdr_rand_pijs_boxcox.py zscores=batched, the default) against
+# the per-row ones (zscores=per_row, one scipy.stats.boxcox call per path), on the activated response paths of a
+# network with synthetic microarray data (see bench_fun.get_synthetic_SI)
+
+if len(sys.argv) < 2:
+	print("argv[1] = unweighted (directed) network file (eg: test_data/small_Mtb_network.txt)")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("paths = number of top paths to compare the z-scores of, picked at random (default 200)")
+	print("trials = number of randomizations (default 100)")
+	print("samples = number of samples of the synthetic microarray data (default 8)")
+	print("percentile = percentile threshold (default 90)")
+	print("path_length = path length threshold (default 2)")
+	print("seed = seed of the synthetic data and of the randomizations (default 1)")
+	print("tolerance = largest difference accepted between the two methods, in every column of the z-score file (default " + str(zscore_fun.ZSCORE_METHODS_TOLERANCE) + ")")
+	print("Exits with status 2 if the methods differ by more than the tolerance")
+	sys.exit(1)
+
+# Set inputs
+unweighted_nw_fname = sys.argv[1]
+options = opt_fun.parse_options(sys.argv[2:], {'paths': 200, 'trials': 100, 'samples': 8, 'percentile': 90.0, 'path_length': 2, 'seed': 1, 'tolerance': zscore_fun.ZSCORE_METHODS_TOLERANCE})
+rng = np.random.default_rng(options['seed'])
+
+# Top paths of the activated response network, and their cost in every randomized network
+nw = nx.read_edgelist(unweighted_nw_fname, delimiter = "\t", nodetype = str, create_using = nx.DiGraph())
+SI = bench_fun.get_synthetic_SI(nw, options['samples'], rng)
+G_unweighted = graph_fun.CompactGraph.from_networkx(nw)
+G_response = G_unweighted.get_weighted_graph(mic_fun.get_relevant_SI(SI), 'activated_response')
+SI = SI.loc[G_response.get_active_node_names()]
+paths = perc_fun.get_sp_paths_percentile_norm_cost(G_response, options['percentile'], options['path_length'])
+paths = paths.subset(np.sort(rng.choice(len(paths), min(options['paths'], len(paths)), replace = False)))
+randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, options['trials'], rng)
+randomized_costs = rand_fun.get_randomized_path_costs(G_unweighted, randomized_SI, SI.index, paths, 'activated_response')
+print("Comparing the z-scores of ", len(paths), " paths with ", options['trials'], " randomizations")
+
+# Compare the two methods
+max_differences = zscore_fun.compare_zscore_methods(np.column_stack((paths.costs, randomized_costs)))
+print("column\tmax_difference")
+for column, max_difference in zip(zscore_fun.ZSCORE_COLUMNS, max_differences):
+	print(column + "\t" + "{:.3g}".format(max_difference) + ("\tDIFFERENT" if max_difference > options['tolerance'] else ""))
+if np.any(max_differences > options['tolerance']):
+	print("The batched and per-row z-scores differ by more than ", options['tolerance'])
+	sys.exit(2)
+print("The batched and per-row z-scores agree to within ", options['tolerance'])
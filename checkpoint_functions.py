@@ -0,0 +1,98 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+import microarray_functions as mic_fun
+import randomization_functions as rand_fun
+
+# Checkpoints of the randomizations of the Pij scripts (activated/repressed_response_Pijs.py, checkpoint option)
+# Trials are run in chunks. After every chunk, its (paths x trials) randomized costs are written to a chunk file
+# <checkpoint>.trials_<start>_<end>.npy, and then the checkpoint file (.npz) is written with:
+# state -> state of the random number generator (rng.bit_generator.state, as JSON) after the completed trials
+# completed_trials -> number of completed trials, chunk_ends -> last trial (excluded) of every chunk file
+# actual, num_trials, nw_type, seed, seeding -> the run the checkpoint belongs to, checked when resuming. The generator
+# state is restored from the checkpoint, so resuming with another seed would silently give the values of the first one
+# Every file is written next to its final name and renamed over it (os.replace), so a run stopped at any point
+# leaves either the previous or the new checkpoint, never a partial one (at worst, a chunk file the checkpoint does not list yet)
+# A resumed run restores the generator state and starts at the first trial not completed. Trials are drawn one
+# after the other (see mic_fun.get_randomized_single_sample_mult_pert_trials), so the values, and the output, are
+# bit-identical to those of a run which was not stopped
+
+# Default number of trials between checkpoints
+CHECKPOINT_TRIALS = 100
+
+# Write fname through a temporary file, renamed over it once complete. write_file is called with the open file
+def write_atomically(fname, write_file):
+	tmp_fname = fname + '.tmp'
+	with open(tmp_fname, 'wb') as f:
+		write_file(f)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp_fname, fname)
+
+def get_chunk_fname(checkpoint_fname, start, end):
+	return checkpoint_fname + '.trials_' + str(start) + '_' + str(end) + '.npy'
+
+# Write the randomized costs of trials start to end (chunk_costs, paths x (end - start)), then the checkpoint
+# chunk_ends -> last trial (excluded) of every chunk written so far, including this one
+# seed, seeding -> seed and seeding mode of the run (seed and seeding options of the Pij scripts)
+def write_checkpoint(checkpoint_fname, rng, chunk_ends, chunk_costs, actual_costs, num_trials, nw_type, seed, seeding):
+	start = chunk_ends[-2] if len(chunk_ends) > 1 else 0
+	write_atomically(get_chunk_fname(checkpoint_fname, start, chunk_ends[-1]), lambda f: np.save(f, chunk_costs))
+	write_atomically(checkpoint_fname, lambda f: np.savez(f, state = np.array(json.dumps(rng.bit_generator.state)), completed_trials = np.array(chunk_ends[-1]), chunk_ends = np.array(chunk_ends), actual = actual_costs, num_trials = np.array(num_trials), nw_type = np.array(nw_type), seed = np.array(seed), seeding = np.array(seeding)))
+
+# Read a checkpoint written by write_checkpoint for the same run (same actual path costs, number of trials, network type,
+# seed and seeding mode)
+# Returns (generator state, chunk ends, randomized costs (paths x completed trials)), or None if there is no checkpoint file
+# Raises ValueError if the checkpoint is from a different run
+def read_checkpoint(checkpoint_fname, actual_costs, num_trials, nw_type, seed, seeding):
+	if not os.path.exists(checkpoint_fname):
+		return None
+	with np.load(checkpoint_fname) as checkpoint:
+		if str(checkpoint['nw_type']) != nw_type or int(checkpoint['num_trials']) != num_trials or not np.array_equal(checkpoint['actual'], actual_costs):
+			raise ValueError("Checkpoint file " + checkpoint_fname + " is from a different run (network type, number of trials or paths differ), remove it to start again")
+		if 'seed' not in checkpoint or int(checkpoint['seed']) != seed or str(checkpoint['seeding']) != seeding:
+			raise ValueError("Checkpoint file " + checkpoint_fname + " is from a different run (seed or seeding differ), remove it to start again")
+		state = json.loads(str(checkpoint['state']))
+		chunk_ends = checkpoint['chunk_ends'].tolist()
+	chunk_starts = [0] + chunk_ends[:-1]
+	randomized_costs = np.empty((len(actual_costs), chunk_ends[-1] if chunk_ends else 0))
+	for start, end in zip(chunk_starts, chunk_ends):
+		randomized_costs[:, start:end] = np.load(get_chunk_fname(checkpoint_fname, start, end))
+	return state, chunk_ends, randomized_costs
+
+# Remove the checkpoint file, its chunk files and any temporary file left by a stopped run
+def remove_checkpoint(checkpoint_fname):
+	for fname in glob.glob(glob.escape(checkpoint_fname) + '.trials_*') + [checkpoint_fname, checkpoint_fname + '.tmp']:
+		if os.path.exists(fname):
+			os.remove(fname)
+
+# Same values as rand_fun.get_randomized_path_costs on mic_fun.get_randomized_single_sample_mult_pert_trials(SI, num_trials, rng),
+# computed checkpoint_trials trials at a time, with a checkpoint after every chunk
+# seed, seeding -> what rng was created from, saved with the checkpoint (see write_checkpoint)
+# If checkpoint_fname holds a checkpoint of the same run, the run resumes from it (and rng is set to its state)
+# Returns the randomized costs (paths x num_trials)
+def get_checkpointed_randomized_path_costs(G, SI, paths, nw_type, num_trials, rng, seed, seeding, checkpoint_fname, checkpoint_trials = CHECKPOINT_TRIALS):
+	randomized_costs = np.empty((len(paths), num_trials))
+	chunk_ends = []
+	checkpoint = read_checkpoint(checkpoint_fname, paths.costs, num_trials, nw_type, seed, seeding)
+	if checkpoint is not None:
+		state, chunk_ends, completed_costs = checkpoint
+		rng.bit_generator.state = state
+		randomized_costs[:, :completed_costs.shape[1]] = completed_costs
+		print("Resuming from checkpoint ", checkpoint_fname, " after ", completed_costs.shape[1], " trials")
+
+	path_cost_inputs = rand_fun.get_path_cost_inputs(G, SI.index, paths)
+	checkpoint_trials = max(1, checkpoint_trials)
+	completed_trials = chunk_ends[-1] if chunk_ends else 0
+	while completed_trials < num_trials:
+		end = min(completed_trials + checkpoint_trials, num_trials)
+		randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, end - completed_trials, rng)
+		randomized_costs[:, completed_trials:end] = rand_fun.get_path_costs_from_SI(path_cost_inputs, randomized_SI, nw_type)
+		chunk_ends.append(end)
+		write_checkpoint(checkpoint_fname, rng, chunk_ends, randomized_costs[:, completed_trials:end], paths.costs, num_trials, nw_type, seed, seeding)
+		completed_trials = end
+		print("Completed ", completed_trials, " trials, wrote checkpoint ", checkpoint_fname)
+	return randomized_costs
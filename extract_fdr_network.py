@@ -1,59 +1,58 @@
 import networkx as nx
-import csv
 import sys
-import pandas as pd
 
-def get_edges_in_path(path, G):
-	edges_in_path = set()
-	for i in range(len(path) - 1):
-		edges_in_path.add((path[i], path[i+1], G[path[i]][path[i+1]]['weight']))
-	return edges_in_path
+import graph_functions as graph_fun
+import topnet_functions as topnet_fun
+import fdr_functions as fdr_fun
+import option_functions as opt_fun
+import profile_functions as prof_fun
 
-if len(sys.argv) != 5:
+if len(sys.argv) < 5:
 	print("argv[1] = response network (weighted)")
 	print("argv[2] = pij file with zscore p-values and BH correction")
 	print("argv[3] = q-score cutoff")
 	print("argv[4] = output file")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("support = output file for the number of significant paths through every TopNet edge (node1, node2, weight, support)")
+	print("profile = JSON file for a report of the wall time, peak memory and item counts of every stage (default: no report)")
+	print("cprofile_stage = name of a stage to run under cProfile, as named in the report (eg: topnet)")
 	sys.exit(1)
 
 nw_fname = sys.argv[1]
 zscores_fname = sys.argv[2]
 pval_cutoff = float(sys.argv[3])
 out_fname = sys.argv[4]
+options = opt_fun.parse_options(sys.argv[5:], {'support': None, 'profile': None, 'cprofile_stage': None})
+prof_fun.init_profiling(options['profile'], options['cprofile_stage'])
 
 # Read response network
-G_response = nx.read_weighted_edgelist(nw_fname, delimiter = "\t", create_using = nx.DiGraph())
-print("Got response network with ", len(G_response.nodes()), " nodes and ", len(G_response.edges()), " edges")
+with prof_fun.stage('read_network') as record:
+	G_response = nx.read_weighted_edgelist(nw_fname, delimiter = "\t", create_using = nx.DiGraph())
+	print("Got response network with ", len(G_response.nodes()), " nodes and ", len(G_response.edges()), " edges")
+	G_response = graph_fun.CompactGraph.from_weighted_networkx(G_response)
+	record['items'] = G_response.number_of_edges()
 
 # Read zscores file
 # Only retain information where BH-adjusted p-value < threshold
-significant_paths = set() # node1#node2#...#nodek
-with open(zscores_fname) as f:
-	reader = csv.reader(f, delimiter = "\t")
-	next(reader) # skip header
-	for row in reader:
-		if row[3] == 'NA':
-			continue
-		path_str = row[0]
-		BH_pval = float(row[3])
-		zscore = float(row[1])
-		if BH_pval <= pval_cutoff: #and zscore < 0: # actual Pij < randomised Pij
-			significant_paths.add(path_str)
+# The sidecar file written by benjamini_hochberg_boxcox.py is used when there is one (see fdr_fun.read_significant_paths)
+with prof_fun.stage('read_significant_paths') as record:
+	significant_paths = set(fdr_fun.read_significant_paths(zscores_fname, pval_cutoff)) # node1#node2#...#nodek
+	record['items'] = len(significant_paths)
 print(len(significant_paths), " node pairs have significant zscores")
 
 ################ Make a network with the edges involved in the paths Pij
 
-# Get edges in the significant paths
-topnet_edges = set()
-for path_str in significant_paths:
-	path = path_str.split('#')
-	topnet_edges = topnet_edges.union(get_edges_in_path(path, G_response))
-print("Got ", len(topnet_edges), " edges in TopNet")
+# Get edges in the significant paths, with the number of significant paths through each of them
+with prof_fun.stage('topnet') as record:
+	support = topnet_fun.get_edge_support_from_path_strings(G_response, significant_paths)
+	record['items'] = (support > 0).sum()
+print("Got ", (support > 0).sum(), " edges in TopNet")
 
 # Write edges in significant paths
-with open(out_fname, 'w') as outfile:
-	for edge in topnet_edges:
-		outfile.write( edge[0] + "\t" )
-		outfile.write( edge[1] + "\t" )
-		outfile.write( str(edge[2]) + "\n" )
+with prof_fun.stage('write_topnet'):
+	topnet_fun.write_topnet(G_response, support, out_fname)
+	if options['support'] is not None:
+		topnet_fun.write_edge_support(G_response, support, options['support'])
 print("Done writing TopNet")
+
+prof_fun.write_report()
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pandas as pd
+import statsmodels.stats.multitest as bh
+
+# benjamini_hochberg_boxcox.py writes, next to its text output, a sidecar .npz file with the columns
+# extract_fdr_network.py needs (path strings and BH-corrected p-values), so the text file is only parsed once
+# Path strings are stored as one utf-8 encoded block, separated by newlines
+BH_SIDECAR_SUFFIX = '.npz'
+
+# Benjamini-Hochberg correction of the z-score p-values of paths, as in benjamini_hochberg_boxcox.py
+# zscores, pvals -> arrays (paths). Paths with a NaN z-score or p-value are left out of the correction
+# Returns (tested, reject, bh_pvals): tested -> boolean array (paths), True for the paths kept for the test
+# reject and bh_pvals -> arrays over the tested paths, in the same order
+def get_bh_corrected_pvals(zscores, pvals, alpha_val):
+	tested = ~np.isnan(zscores) & ~np.isnan(pvals)
+	if not np.any(tested):
+		return tested, np.zeros(0, dtype = bool), np.zeros(0)
+	bh_output = bh.multipletests(pvals[tested], alpha = alpha_val, method = 'fdr_bh')
+	return tested, bh_output[0], bh_output[1]
+
+# Largest p-value rejected by the Benjamini-Hochberg procedure at alpha_val (0 if no p-value is rejected)
+# NaN p-values are left out
+def get_bh_pval_cutoff(pvals, alpha_val):
+	pvals = np.sort(pvals[~np.isnan(pvals)])
+	below = np.flatnonzero(pvals <= alpha_val * np.arange(1, len(pvals) + 1) / len(pvals))
+	if len(below) == 0:
+		return 0.0
+	return pvals[below[-1]]
+
+# Read the z-score file written by fdr_rand_pijs_boxcox.py (see zscore_fun.write_zscores)
+# Only the path strings, z-scores and p-values are parsed (columns 0, 3 and 4)
+# Returns (path strings, z-scores, p-values), as a pandas index and two float arrays
+def read_zscores(zscores_fname):
+	columns = pd.read_csv(zscores_fname, sep = '\t', nrows = 0).columns
+	zscore_pvals = pd.read_csv(zscores_fname, sep = '\t', usecols = [columns[0], columns[3], columns[4]], dtype = {columns[0]: str, columns[3]: np.float64, columns[4]: np.float64}, index_col = 0)
+	return zscore_pvals.index, zscore_pvals[columns[3]].to_numpy(), zscore_pvals[columns[4]].to_numpy()
+
+# Write the output of benjamini_hochberg_boxcox.py for the tested paths
+# path_strings, zscores, pvals -> tested paths only, in the order of reject and bh_pvals
+# All rows are formatted at once (as str() formats them) and written in a single call
+def write_bh_output(out_fname, path_strings, zscores, pvals, bh_pvals, reject):
+	with open(out_fname, 'w') as f:
+		f.write("i#j\tzscore_after_boxcox\tzscore_pval\tbh_corrected_pval\treject\n")
+		f.write(''.join(map('{}\t{}\t{}\t{}\t{}\n'.format, path_strings, zscores.tolist(), pvals.tolist(), bh_pvals.tolist(), reject.tolist())))
+
+def get_bh_sidecar_fname(out_fname):
+	return out_fname + BH_SIDECAR_SUFFIX
+
+# Write the sidecar of the output of benjamini_hochberg_boxcox.py (see BH_SIDECAR_SUFFIX)
+def write_bh_sidecar(out_fname, path_strings, bh_pvals):
+	encoded_paths = np.frombuffer('\n'.join(path_strings).encode('utf-8'), dtype = np.uint8)
+	with open(get_bh_sidecar_fname(out_fname), 'wb') as f:
+		np.savez(f, paths = encoded_paths, bh_pvals = bh_pvals)
+
+# Paths of the output of benjamini_hochberg_boxcox.py whose BH-corrected p-value <= pval_cutoff
+# Read from the sidecar file if there is one at least as recent as the text file, else by parsing the text file
+def read_significant_paths(fdr_fname, pval_cutoff):
+	sidecar_fname = get_bh_sidecar_fname(fdr_fname)
+	if os.path.isfile(sidecar_fname) and os.path.getmtime(sidecar_fname) >= os.path.getmtime(fdr_fname):
+		with np.load(sidecar_fname) as sidecar:
+			encoded_paths = sidecar['paths']
+			bh_pvals = sidecar['bh_pvals']
+		path_strings = encoded_paths.tobytes().decode('utf-8').split('\n') if len(bh_pvals) > 0 else []
+		print("Read BH-corrected p-values of ", len(path_strings), " paths from ", sidecar_fname)
+		return [path_strings[k] for k in np.flatnonzero(bh_pvals <= pval_cutoff)]
+
+	fdr = pd.read_csv(fdr_fname, sep = '\t', usecols = [0, 3], index_col = 0, dtype = {'i#j': str}, na_values = 'NA')
+	bh_pvals = fdr.iloc[:, 0].to_numpy(dtype = float)
+	return list(fdr.index[bh_pvals <= pval_cutoff])
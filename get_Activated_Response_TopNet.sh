@@ -9,7 +9,7 @@ trim_last_slash () {
         echo "${wdir}"
 }
 
-if [ "$#" -ne 11 ]
+if [ "$#" -ne 11 ] && [ "$#" -ne 12 ]
 then
 	echo "argv[1] = microarray data file"
 	echo "argv[2] = name of perturbation sample to study"
@@ -22,6 +22,7 @@ then
 	echo "argv[9] = output directory"
 	echo "argv[10] = file name for base response network (we'll put it in the output directory)"
 	echo "argv[11] = file name for TopNet (we'll put it in the output directory)"
+	echo "argv[12] = (optional) number of worker processes (default 1)"
         exit
 fi
 
@@ -37,21 +38,24 @@ num_trials=${8}
 out_dir=$(trim_last_slash ${9})
 response_nw_fname=${10}
 topnet_fname=${11}
+workers=${12:-1}
 
 # Create a temporary directory in the output directory
-# We will put all the Pij files here
-# Once the z-score has been calculated we will remove the Pij files as well as the temp directory
-mkdir ${out_dir}/temp
+# We will put the Pij file here
+# Once the z-score has been calculated we will remove the Pij file as well as the temp directory
+# The randomizations are checkpointed in the temp directory: if the run is stopped, running the same command again
+# resumes them from the last checkpoint
+mkdir -p ${out_dir}/temp
 
 # Map the microarray data onto the unweighted network to get an activated response network.
 # Compute top 'percentile' shortest paths in this (actual) network. Write these paths and costs.
 # Randomize the microarray data 'num_trials' times, resulting in 'num_trials' randomized response networks.
 # Compute the cost of the same paths as in the top 'percentile' shortest paths in the actual response network.
-# Write these paths and costs into output files.
-python activated_response_Pijs.py ${data_fname} ${perturbation_sample} ${control_sample} ${unweighted_nw_fname} ${percentile} ${path_length_thresh} ${num_trials} ${out_dir}/${response_nw_fname} ${out_dir}/temp/Pij
+# Write these paths and costs (actual and randomized) into a single binary file, ${out_dir}/temp/Pij.npz
+python activated_response_Pijs.py ${data_fname} ${perturbation_sample} ${control_sample} ${unweighted_nw_fname} ${percentile} ${path_length_thresh} ${num_trials} ${out_dir}/${response_nw_fname} ${out_dir}/temp/Pij workers=${workers} output=npz checkpoint=${out_dir}/temp/Pij_checkpoint.npz || exit 1
 
 # Calculate z-score and corresponding p-value for each path
-python fdr_rand_pijs_boxcox.py ${out_dir}/temp ${out_dir}/Pij_zscores.txt
+python fdr_rand_pijs_boxcox.py ${out_dir}/temp/Pij.npz ${out_dir}/Pij_zscores.txt workers=${workers}
 
 # Delete all temporary files
 rm -rf ${out_dir}/temp
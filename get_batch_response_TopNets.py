@@ -0,0 +1,65 @@
+# Run the activated / repressed response pipeline (get_Activated_Response_TopNet.sh, get_Repressed_Response_TopNet.sh)
+# for many (perturbation, control) sample pairs against one network, in a single run.
+# The microarray data and the unweighted network are read once, and every job gets the response network,
+# z-scores, BH-corrected p-values and TopNet of its sample pair in its own output folder (see pipe_fun.read_manifest)
+
+import sys
+import os
+
+import microarray_functions as mic_fun
+import graph_functions as graph_fun
+import option_functions as opt_fun
+import pipeline_functions as pipe_fun
+import percentile_functions as perc_fun
+import shortest_path_functions as sp_fun
+
+if len(sys.argv) < 9:
+	print("argv[1] = microarray data file (tab-delimited, with header)")
+	print("argv[2] = manifest of jobs (tab-delimited, one job per line): perturbation sample, control sample,")
+	print("		direction (activated, repressed, or both as in get_response_TopNets.py), and an optional job name (default: perturbation_control_direction)")
+	print("argv[3] = unweighted (directed) network file")
+	print("argv[4] = percentile threshold")
+	print("argv[5] = path length threshold")
+	print("argv[6] = q-score cutoff")
+	print("argv[7] = number of randomizations")
+	print("argv[8] = output directory. Each job writes " + ", ".join([pipe_fun.RESPONSE_NW_FNAME, pipe_fun.ZSCORES_FNAME, pipe_fun.FDR_FNAME, pipe_fun.TOPNET_FNAME]) + " to a folder named after the job")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("jobs = number of jobs run at once, each in its own process (default 1)")
+	print("workers = number of processes used by each job for the shortest path search and the z-scores (default 1)")
+	print("		Only used with jobs=1")
+	print("draws = shared (draw the randomized SI values once, for all jobs)")
+	print("		or per_job (each job draws its own values, giving the same TopNet edges as the shell pipeline). Default shared")
+	print("seed = seed for the random number generator used for the randomizations (default 1)")
+	print("sp_engine = shortest path engine: dijkstra, scipy or networkx (default dijkstra)")
+	print("zscores = batched or per_row, see fdr_rand_pijs_boxcox.py (default batched)")
+	print("percentile_mode = in_memory, streaming or bounded, see activated_response_Pijs.py (default in_memory)")
+	print("norm_cost_cutoff = normalized cost (cost/hops) cutoff for percentile_mode=bounded, 0 for no cutoff (default: estimated from a sample of sources)")
+	print("cache = 1 to reuse preprocessed network and microarray data cached from earlier runs on the same files, 0 to always parse them (default 1)")
+	print("cache_dir = folder for the cache files (default: .pathext_cache next to each input file)")
+	sys.exit(1)
+
+# Set inputs
+data_fname = sys.argv[1]
+manifest_fname = sys.argv[2]
+unweighted_nw_fname = sys.argv[3]
+percentile = float(sys.argv[4])
+path_length_thresh = int(sys.argv[5])
+qscore_thresh = float(sys.argv[6])
+num_trials = int(sys.argv[7])
+out_dir = sys.argv[8]
+options = opt_fun.parse_options(sys.argv[9:], {'jobs': 1, 'workers': 1, 'draws': 'shared', 'seed': 1, 'sp_engine': 'dijkstra', 'zscores': 'batched', 'percentile_mode': 'in_memory', 'norm_cost_cutoff': None, 'cache': True, 'cache_dir': None}, {'norm_cost_cutoff': float})
+opt_fun.check_choice(options, 'sp_engine', sp_fun.SP_ENGINES)
+opt_fun.check_choice(options, 'percentile_mode', perc_fun.PERCENTILE_MODES)
+
+jobs = pipe_fun.read_manifest(manifest_fname)
+print("Read ", len(jobs), " jobs")
+
+# Read microarray data and unweighted network, shared by all jobs
+SI = mic_fun.read_SI(data_fname, options['cache'], options['cache_dir'])
+print("Read microarray data with ", SI.shape[0], " rows and ", SI.shape[1], " columns")
+G_unweighted = graph_fun.read_network(unweighted_nw_fname, options['cache'], options['cache_dir'])
+print("Read network with ", G_unweighted.number_of_nodes(), " nodes and ", G_unweighted.number_of_edges(), " edges")
+
+os.makedirs(out_dir, exist_ok = True)
+for name, num_topnet_edges in pipe_fun.run_batch(G_unweighted, SI, jobs, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options):
+	print("Done with job ", name, ": ", num_topnet_edges, " edges in TopNet, written to ", os.path.join(out_dir, name))
@@ -5,45 +5,51 @@
 # 	Columns 1 through m -> normalised SI
 #	Header for the sample of interest is given as a user input
 
-import pandas as pd
 import random
-import networkx as nx
 import numpy as np
 import sys
 import math
 
 import microarray_functions as mic_fun
-import network_functions as net_fun
 import percentile_functions as perc_fun
-
-def get_edges_in_path(path, G):
-	edges_in_path = set()
-	for i in range(len(path) - 1):
-		edges_in_path.add((path[i], path[i+1], G[path[i]][path[i+1]]['weight']))
-	return edges_in_path
+import graph_functions as graph_fun
+import shortest_path_functions as sp_fun
+import option_functions as opt_fun
+import topnet_functions as topnet_fun
+import profile_functions as prof_fun
 
 # SI is given as a pandas dataframe, indexed by gene
 # column 0 -> disease gene expression values
-def combine_data_get_sp_paths_costs_ha(G_unweighted, SI, ha_nw_fname):
-	# Map gene expression values onto unweighted network
-	G_ha = net_fun.get_highest_activity_network(SI, G_unweighted)
-	print("Got highest activity base network with ", len(G_ha.nodes()), " nodes and ", len(G_ha.edges()), " edges")
-
-	# Drop SI values for genes which don't map to response network
-	genes_to_drop = set(SI.index) - set(G_ha.nodes())
-	SI = SI.drop(genes_to_drop)
-
-	# Write the highest activity network to file
-	nx.write_weighted_edgelist(G_ha, ha_nw_fname, delimiter = '\t')
-	# Get all-pairs-shortest-path costs
-	# Return value is a pandas dataframe, indexed by the string src#dest
-	Pij = net_fun.get_all_sp_paths_costs(G_ha)
-	print("Got shortest path costs for ", Pij.shape[0], " node-pairs")
+# G_unweighted is a graph_fun.CompactGraph. Returns the retained paths and the HA network (graph_fun.CompactGraph)
+# sp_engine and workers select the shortest path engine (see sp_fun.SP_ENGINES)
+# Only the shortest paths retained by the percentile selection are returned if a percentile is given
+# (see perc_fun.get_sp_paths_percentile_norm_cost), else all shortest paths
+def combine_data_get_sp_paths_costs_ha(G_unweighted, SI, ha_nw_fname, sp_engine = 'dijkstra', workers = 1, percentile = None, path_length_thresh = None, percentile_mode = 'in_memory', norm_cost_cutoff = None):
+	with prof_fun.stage('ha_network') as record:
+		# Map gene expression values onto unweighted network
+		G_ha = G_unweighted.get_weighted_graph(SI, 'highest_activity')
+		ha_nodes = G_ha.get_active_node_names()
+		print("Got highest activity base network with ", len(ha_nodes), " nodes and ", G_ha.edge_mask().sum(), " edges")
+
+		# Drop SI values for genes which don't map to response network
+		genes_to_drop = set(SI.index) - set(ha_nodes)
+		SI = SI.drop(genes_to_drop)
+
+		# Write the highest activity network to file
+		G_ha.write_weighted_edgelist(ha_nw_fname)
+		record['items'] = len(ha_nodes)
+	# Get all-pairs-shortest-paths, or only the ones retained by the percentile selection
+	# Return value is a path_fun.PathSet (node pairs, costs and predecessors or packed paths, no path strings)
+	if percentile is None:
+		Pij = sp_fun.get_all_sp_paths(G_ha, sp_engine, workers)
+		print("Got shortest path costs for ", len(Pij), " node-pairs")
+	else:
+		Pij = perc_fun.get_sp_paths_percentile_norm_cost(G_ha, percentile, path_length_thresh, sp_engine, workers, percentile_mode, norm_cost_cutoff)
 
 	return Pij, G_ha
 
 
-if len(sys.argv) != 8:
+if len(sys.argv) < 8:
 	print("argv[1] = microarray data file (tab-delimited, with header)")
 	print("argv[2] = name of sample to study")
 	print("argv[3] = unweighted (directed) network file")
@@ -51,6 +57,18 @@ if len(sys.argv) != 8:
 	print("argv[5] = path length threshold")
 	print("argv[6] = output file for highest activity base network")
 	print("argv[7] = output file for HA TopNet")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("workers = number of processes used for the shortest path search (default 1)")
+	print("sp_engine = shortest path engine: dijkstra, scipy or networkx (default dijkstra)")
+	print("percentile_mode = in_memory (hold all shortest paths, then select the top percentile)")
+	print("		or streaming (select the top percentile source by source, in two passes over the sources)")
+	print("		or bounded (each shortest path search only keeps paths under a normalized cost cutoff). Default in_memory")
+	print("support = output file for the number of top paths through every TopNet edge (node1, node2, weight, support)")
+	print("norm_cost_cutoff = normalized cost (cost/hops) cutoff for percentile_mode=bounded, 0 for no cutoff (default: estimated from a sample of sources)")
+	print("cache = 1 to reuse preprocessed network and microarray data cached from earlier runs on the same files, 0 to always parse them (default 1)")
+	print("cache_dir = folder for the cache files (default: .pathext_cache next to each input file)")
+	print("profile = JSON file for a report of the wall time, peak memory and item counts of every stage (default: no report)")
+	print("cprofile_stage = name of a stage to run under cProfile, as named in the report (eg: top_paths/shortest_paths)")
 	sys.exit(1)
 
 # Set inputs
@@ -61,40 +79,48 @@ percentile = float(sys.argv[4]) # We'll only keep paths whose cost < this thresh
 path_length_thresh = int(sys.argv[5]) # We'll only keep paths with length >= this threshold
 ha_nw_fname = sys.argv[6] # This is the base network
 ha_topnet_fname = sys.argv[7]
+options = opt_fun.parse_options(sys.argv[8:], {'workers': 1, 'sp_engine': 'dijkstra', 'percentile_mode': 'in_memory', 'norm_cost_cutoff': None, 'cache': True, 'cache_dir': None, 'support': None, 'profile': None, 'cprofile_stage': None}, {'norm_cost_cutoff': float})
+opt_fun.check_choice(options, 'sp_engine', sp_fun.SP_ENGINES)
+opt_fun.check_choice(options, 'percentile_mode', perc_fun.PERCENTILE_MODES)
+prof_fun.init_profiling(options['profile'], options['cprofile_stage'])
 
 # Read microarray data
 # Column 0 -> gene labels. Make this the index
 # Columns 1 through m -> various samples
-SI = pd.read_csv(data_fname, sep = '\t', na_values=' ')
-SI = SI.set_index(SI.columns[0])
-SI = SI[[sample_of_interest]]
-#SI = mic_fun.restructure_SI(SI, sample_of_interest, control_sample) # This gives SI restructured such that
-								     # column 0 -> perturbation to study, 
-								     # column 1 -> control, 
-								     # columns 2 to m -> other perturbations
+with prof_fun.stage('read_SI') as record:
+	SI = mic_fun.read_SI(data_fname, options['cache'], options['cache_dir'])
+	SI = SI[[sample_of_interest]]
+	#SI = mic_fun.restructure_SI(SI, sample_of_interest, control_sample) # This gives SI restructured such that
+									     # column 0 -> perturbation to study, 
+									     # column 1 -> control, 
+									     # columns 2 to m -> other perturbations
+	record['items'] = SI.shape[0]
 print("Got microarray data with ", SI.shape[0], " rows and ", SI.shape[1], " columns")
 
 # Read unweighted network
-G_unweighted = nx.read_edgelist(unweighted_nw_fname, delimiter = "\t", nodetype = str, create_using = nx.DiGraph())
-print("Read network with ", len(G_unweighted.nodes()), " nodes and ", len(G_unweighted.edges()), " edges")
+with prof_fun.stage('read_network') as record:
+	G_unweighted = graph_fun.read_network(unweighted_nw_fname, options['cache'], options['cache_dir'])
+	record['items'] = G_unweighted.number_of_edges()
+print("Read network with ", G_unweighted.number_of_nodes(), " nodes and ", G_unweighted.number_of_edges(), " edges")
 
 # Compute Pij
-Pij, G_ha = combine_data_get_sp_paths_costs_ha(G_unweighted, SI, ha_nw_fname) # Give an empty list as the paths argument
-Pij = perc_fun.get_Pij_percentile_norm_cost(Pij, percentile, path_length_thresh)
-print("After taking percentile cutoff, Pij has ", Pij.shape[0], " rows and ", Pij.shape[1], " columns")
-print(Pij.head())
-
-# Get edges in the top paths
-topnet_edges = set()
-for path_str in Pij.index:
-	path = path_str.split('#')
-	topnet_edges = topnet_edges.union(get_edges_in_path(path, G_ha))
-print("Got ", len(topnet_edges), " edges in TopNet")
-
-# Write edges in significant paths
-with open(ha_topnet_fname, 'w') as outfile:
-	for edge in topnet_edges:
-		outfile.write( edge[0] + "\t" )
-		outfile.write( edge[1] + "\t" )
-		outfile.write( str(edge[2]) + "\n" )
+with prof_fun.stage('top_paths') as record:
+	Pij, G_ha = combine_data_get_sp_paths_costs_ha(G_unweighted, SI, ha_nw_fname, options['sp_engine'], options['workers'], percentile, path_length_thresh, options['percentile_mode'], options['norm_cost_cutoff'])
+	record['items'] = len(Pij)
+print("After taking percentile cutoff, Pij has ", len(Pij), " rows")
+print(Pij.subset(np.arange(min(5, len(Pij)))).to_frame())
+
+# Get edges in the top paths, with the number of top paths through each of them
+with prof_fun.stage('topnet') as record:
+	support = topnet_fun.get_edge_support(G_ha, Pij)
+	record['items'] = (support > 0).sum()
+print("Got ", (support > 0).sum(), " edges in TopNet")
+
+# Write edges in top paths
+with prof_fun.stage('write_topnet'):
+	topnet_fun.write_topnet(G_ha, support, ha_topnet_fname)
+	if options['support'] is not None:
+		topnet_fun.write_edge_support(G_ha, support, options['support'])
 print("Done writing TopNet")
+
+prof_fun.write_report()
@@ -0,0 +1,61 @@
+# Activated, Repressed and union Response TopNets of one perturbation sample against one control, in a single run.
+# Does what get_Activated_Response_TopNet.sh, get_Repressed_Response_TopNet.sh and get_union_response_TopNet.py do,
+# reading the microarray data and the network once and drawing the randomized SI values once for both responses
+# (see pipe_fun.run_combined_response_pipeline)
+
+import sys
+
+import microarray_functions as mic_fun
+import graph_functions as graph_fun
+import option_functions as opt_fun
+import pipeline_functions as pipe_fun
+import percentile_functions as perc_fun
+import shortest_path_functions as sp_fun
+
+if len(sys.argv) < 10:
+	print("argv[1] = microarray data file (tab-delimited, with header)")
+	print("argv[2] = name of perturbation sample to study")
+	print("argv[3] = name of control sample")
+	print("argv[4] = unweighted (directed) network file")
+	print("argv[5] = percentile threshold")
+	print("argv[6] = path length threshold")
+	print("argv[7] = q-score cutoff")
+	print("argv[8] = number of randomizations")
+	print("argv[9] = output directory. The union Response TopNet is written to " + pipe_fun.UNION_TOPNET_FNAME + ", and each response")
+	print("		writes " + ", ".join([pipe_fun.RESPONSE_NW_FNAME, pipe_fun.ZSCORES_FNAME, pipe_fun.FDR_FNAME, pipe_fun.TOPNET_FNAME]) + " to the folder activated or repressed")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("workers = number of worker processes (default 1). With 2 or more, both responses run at once, each on half of them")
+	print("seed = seed for the random number generator used for the randomizations (default 1)")
+	print("sp_engine = shortest path engine: dijkstra, scipy or networkx (default dijkstra)")
+	print("zscores = batched or per_row, see fdr_rand_pijs_boxcox.py (default batched)")
+	print("percentile_mode = in_memory, streaming or bounded, see activated_response_Pijs.py (default in_memory)")
+	print("norm_cost_cutoff = normalized cost (cost/hops) cutoff for percentile_mode=bounded, 0 for no cutoff (default: estimated from a sample of sources)")
+	print("cache = 1 to reuse preprocessed network and microarray data cached from earlier runs on the same files, 0 to always parse them (default 1)")
+	print("cache_dir = folder for the cache files (default: .pathext_cache next to each input file)")
+	sys.exit(1)
+
+# Set inputs
+data_fname = sys.argv[1]
+perturbation_sample = sys.argv[2]
+control_sample = sys.argv[3]
+unweighted_nw_fname = sys.argv[4]
+percentile = float(sys.argv[5])
+path_length_thresh = int(sys.argv[6])
+qscore_thresh = float(sys.argv[7])
+num_trials = int(sys.argv[8])
+out_dir = sys.argv[9]
+options = opt_fun.parse_options(sys.argv[10:], {'workers': 1, 'seed': 1, 'sp_engine': 'dijkstra', 'zscores': 'batched', 'percentile_mode': 'in_memory', 'norm_cost_cutoff': None, 'cache': True, 'cache_dir': None}, {'norm_cost_cutoff': float})
+opt_fun.check_choice(options, 'sp_engine', sp_fun.SP_ENGINES)
+opt_fun.check_choice(options, 'percentile_mode', perc_fun.PERCENTILE_MODES)
+
+# Read microarray data, with column 0 -> perturbation to study, column 1 -> control
+SI = mic_fun.read_SI(data_fname, options['cache'], options['cache_dir'])
+SI = mic_fun.restructure_SI(SI, perturbation_sample, control_sample)
+print("Read microarray data with ", SI.shape[0], " rows and ", SI.shape[1], " columns")
+
+# Read unweighted network, shared by both response networks
+G_unweighted = graph_fun.read_network(unweighted_nw_fname, options['cache'], options['cache_dir'])
+print("Read network with ", G_unweighted.number_of_nodes(), " nodes and ", G_unweighted.number_of_edges(), " edges")
+
+pipe_fun.run_combined_response_pipeline(G_unweighted, SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options)
+print("Done writing Response TopNets")
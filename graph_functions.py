@@ -0,0 +1,138 @@
+import networkx as nx
+import numpy as np
+import copy
+
+import network_functions as net_fun
+import cache_functions as cache_fun
+
+# Compact, integer-indexed directed graph used by the Pij pipeline
+# Genes are interned once: node i has the name nodes[i]
+# Edges are kept in the order of nw.edges(), as two integer arrays src and dst. Edge e goes from src[e] to dst[e]
+# The topology is also stored in CSR form, grouped by source node:
+#	the successors of node i are indices[indptr[i]:indptr[i+1]], reached through the edges edge_ids[indptr[i]:indptr[i+1]]
+#	successors appear in the same order as in the networkx graph, so path searches break ties the same way
+# Edge weights are a float array indexed by edge id. NaN marks an edge that is not part of the weighted network
+# (eg: SI is not positive for one of its nodes). Weights can be swapped without touching the topology, and
+# the topology arrays are shared between all graphs derived from the same unweighted network
+class CompactGraph:
+	def __init__(self, nodes, src, dst, weights = None):
+		self.nodes = np.asarray(nodes, dtype = object)
+		self.node_index = {node: i for i, node in enumerate(self.nodes)}
+		self.src = np.asarray(src, dtype = np.int32)
+		self.dst = np.asarray(dst, dtype = np.int32)
+
+		# CSR arrays, grouped by source. A stable sort keeps the successor order of each node
+		self.edge_ids = np.argsort(self.src, kind = 'stable').astype(np.int32)
+		self.indices = self.dst[self.edge_ids]
+		self.indptr = np.zeros(len(self.nodes) + 1, dtype = np.int64)
+		np.cumsum(np.bincount(self.src, minlength = len(self.nodes)), out = self.indptr[1:])
+
+		# Sorted src x num_nodes + dst keys, used to look up edge ids from node pairs
+		keys = self.src.astype(np.int64) * len(self.nodes) + self.dst
+		self.key_order = np.argsort(keys, kind = 'stable')
+		self.sorted_keys = keys[self.key_order]
+
+		if weights is None:
+			weights = np.ones(len(self.src))
+		self.weights = np.asarray(weights, dtype = float)
+
+	# Build from an unweighted network read with nx.read_edgelist
+	@classmethod
+	def from_networkx(cls, nw):
+		nodes = list(nw.nodes())
+		node_index = {node: i for i, node in enumerate(nodes)}
+		edges = list(nw.edges())
+		src = np.fromiter((node_index[edge[0]] for edge in edges), dtype = np.int32, count = len(edges))
+		dst = np.fromiter((node_index[edge[1]] for edge in edges), dtype = np.int32, count = len(edges))
+		return cls(nodes, src, dst)
+
+	# Build from a weighted network (eg: one written by nx.write_weighted_edgelist and read back)
+	@classmethod
+	def from_weighted_networkx(cls, G):
+		G_compact = cls.from_networkx(G)
+		return G_compact.with_weights([weight for u, v, weight in G.edges(data = 'weight')])
+
+	def number_of_nodes(self):
+		return len(self.nodes)
+
+	def number_of_edges(self):
+		return len(self.src)
+
+	# Return a graph sharing this topology, with the given edge weights (NaN -> edge absent)
+	def with_weights(self, weights):
+		G = copy.copy(self)
+		G.weights = np.asarray(weights, dtype = float)
+		return G
+
+	# Boolean array over edge ids, True for edges present in the weighted graph
+	def edge_mask(self):
+		return ~np.isnan(self.weights)
+
+	# Row of SI for every node of the graph (-1 if there is no expression value for that gene)
+	def get_node_rows(self, SI_index):
+		return SI_index.get_indexer(self.nodes)
+
+	# SI is a pandas dataframe, indexed by gene (see net_fun.get_node_weights for the columns used)
+	# Return the weighted graph of type nw_type (eg: 'activated_response') sharing this topology
+	def get_weighted_graph(self, SI, nw_type):
+		node_rows = self.get_node_rows(SI.index)
+		node_weights, positive = net_fun.get_node_weights(SI.to_numpy(dtype = float), nw_type)
+		keep, edge_weights = net_fun.get_edge_weights(node_weights, positive, node_rows[self.src], node_rows[self.dst], nw_type)
+		return self.with_weights(edge_weights)
+
+	# CSR arrays (indptr, indices, weights) of the weighted graph, leaving out absent edges
+	def get_weighted_csr(self):
+		weights = self.weights[self.edge_ids]
+		present = ~np.isnan(weights)
+		indptr = np.zeros_like(self.indptr)
+		np.cumsum(np.bincount(self.src[self.edge_ids[present]], minlength = len(self.nodes)), out = indptr[1:])
+		return indptr, self.indices[present], weights[present]
+
+	# Node ids of the nodes with at least one edge in the weighted graph, in the order networkx
+	# would add them when the weighted edges are added one by one
+	def get_active_nodes(self):
+		kept = np.flatnonzero(self.edge_mask())
+		endpoints = np.column_stack((self.src[kept], self.dst[kept])).ravel()
+		active_nodes, first_seen = np.unique(endpoints, return_index = True)
+		return active_nodes[np.argsort(first_seen, kind = 'stable')]
+
+	def get_active_node_names(self):
+		return list(self.nodes[self.get_active_nodes()])
+
+	# Edge ids of the edges u -> v, for integer arrays of node ids u and v. -1 where there is no such edge
+	def get_edge_ids(self, u, v):
+		keys = np.asarray(u, dtype = np.int64) * len(self.nodes) + np.asarray(v, dtype = np.int64)
+		if len(self.sorted_keys) == 0:
+			return np.full(len(keys), -1)
+		pos = np.searchsorted(self.sorted_keys, keys)
+		pos = np.minimum(pos, len(self.sorted_keys) - 1)
+		found = self.sorted_keys[pos] == keys
+		return np.where(found, self.key_order[pos], -1)
+
+	# Export the weighted graph to networkx (eg: to write it to file)
+	# Edges are added in the order of the unweighted network, so the result is the same graph
+	# as the one returned by the builders in network_functions
+	def to_networkx(self):
+		G = nx.DiGraph()
+		kept = np.flatnonzero(self.edge_mask())
+		G.add_weighted_edges_from(zip(self.nodes[self.src[kept]], self.nodes[self.dst[kept]], self.weights[kept].tolist()))
+		return G
+
+	def write_weighted_edgelist(self, fname):
+		nx.write_weighted_edgelist(self.to_networkx(), fname, delimiter = '\t')
+
+# Read an unweighted (directed) network file, as nx.read_edgelist does in the PathExt scripts
+# The interned nodes and the edge arrays are cached (see cache_functions), so later runs on the same
+# network file skip parsing it. use_cache = False always parses the file, without writing a cache file
+def read_network(fname, use_cache = True, cache_dir = None):
+	if use_cache:
+		cache_fname = cache_fun.get_cache_fname(fname, 'network', cache_dir)
+		cached = cache_fun.read_cache(cache_fname)
+		if cached is not None:
+			print("Read network from cache file ", cache_fname)
+			return CompactGraph(cached['nodes'].astype(object), cached['src'], cached['dst'])
+	nw = nx.read_edgelist(fname, delimiter = "\t", nodetype = str, create_using = nx.DiGraph())
+	G = CompactGraph.from_networkx(nw)
+	if use_cache:
+		cache_fun.write_cache(cache_fname, nodes = G.nodes.astype(str), src = G.src, dst = G.dst)
+	return G
@@ -0,0 +1,16 @@
+import sys
+
+import pij_functions as pij_fun
+
+if len(sys.argv) < 3:
+	print("argv[1] = output .npz Pij file, read by fdr_rand_pijs_boxcox.py")
+	print("argv[2], argv[3], ... = .npz Pij shards, written by the Pij scripts with shard=start:end, covering all trials of the run")
+	sys.exit(1)
+
+# Set inputs
+out_fname = sys.argv[1]
+shard_fnames = sys.argv[2:]
+
+# Merge the shards, checking that they are from the same run and hold every trial once
+total_trials = pij_fun.merge_pij_shards(shard_fnames, out_fname)
+print("Merged ", len(shard_fnames), " shards into ", out_fname, " with ", total_trials, " trials")
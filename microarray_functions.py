@@ -1,26 +1,92 @@
 import pandas as pd
-import math
 import numpy as np
-import random
 
+import cache_functions as cache_fun
+
+
+# Read microarray data (tab-delimited, with header)
+# Column 0 -> gene labels, made the index. Columns 1 through m -> various samples
+# When all samples are numeric, the values are cached (see cache_functions), so later runs on the same
+# file skip parsing it. use_cache = False always parses the file, without writing a cache file
+def read_SI(fname, use_cache = True, cache_dir = None):
+	if use_cache:
+		cache_fname = cache_fun.get_cache_fname(fname, 'SI', cache_dir)
+		cached = cache_fun.read_cache(cache_fname)
+		if cached is not None:
+			print("Read microarray data from cache file ", cache_fname)
+			index = pd.Index(cached['index'].astype(object), name = str(cached['index_name']))
+			return pd.DataFrame(cached['values'], index = index, columns = cached['columns'].astype(object))
+	SI = pd.read_csv(fname, sep = '\t', na_values=' ')
+	SI = SI.set_index(SI.columns[0])
+	cacheable = all(dtype == np.float64 for dtype in SI.dtypes) and all(isinstance(x, str) for x in SI.index) and all(isinstance(x, str) for x in SI.columns)
+	if use_cache and cacheable:
+		cache_fun.write_cache(cache_fname, index = SI.index.to_numpy(dtype = str), index_name = np.array(SI.index.name), columns = SI.columns.to_numpy(dtype = str), values = SI.to_numpy())
+	return SI
 
 ############## Methods for the case with a single perturbed and a single control sample,
 ############## but with multiple perturbations
 
+# Random draws use a numpy Generator (eg: np.random.default_rng(seed)), so runs can be seeded and repeated
+# If none is given, a new unseeded generator is used
+
+# SI_values is a numpy array (genes x samples)
+# For each row, pick a random value from that row, ignoring NaNs, independently in each of num_trials trials
+# Returns a numpy array (num_trials x genes). Rows with only NaNs give NaN
+def get_randomized_values(SI_values, num_trials, rng):
+	return draw_randomized_values(get_non_nan_first(SI_values), num_trials, rng)
+
+# Returns (the values of each row with its non-NaN values moved to the front, keeping their order,
+# number of non-NaN values of each row), which draw_randomized_values picks from
+def get_non_nan_first(SI_values):
+	is_nan = np.isnan(SI_values)
+	return np.take_along_axis(SI_values, np.argsort(is_nan, axis = 1, kind = 'stable'), axis = 1), (~is_nan).sum(axis = 1)
+
+def draw_randomized_values(non_nan_values, num_trials, rng):
+	non_nan_first, num_values = non_nan_values
+	choice = (rng.random((num_trials, non_nan_first.shape[0])) * num_values).astype(np.int64)
+	choice = np.minimum(choice, np.maximum(num_values - 1, 0))
+	randomized_vals = non_nan_first[np.arange(non_nan_first.shape[0]), choice]
+	randomized_vals[:, num_values == 0] = np.nan
+	return randomized_vals
+
 # Create a new dataframe with the same index as the input, and with the specified column name
 # For each row, pick a random value from that row
-def get_randomized_colnum(SI, colnum):
-	randomized_vals = pd.DataFrame(index = tuple(SI.index), columns = [colnum])
-	for row in SI.itertuples():
-		list_row = list(row)[1:]
-		list_row = [x for x in list_row if not math.isnan(x)] # remove NaNs
-		randomized_vals.loc[row[0]] = random.choice(list_row)
-	return randomized_vals
+def get_randomized_colnum(SI, colnum, rng = None):
+	if rng is None:
+		rng = np.random.default_rng()
+	randomized_vals = get_randomized_values(SI.to_numpy(dtype = float), 1, rng)[0]
+	return pd.DataFrame(randomized_vals, index = SI.index, columns = [colnum])
 
-def get_randomized_single_sample_mult_pert(SI):
-	randomized_perturbed = get_randomized_colnum(SI, 0)
-	randomized_control = get_randomized_colnum(SI, 1)
-	return pd.concat([randomized_perturbed, randomized_control], axis=1)
+def get_randomized_single_sample_mult_pert(SI, rng = None):
+	if rng is None:
+		rng = np.random.default_rng()
+	randomized_SI = get_randomized_single_sample_mult_pert_trials(SI, 1, rng)[0]
+	return pd.DataFrame(randomized_SI, index = SI.index, columns = [0, 1])
+
+# Draw all randomizations up front: returns a numpy array of shape (num_trials, genes, 2)
+# randomized_SI[i] holds the values get_randomized_single_sample_mult_pert would return in trial i:
+# column 0 (perturbed) and column 1 (control) are drawn independently from each row of SI
+# Values are drawn trial by trial, so drawing k trials and then the next m gives the same values as drawing k+m at once
+def get_randomized_single_sample_mult_pert_trials(SI, num_trials, rng = None):
+	if rng is None:
+		rng = np.random.default_rng()
+	randomized_vals = get_randomized_values(SI.to_numpy(dtype = float), 2 * num_trials, rng)
+	return randomized_vals.reshape(num_trials, 2, SI.shape[0]).transpose(0, 2, 1)
+
+# Random number generator of trial i with per-trial seeds: the i-th child of the master seed
+# (as np.random.SeedSequence(seed).spawn would make it), so any trial can be drawn without drawing the ones before it
+def get_trial_rng(seed, trial):
+	return np.random.default_rng(np.random.SeedSequence(seed, spawn_key = (trial,)))
+
+# Same as get_randomized_single_sample_mult_pert_trials, with the values of every trial drawn from its own generator
+# (see get_trial_rng). trials -> trial numbers. Returns a numpy array of shape (len(trials), genes, 2)
+# The values of a trial do not depend on which other trials are drawn with it, so trials can be split across runs
+def get_randomized_single_sample_mult_pert_seeded_trials(SI, trials, seed):
+	non_nan_values = get_non_nan_first(SI.to_numpy(dtype = float))
+	randomized_SI = np.empty((len(trials), SI.shape[0], 2))
+	for k, trial in enumerate(trials):
+		randomized_SI[k] = draw_randomized_values(non_nan_values, 2, get_trial_rng(seed, trial)).T
+	return randomized_SI
 
 # We are only interested in column 0 (perturbed) and column 1 (control)
 # So we return a pandas dataframe with only the relevant columns
@@ -43,19 +109,48 @@ def restructure_SI(SI, perturbation_sample, control_sample):
 ############## Methods for the case with multiple perturbed and control samples
 
 # Return a dataframe with each row shuffled around independently
-def shuffle_disease_healthy(SI):
-        shuffled_SI = pd.DataFrame(index = tuple(SI.index), columns = tuple(SI.columns))
-        for row in SI.itertuples():
-                list_row = list(row)[1:]
-                shuffled_SI.loc[row[0]] = np.random.permutation(list_row)
-        return shuffled_SI
+def shuffle_disease_healthy(SI, rng = None):
+	if rng is None:
+		rng = np.random.default_rng()
+	shuffled_SI = shuffle_disease_healthy_trials(SI.to_numpy(dtype = float), 1, rng)[0]
+	return pd.DataFrame(shuffled_SI, index = SI.index, columns = SI.columns)
+
+# SI_values is a numpy array (genes x samples)
+# Returns a numpy array (num_trials x genes x samples), with each row independently permuted in each trial
+def shuffle_disease_healthy_trials(SI_values, num_trials, rng):
+	return rng.permuted(np.broadcast_to(SI_values, (num_trials,) + SI_values.shape), axis = -1)
 
 # Here we have k1 perturbed samples and k2 control samples
 # k1 + k2 = m (total number of samples)
 # We return the median of the first k1 columns as the representative perturbed sample
 # and the median of the next k2 columns as the representative control sample
+# NaNs are ignored (a row with only NaNs gives NaN)
 def get_median_SI(SI, num_perturbed_samples, num_control_samples):
-        perturbed_median = SI.iloc[:,0:num_perturbed_samples].median(1)
-        control_median = SI.iloc[:,num_perturbed_samples:(num_control_samples+num_perturbed_samples)].median(1)
-        SI_median = pd.concat([perturbed_median, control_median], axis=1)
-        return SI_median
+	SI_median = get_median_SI_values(SI.to_numpy(dtype = float), num_perturbed_samples, num_control_samples)
+	return pd.DataFrame(SI_median, index = SI.index)
+
+# SI_values is a numpy array (... x genes x samples), eg: one (genes x samples) array per trial
+# Returns a numpy array (... x genes x 2) with the medians of get_median_SI
+def get_median_SI_values(SI_values, num_perturbed_samples, num_control_samples):
+	perturbed_values = SI_values[..., :num_perturbed_samples]
+	control_values = SI_values[..., num_perturbed_samples:(num_control_samples+num_perturbed_samples)]
+	return np.stack((get_nanmedian(perturbed_values), get_nanmedian(control_values)), axis = -1)
+
+# Median along the last axis, ignoring NaNs (NaN where there are only NaNs), with the same values as np.nanmedian
+# Rows are sorted (NaNs go last) and the median is picked from the non-NaN values of each row, which is much
+# faster than np.nanmedian on many short rows
+def get_nanmedian(values):
+	sorted_values = np.sort(values, axis = -1)
+	num_values = (~np.isnan(values)).sum(axis = -1)
+	lower = np.take_along_axis(sorted_values, np.maximum((num_values - 1)//2, 0)[..., None], axis = -1)[..., 0]
+	upper = np.take_along_axis(sorted_values, (num_values//2)[..., None], axis = -1)[..., 0]
+	return np.where(num_values > 0, (lower + upper)/2, np.nan)
+
+# Randomized median SI values of num_trials trials: in every trial, the values of each gene are shuffled across
+# the k1 + k2 samples (shuffle_disease_healthy_trials), and the medians of the first k1 and of the next k2 are taken
+# (get_median_SI). SI_values is a numpy array (genes x (k1 + k2))
+# Returns a numpy array (num_trials, genes, 2), as get_randomized_single_sample_mult_pert_trials
+# Values are drawn trial by trial, so drawing k trials and then the next m gives the same values as drawing k+m at once
+def get_shuffled_median_SI_trials(SI_values, num_perturbed_samples, num_control_samples, num_trials, rng):
+	shuffled_SI = shuffle_disease_healthy_trials(SI_values, num_trials, rng)
+	return get_median_SI_values(shuffled_SI, num_perturbed_samples, num_control_samples)
@@ -1,6 +1,7 @@
 import networkx as nx
 import pandas as pd
 import numpy as np
+import scipy.sparse
 import math
 
 SMALL_VAL = 0.001
@@ -41,77 +42,103 @@ def get_edges_in_path(path, G):
 		edges_in_path.add((path[i], path[i+1], G[path[i]][path[i+1]]['weight']))
 	return edges_in_path
 
+# Vectorized version of get_abs_FC_node_weight for numpy arrays
+# If the node weight is about to evaluate to 0, we add SMALL_VAL to the control SI (see get_abs_FC_network)
+def get_abs_FC_node_weights(perturbed_SI, control_SI):
+	control_SI = np.where(perturbed_SI == control_SI, control_SI + SMALL_VAL, control_SI)
+	return np.abs(np.log2(perturbed_SI) - np.log2(control_SI))
+
+# Node weight functions used by the vectorized network builder, keyed by network type
+# The scalar functions above work unchanged on numpy arrays, except for the absolute fold change
+NODE_WEIGHT_FUNCTIONS = {
+	'activated_response': get_activated_response_node_weight,
+	'repressed_response': get_repressed_response_node_weight,
+	'activated_FC': get_activated_FC_node_weight,
+	'repressed_FC': get_repressed_FC_node_weight,
+	'abs_FC': get_abs_FC_node_weights,
+}
+
+# SI_values is a numpy array of gene expression values, one row per gene
+# column 0 -> perturbed gene expression values
+# column 1 -> control gene expression values (not used for the highest activity network)
+# Returns the node weight of every gene, and a boolean array which is True for genes
+# whose SI is positive in every column used by that network type
+def get_node_weights(SI_values, nw_type):
+	perturbed_SI = SI_values[..., 0]
+	if nw_type == 'highest_activity': # node weight = SI itself
+		return perturbed_SI, perturbed_SI > 0
+	control_SI = SI_values[..., 1]
+	positive = (perturbed_SI > 0) & (control_SI > 0)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		node_weights = NODE_WEIGHT_FUNCTIONS[nw_type](perturbed_SI, control_SI)
+	return node_weights, positive
+
+# Map node weights onto edges, all at once
+# src_rows, dst_rows -> integer arrays giving the row (in node_weights) of the two nodes of each edge,
+#			-1 if that gene has no expression value
+# Returns a boolean array which is True for the edges kept in the weighted network (SI positive for
+# both nodes), and the edge cost 1/sqrt(Ni x Nj) of each edge (NaN for edges which are not kept)
+# node_weights and positive may have extra leading dimensions (eg: one row per randomization trial)
+def get_edge_weights(node_weights, positive, src_rows, dst_rows, nw_type):
+	found = (src_rows >= 0) & (dst_rows >= 0)
+	src_rows = np.where(found, src_rows, 0)
+	dst_rows = np.where(found, dst_rows, 0)
+	keep = found & positive[..., src_rows] & positive[..., dst_rows]
+	n1 = node_weights[..., src_rows]
+	n2 = node_weights[..., dst_rows]
+	if nw_type == 'abs_FC':
+		n2 = np.where(n1 == n2, n2 + SMALL_VAL, n2)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		edge_weights = np.where(keep, 1/np.sqrt(n1 * n2), np.nan)
+	return keep, edge_weights
+
+# SI is a pandas dataframe, indexed by gene
+# Returns a weighted nx.DiGraph with the edges of nw whose nodes have positive SI, with
+# edge cost = 1/sqrt(Ni x Nj), where the node weights depend on nw_type (see NODE_WEIGHT_FUNCTIONS)
+def get_weighted_network(SI, nw, nw_type):
+	edges = list(nw.edges())
+	src_rows = SI.index.get_indexer([edge[0] for edge in edges])
+	dst_rows = SI.index.get_indexer([edge[1] for edge in edges])
+	node_weights, positive = get_node_weights(SI.to_numpy(dtype = float), nw_type)
+	keep, edge_weights = get_edge_weights(node_weights, positive, src_rows, dst_rows, nw_type)
+
+	weighted_nw = nx.DiGraph()
+	kept = np.flatnonzero(keep)
+	weighted_nw.add_weighted_edges_from((edges[i][0], edges[i][1], weight) for i, weight in zip(kept.tolist(), edge_weights[kept].tolist()))
+	return weighted_nw
+
 # SI is a pandas dataframe, indexed by gene, having only 1 column
 # node weight = SI itself
 def get_highest_activity_network(SI, nw):
-	han = nx.DiGraph()
-	for edge in nw.edges():
-		if edge[0] in SI.index and edge[1] in SI.index: # got gene expression values
-			if SI.loc[edge[0]][0] > 0 and SI.loc[edge[1]][0] > 0: # SI is positive for both nodes
-				n1 = SI.loc[edge[0]][0]
-				n2 = SI.loc[edge[1]][0]
-				han.add_edge(edge[0], edge[1], weight = get_edge_weight(n1, n2))
-	return han
+	return get_weighted_network(SI, nw, 'highest_activity')
 
 # SI is given as a pandas dataframe, indexed by gene
 # column 0 -> perturbed gene expression values
 # column 1 -> control gene expression values
 # node weight = perturbed_SI x (perturbed_SI/control_SI)
 def get_activated_response_network(SI, nw):
-	response_nw = nx.DiGraph()
-	for edge in nw.edges():
-		if edge[0] in SI.index and edge[1] in SI.index: # got gene expression values
-			if SI.loc[edge[0]][0] > 0 and SI.loc[edge[0]][1] > 0: # SI is positive for node 1
-				if SI.loc[edge[1]][0] > 0 and SI.loc[edge[1]][1] > 0: # SI is positive for node 2
-					n1 = get_activated_response_node_weight(SI.loc[edge[0]][0], SI.loc[edge[0]][1])
-					n2 = get_activated_response_node_weight(SI.loc[edge[1]][0], SI.loc[edge[1]][1])
-					response_nw.add_edge(edge[0], edge[1], weight = get_edge_weight(n1, n2))
-	return response_nw
+	return get_weighted_network(SI, nw, 'activated_response')
 
 # SI is given as a pandas dataframe, indexed by gene
 # column 0 -> perturbed gene expression values
 # column 1 -> control gene expression values
 # node weight = control_SI x (control_SI/perturbed_SI)
 def get_repressed_response_network(SI, nw):
-	response_nw = nx.DiGraph()
-	for edge in nw.edges():
-		if edge[0] in SI.index and edge[1] in SI.index: # got gene expression values
-			if SI.loc[edge[0]][0] > 0 and SI.loc[edge[0]][1] > 0: # SI is positive for node 1
-				if SI.loc[edge[1]][0] > 0 and SI.loc[edge[1]][1] > 0: # SI is positive for node 2
-					n1 = get_repressed_response_node_weight(SI.loc[edge[0]][0], SI.loc[edge[0]][1])
-					n2 = get_repressed_response_node_weight(SI.loc[edge[1]][0], SI.loc[edge[1]][1])
-					response_nw.add_edge(edge[0], edge[1], weight = get_edge_weight(n1, n2))
-	return response_nw
+	return get_weighted_network(SI, nw, 'repressed_response')
 
 # SI is given as a pandas dataframe, indexed by gene
 # column 0 -> perturbed gene expression values
 # column 1 -> control gene expression values
 # node weight = perturbed_SI/control_SI
 def get_activated_FC_network(SI, nw):
-	fc_nw = nx.DiGraph()
-	for edge in nw.edges():
-		if edge[0] in SI.index and edge[1] in SI.index: # got gene expression values
-			if SI.loc[edge[0]][0] > 0 and SI.loc[edge[0]][1] > 0: # SI is positive for node 1
-				if SI.loc[edge[1]][0] > 0 and SI.loc[edge[1]][1] > 0: # SI is positive for node 2
-					n1 = get_activated_FC_node_weight(SI.loc[edge[0]][0], SI.loc[edge[0]][1])
-					n2 = get_activated_FC_node_weight(SI.loc[edge[1]][0], SI.loc[edge[1]][1])
-					fc_nw.add_edge(edge[0], edge[1], weight = get_edge_weight(n1, n2))
-	return fc_nw
+	return get_weighted_network(SI, nw, 'activated_FC')
 
 # SI is given as a pandas dataframe, indexed by gene
 # column 0 -> perturbed gene expression values
 # column 1 -> control gene expression values
 # node weight = control_SI/perturbed_SI
 def get_repressed_FC_network(SI, nw):
-	fc_nw = nx.DiGraph()
-	for edge in nw.edges():
-		if edge[0] in SI.index and edge[1] in SI.index: # got gene expression values
-			if SI.loc[edge[0]][0] > 0 and SI.loc[edge[0]][1] > 0: # SI is positive for node 1
-				if SI.loc[edge[1]][0] > 0 and SI.loc[edge[1]][1] > 0: # SI is positive for node 2
-					n1 = get_repressed_FC_node_weight(SI.loc[edge[0]][0], SI.loc[edge[0]][1])
-					n2 = get_repressed_FC_node_weight(SI.loc[edge[1]][0], SI.loc[edge[1]][1])
-					fc_nw.add_edge(edge[0], edge[1], weight = get_edge_weight(n1, n2))
-	return fc_nw
+	return get_weighted_network(SI, nw, 'repressed_FC')
 
 # SI is given as a pandas dataframe, indexed by gene
 # column 0 -> perturbed gene expression values
@@ -121,28 +148,10 @@ def get_repressed_FC_network(SI, nw):
 # we need to avoid a value of 0. So if the node weight is about to evaluate to 0, we add SMALL_VAL to 
 # one of the expressions
 def get_abs_FC_network(SI, nw):
-        abs_FC_nw = nx.DiGraph()
-        for edge in nw.edges():
-                if edge[0] in SI.index and edge[1] in SI.index: # got gene expression values
-                        if SI.loc[edge[0]][0] > 0 and SI.loc[edge[0]][1] > 0: # SI is positive for node 1
-                                if SI.loc[edge[1]][0] > 0 and SI.loc[edge[1]][1] > 0: # SI is positive for node 2
-                                        n1_perturbed_SI = SI.loc[edge[0]][0]
-                                        n1_control_SI = SI.loc[edge[0]][1]
-                                        if n1_perturbed_SI == n1_control_SI:
-                                                n1_control_SI += SMALL_VAL
-                                        n1 = get_abs_FC_node_weight(n1_perturbed_SI, n1_control_SI)
-                                        n2_perturbed_SI = SI.loc[edge[1]][0]
-                                        n2_control_SI = SI.loc[edge[1]][1]
-                                        if n2_perturbed_SI == n2_control_SI:
-                                                n2_control_SI += SMALL_VAL
-                                        n2 = get_abs_FC_node_weight(n2_perturbed_SI, n2_control_SI)
-                                        if n1 == n2:
-                                                n2 += SMALL_VAL
-                                        abs_FC_nw.add_edge(edge[0], edge[1], weight = get_edge_weight(n1, n2))
-        return abs_FC_nw
+	return get_weighted_network(SI, nw, 'abs_FC')
 
 def get_sp_costs(G):
-	sp_costs = nx.all_pairs_dijkstra_path_length(G)
+	sp_costs = dict(nx.all_pairs_dijkstra_path_length(G))
 
 	# Convert to a pandas dataframe
 	sp_costs_df = pd.DataFrame.from_dict({i+'#'+j: sp_costs[i][j] for i in sp_costs.keys() for j in sp_costs[i].keys() if i!=j}, orient='index')
@@ -152,7 +161,7 @@ def get_sp_costs(G):
 
 # return only shortest paths involving at least one node of interest
 def get_sp_paths_costs_nodes(G, noi):
-        spaths_dict = nx.all_pairs_dijkstra_path(G)
+        spaths_dict = dict(nx.all_pairs_dijkstra_path(G))
 
         # Convert to a pandas dataframe
         # Index will be the full path, with nodes separated by #
@@ -162,7 +171,7 @@ def get_sp_paths_costs_nodes(G, noi):
         return spaths_costs_df
 
 def get_all_sp_paths_costs(G):
-	spaths_dict = nx.all_pairs_dijkstra_path(G)
+	spaths_dict = dict(nx.all_pairs_dijkstra_path(G))
 
 	# Convert to a pandas dataframe
 	# Index will be the full path, with nodes separated by #
@@ -173,7 +182,7 @@ def get_all_sp_paths_costs(G):
 
 # Return all-pairs-shortest-path costs normalized by the number of hops in the path
 def get_normalized_sp_costs(G):
-	shortest_paths = nx.all_pairs_dijkstra_path(G)
+	shortest_paths = dict(nx.all_pairs_dijkstra_path(G))
 	print("Done calculating shortest paths")
 
 	# Normalize by number of hops
@@ -190,10 +199,37 @@ def get_normalized_sp_costs(G):
 
 	return norm_sp_costs_df
 
+# Sparse (paths x edges) path-edge incidence matrix: row k has a 1 in the column of every edge of path k
+# edge_columns holds the columns of the edges of consecutive paths, path k having num_hops[k] edges
+# The entries of each row are kept in path order (the matrix is built directly in CSR form, and never sorted),
+# so a product with a vector of edge weights adds up the edges of each path in the same order as
+# get_path_cost, and gives exactly the same costs
+def get_path_edge_matrix(edge_columns, num_hops, num_edges):
+	indptr = np.zeros(len(num_hops) + 1, dtype = np.int64)
+	np.cumsum(num_hops, out = indptr[1:])
+	return scipy.sparse.csr_matrix((np.ones(len(edge_columns)), np.asarray(edge_columns), indptr), shape = (len(num_hops), num_edges))
+
+# Paths has the form ['a#b#c', 'b#c'], i.e it is a list of strings where each string is a path
+# Compile them once into a path-edge incidence matrix (see get_path_edge_matrix)
+# Returns (incidence matrix, list of the edges (u, v) for each column)
+def compile_paths(paths):
+	edge_columns = {}
+	columns = []
+	num_hops = np.zeros(len(paths), dtype = np.int64)
+	for k, path_str in enumerate(paths):
+		path = path_str.split('#')
+		for i in range(len(path) - 1):
+			columns.append(edge_columns.setdefault((path[i], path[i+1]), len(edge_columns)))
+		num_hops[k] = len(path) - 1
+	return get_path_edge_matrix(np.array(columns, dtype = np.int64), num_hops, len(edge_columns)), list(edge_columns)
+
 # Paths has the form ['a#b#c', 'b#c'], i.e it is a list of strings where each string is a path
 # We need to return a dataframe indexed by the same list, with the cost of each path in the given graph
-def get_costs_of_given_paths(G, paths):
-        same_path_costs = pd.DataFrame(index = tuple(paths), columns = [0])
-        for path in paths:
-                same_path_costs.loc[path] = get_path_cost(G, path.split('#'))
-        return same_path_costs
+# The cost of all paths is a single sparse matrix-vector product. When the same paths are scored in many graphs,
+# pass compiled_paths = compile_paths(paths) so the paths are only split once
+def get_costs_of_given_paths(G, paths, compiled_paths = None):
+	if compiled_paths is None:
+		compiled_paths = compile_paths(paths)
+	incidence, edges = compiled_paths
+	edge_weights = np.array([G[u][v]['weight'] for u, v in edges], dtype = float)
+	return pd.DataFrame(incidence @ edge_weights, index = tuple(paths), columns = [0])
@@ -0,0 +1,142 @@
+import numpy as np
+import scipy.special
+import scipy.stats
+
+import microarray_functions as mic_fun
+import randomization_functions as rand_fun
+import zscore_functions as zscore_fun
+
+# Online (streaming) z-scores: instead of holding the (paths x trials) matrix of randomized costs, every chunk of
+# trials is folded into per-path running moments (count, mean, and the sums of squared, cubed and fourth power
+# deviations M2, M3, M4) as soon as it is scored. Memory is O(paths), whatever the number of trials
+#
+# Approximation of the Box-Cox step: the Box-Cox lambda of a path is fitted on its first pilot_trials randomized costs
+# and the actual cost (instead of all trials), then kept fixed, and the moments of the transformed costs of all trials
+# are accumulated with it. With num_trials <= pilot_trials, the lambdas are those of zscore_fun.get_zscores_pvals,
+# and so are the results (up to rounding). The normaltest p-values are D'Agostino and Pearson's test computed from
+# the moments, as scipy.stats.normaltest computes it from the values
+
+# Default number of trials the Box-Cox lambdas are fitted on
+PILOT_TRIALS = 100
+
+# Running moments of every row of a (paths x trials) matrix, given a few columns at a time
+class RunningMoments:
+	def __init__(self, num_paths):
+		self.count = 0
+		self.mean = np.zeros(num_paths)
+		self.M2 = np.zeros(num_paths)
+		self.M3 = np.zeros(num_paths)
+		self.M4 = np.zeros(num_paths)
+
+	# values -> array (paths x k). Chunks are merged with the pairwise formulas of Chan et al. and Pebay
+	def update(self, values):
+		n_b = values.shape[1]
+		if n_b == 0:
+			return
+		mean_b = values.mean(axis = 1)
+		centered = values - mean_b[:, None]
+		M2_b = (centered**2).sum(axis = 1)
+		M3_b = (centered**3).sum(axis = 1)
+		M4_b = (centered**4).sum(axis = 1)
+		n_a = self.count
+		n = n_a + n_b
+		delta = mean_b - self.mean
+		self.M4 = self.M4 + M4_b + delta**4 * n_a*n_b*(n_a*n_a - n_a*n_b + n_b*n_b)/n**3 + 6*delta**2 * (n_a*n_a*M2_b + n_b*n_b*self.M2)/n**2 + 4*delta*(n_a*M3_b - n_b*self.M3)/n
+		self.M3 = self.M3 + M3_b + delta**3 * n_a*n_b*(n_a - n_b)/n**2 + 3*delta*(n_a*M2_b - n_b*self.M2)/n
+		self.M2 = self.M2 + M2_b + delta**2 * n_a*n_b/n
+		self.mean = self.mean + delta*n_b/n
+		self.count = n
+
+	# Population variance (as np.var / np.std with ddof = 0)
+	def variance(self):
+		return self.M2/self.count
+
+	def to_arrays(self, prefix):
+		return {prefix + 'count': np.array(self.count), prefix + 'mean': self.mean, prefix + 'M2': self.M2, prefix + 'M3': self.M3, prefix + 'M4': self.M4}
+
+	@classmethod
+	def from_arrays(cls, arrays, prefix):
+		moments = cls(0)
+		moments.count = int(arrays[prefix + 'count'])
+		moments.mean, moments.M2, moments.M3, moments.M4 = (arrays[prefix + key] for key in ('mean', 'M2', 'M3', 'M4'))
+		return moments
+
+# p-value of D'Agostino and Pearson's normality test for every row, from its running moments
+# Same formulas as scipy.stats.skewtest, kurtosistest and normaltest (biased skewness and kurtosis)
+def get_normaltest_pvals(moments):
+	n = float(moments.count)
+	with np.errstate(all = 'ignore'):
+		m2 = moments.M2/n
+		skewness = (moments.M3/n)/m2**1.5
+		kurtosis = (moments.M4/n)/m2**2
+
+		y = skewness*np.sqrt(((n + 1)*(n + 3))/(6.0*(n - 2)))
+		beta2 = (3.0*(n**2 + 27*n - 70)*(n + 1)*(n + 3))/((n - 2.0)*(n + 5)*(n + 7)*(n + 9))
+		W2 = -1 + np.sqrt(2*(beta2 - 1))
+		delta = 1/np.sqrt(0.5*np.log(W2))
+		alpha = np.sqrt(2.0/(W2 - 1))
+		y = np.where(y == 0, 1, y)
+		skew_z = delta*np.log(y/alpha + np.sqrt((y/alpha)**2 + 1))
+
+		E = 3.0*(n - 1)/(n + 1)
+		varb2 = 24.0*n*(n - 2)*(n - 3)/((n + 1)*(n + 1.)*(n + 3)*(n + 5))
+		x = (kurtosis - E)/np.sqrt(varb2)
+		sqrtbeta1 = 6.0*(n*n - 5*n + 2)/((n + 7)*(n + 9))*np.sqrt((6.0*(n + 3)*(n + 5))/(n*(n - 2)*(n - 3)))
+		A = 6.0 + 8.0/sqrtbeta1*(2.0/sqrtbeta1 + np.sqrt(1 + 4.0/(sqrtbeta1**2)))
+		term1 = 1 - 2/(9.0*A)
+		denom = 1 + x*np.sqrt(2/(A - 4.0))
+		term2 = np.sign(denom)*np.where(denom == 0.0, np.nan, ((1 - 2.0/A)/np.abs(denom))**(1/3.0))
+		kurtosis_z = (term1 - term2)/np.sqrt(2/(9.0*A))
+	return scipy.stats.chi2.sf(skew_z**2 + kurtosis_z**2, 2)
+
+# Randomized costs of the paths, accumulated into running moments (see above) one chunk of trials at a time
+# G, SI, paths, nw_type, rng -> as for rand_fun.get_randomized_path_costs and mic_fun.get_randomized_single_sample_mult_pert_trials
+# Trials are drawn in the same order as in the batched mode of the Pij scripts, so they are the same values
+# Returns a dict of arrays (see get_zscores_pvals_from_stats): lambdas, and the moments of the raw and of the
+# Box-Cox transformed costs (prefixes raw_ and boxcox_), both including the actual cost
+def get_online_path_cost_stats(G, SI, paths, nw_type, num_trials, pilot_trials = PILOT_TRIALS, rng = None):
+	path_cost_inputs = rand_fun.get_path_cost_inputs(G, SI.index, paths)
+	trials_per_batch = rand_fun.get_trials_per_batch(path_cost_inputs, len(paths))
+	pilot_trials = max(1, min(pilot_trials, num_trials))
+	actual_costs = paths.costs[:, None]
+
+	raw_moments = RunningMoments(len(paths))
+	boxcox_moments = RunningMoments(len(paths))
+	raw_moments.update(actual_costs)
+	pilot_costs = np.empty((len(paths), pilot_trials))
+	lambdas = None
+
+	# Chunks of trials, split at pilot_trials
+	boundaries = sorted(set(list(range(0, num_trials, trials_per_batch)) + [pilot_trials, num_trials]))
+	for start, end in zip(boundaries[:-1], boundaries[1:]):
+		randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, end - start, rng)
+		costs = rand_fun.get_path_costs_from_SI(path_cost_inputs, randomized_SI, nw_type)
+		raw_moments.update(costs)
+		if end <= pilot_trials:
+			pilot_costs[:, start:end] = costs
+		else:
+			with np.errstate(all = 'ignore'):
+				boxcox_moments.update(scipy.special.boxcox(costs, lambdas[:, None]))
+		if end == pilot_trials:
+			# Same order of values as zscore_fun.get_zscores_pvals_boxcox_block: randomized costs, then the actual cost
+			lambdas = zscore_fun.get_boxcox_lambdas(np.column_stack((pilot_costs, actual_costs)))
+			with np.errstate(all = 'ignore'):
+				boxcox_moments.update(scipy.special.boxcox(np.column_stack((pilot_costs, actual_costs)), lambdas[:, None]))
+			pilot_costs = None
+		print("Accumulated statistics of ", end, " trials")
+
+	stats = {'lambdas': lambdas, 'pilot_trials': np.array(pilot_trials)}
+	stats.update(raw_moments.to_arrays('raw_'))
+	stats.update(boxcox_moments.to_arrays('boxcox_'))
+	return stats
+
+# Z-scores and p-values from the statistics of get_online_path_cost_stats
+# actual_costs -> array (paths). Returns an array (paths x 4) with columns zscore_fun.ZSCORE_COLUMNS
+def get_zscores_pvals_from_stats(actual_costs, stats):
+	raw_moments = RunningMoments.from_arrays(stats, 'raw_')
+	boxcox_moments = RunningMoments.from_arrays(stats, 'boxcox_')
+	with np.errstate(all = 'ignore'):
+		actual_boxcox = scipy.special.boxcox(actual_costs, stats['lambdas'])
+		zscores = (actual_boxcox - boxcox_moments.mean)/np.sqrt(boxcox_moments.variance())
+	two_sided_zscore_pvals = scipy.stats.norm.sf(np.abs(zscores))*2
+	return np.column_stack((get_normaltest_pvals(raw_moments), get_normaltest_pvals(boxcox_moments), zscores, two_sided_zscore_pvals))
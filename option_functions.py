@@ -0,0 +1,30 @@
+import sys
+
+# Optional arguments are given after the required ones, as name=value (eg: workers=8)
+# defaults is a dict of option name -> default value. The type of the default value is used to
+# convert the value given on the command line
+# types is a dict of option name -> type, for options whose default is None but whose value is not a string
+# (eg: {'norm_cost_cutoff': float}). Other options with a None default are kept as strings
+# Returns a dict with a value for every option
+def parse_options(args, defaults, types = {}):
+	options = dict(defaults)
+	for arg in args:
+		name, sep, value = arg.partition('=')
+		if sep == '' or name not in defaults:
+			print("Unknown optional argument ", arg, ". Known optional arguments: ", ", ".join(sorted(defaults)))
+			sys.exit(1)
+		if name in types:
+			options[name] = types[name](value)
+		elif defaults[name] is None or isinstance(defaults[name], str):
+			options[name] = value
+		elif isinstance(defaults[name], bool):
+			options[name] = value.lower() in ('1', 'true', 'yes')
+		else:
+			options[name] = type(defaults[name])(value)
+	return options
+
+# Exit with a message if option name is not one of choices (eg: a tuple such as sp_fun.SP_ENGINES)
+def check_choice(options, name, choices):
+	if options[name] not in choices:
+		print("Unknown ", name, " ", options[name], ". Use one of: ", ", ".join(choices))
+		sys.exit(1)
@@ -0,0 +1,18 @@
+import multiprocessing as mp
+import concurrent.futures
+
+# The PathExt scripts run their code at module level, so worker processes must not re-import the
+# main script (which the 'spawn' and 'forkserver' start methods do). We fork workers wherever possible
+def get_mp_context():
+	if 'fork' in mp.get_all_start_methods():
+		return mp.get_context('fork')
+	return mp.get_context()
+
+# Pool of worker processes. Use it as a context manager
+def get_process_pool(workers, initializer = None, initargs = ()):
+	return get_mp_context().Pool(workers, initializer = initializer, initargs = initargs)
+
+# Pool of worker processes that can start pools of their own (the workers of get_process_pool are daemonic,
+# so they cannot). Use it as a context manager
+def get_process_executor(workers, initializer = None, initargs = ()):
+	return concurrent.futures.ProcessPoolExecutor(workers, mp_context = get_mp_context(), initializer = initializer, initargs = initargs)
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+import network_functions as net_fun
+
+# Number of hops (edges) in each path, found by walking the predecessors of all paths at once
+# pred -> predecessor rows, pred_rows -> row of pred for every path, dst -> target of every path
+def get_hops(pred, pred_rows, dst):
+	hops = np.zeros(len(dst), dtype = np.int32)
+	current = np.array(dst, dtype = np.int32)
+	active = np.arange(len(dst))
+	while len(active) > 0:
+		previous = pred[pred_rows[active], current[active]]
+		active = active[previous >= 0]
+		current[active] = previous[previous >= 0]
+		hops[active] += 1
+	return hops
+
+# A set of shortest paths, stored without building a string (or a list of nodes) for every path
+# Path k goes from node src[k] to node dst[k] (node ids of a graph_fun.CompactGraph) and has cost costs[k]
+# The nodes on the path are given by a predecessor matrix: pred[pred_rows[k]] is the row of predecessors
+# for the source of path k, as computed by the shortest path search from that source
+# Paths are only rebuilt on demand (get_packed_paths), typically after the percentile filter has dropped
+# most of them. Packed paths are stored as offsets + node ids: the nodes of path k are
+# path_nodes[offsets[k]:offsets[k+1]]. Path strings (nodes separated by #) are only built for text output
+class PathSet:
+	def __init__(self, nodes, src, dst, costs, pred, pred_rows, hops = None):
+		self.nodes = nodes
+		self.src = np.asarray(src, dtype = np.int32)
+		self.dst = np.asarray(dst, dtype = np.int32)
+		self.costs = np.asarray(costs, dtype = float)
+		self.pred = pred
+		self.pred_rows = np.asarray(pred_rows, dtype = np.int32)
+		self.hops = hops
+		self.packed_paths = None
+		self.path_strings = None
+		self.path_edges = None
+		self.path_edge_matrix = None
+
+	# Collect the output of sp_fun.iter_sp_from_sources: (source, targets, costs, pred) for each source
+	@classmethod
+	def from_sp_results(cls, nodes, sp_results):
+		src, dst, costs, pred = [], [], [], []
+		for source, source_targets, source_costs, source_pred in sp_results:
+			if len(source_targets) == 0:
+				continue
+			src.append(np.full(len(source_targets), source, dtype = np.int32))
+			dst.append(np.asarray(source_targets, dtype = np.int32))
+			costs.append(source_costs)
+			pred.append(source_pred)
+		if len(src) == 0:
+			return cls(nodes, [], [], [], np.zeros((0, len(nodes)), dtype = np.int32), [])
+		pred_rows = np.concatenate([np.full(len(d), i, dtype = np.int32) for i, d in enumerate(dst)])
+		return cls(nodes, np.concatenate(src), np.concatenate(dst), np.concatenate(costs), np.vstack(pred), pred_rows)
+
+	# PathSet of paths already packed as offsets + node ids (see get_packed_paths), without predecessors
+	@classmethod
+	def from_packed_paths(cls, nodes, src, dst, costs, offsets, path_nodes):
+		paths = cls(nodes, src, dst, costs, None, np.zeros(len(src), dtype = np.int32), np.diff(offsets) - 1)
+		paths.packed_paths = (np.asarray(offsets, dtype = np.int64), np.asarray(path_nodes, dtype = np.int32))
+		return paths
+
+	# Concatenate PathSets of the same nodes, packing their paths
+	@classmethod
+	def concat(cls, nodes, path_sets):
+		if len(path_sets) == 0:
+			return cls.from_packed_paths(nodes, [], [], [], [0], [])
+		packed = [paths.get_packed_paths() for paths in path_sets]
+		offsets = np.concatenate([[0]] + [offsets[1:] for offsets, path_nodes in packed])
+		offsets[1:] += np.repeat(np.cumsum([0] + [len(path_nodes) for offsets, path_nodes in packed[:-1]]), [len(paths) for paths in path_sets])
+		return cls.from_packed_paths(nodes, np.concatenate([paths.src for paths in path_sets]), np.concatenate([paths.dst for paths in path_sets]),
+			np.concatenate([paths.costs for paths in path_sets]), offsets, np.concatenate([path_nodes for offsets, path_nodes in packed]))
+
+	def __len__(self):
+		return len(self.src)
+
+	# Number of hops (edges) in each path (see get_hops)
+	def get_hops(self):
+		if self.hops is None:
+			self.hops = get_hops(self.pred, self.pred_rows, self.dst)
+		return self.hops
+
+	# Return a new PathSet with only the selected paths (boolean mask or integer indices, in that order)
+	# The predecessor matrix is shared, not copied
+	def subset(self, selection):
+		selection = np.asarray(selection)
+		if selection.dtype == bool:
+			selection = np.flatnonzero(selection)
+		if self.packed_paths is not None:
+			offsets, path_nodes = self.packed_paths
+			starts = offsets[selection]
+			lengths = offsets[selection + 1] - starts
+			new_offsets = np.concatenate(([0], np.cumsum(lengths)))
+			positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+			subset_paths = PathSet(self.nodes, self.src[selection], self.dst[selection], self.costs[selection], None, self.pred_rows[selection])
+			subset_paths.packed_paths = (new_offsets, path_nodes[positions])
+		else:
+			subset_paths = PathSet(self.nodes, self.src[selection], self.dst[selection], self.costs[selection], self.pred, self.pred_rows[selection])
+		if self.hops is not None:
+			subset_paths.hops = self.hops[selection]
+		return subset_paths
+
+	# Rebuild the nodes on every path, walking back from the targets along the predecessors
+	# Returns (offsets, path_nodes). Once paths are packed, the predecessor matrix is released
+	def get_packed_paths(self):
+		if self.packed_paths is None:
+			hops = self.get_hops().astype(np.int64)
+			offsets = np.concatenate(([0], np.cumsum(hops + 1)))
+			path_nodes = np.empty(offsets[-1], dtype = np.int32)
+			current = self.dst.copy()
+			position = offsets[1:] - 1
+			path_nodes[position] = current
+			active = np.flatnonzero(hops > 0)
+			while len(active) > 0:
+				current[active] = self.pred[self.pred_rows[active], current[active]]
+				position[active] -= 1
+				path_nodes[position[active]] = current[active]
+				active = active[position[active] > offsets[active]]
+			self.packed_paths = (offsets, path_nodes)
+			self.pred = None
+		return self.packed_paths
+
+	# Node names on path k
+	def get_path(self, k):
+		offsets, path_nodes = self.get_packed_paths()
+		return list(self.nodes[path_nodes[offsets[k]:offsets[k+1]]])
+
+	# Paths as strings, with nodes separated by # (eg: 'a#b#c')
+	def get_path_strings(self):
+		if self.path_strings is None:
+			offsets, path_nodes = self.get_packed_paths()
+			node_names = self.nodes[path_nodes]
+			self.path_strings = ['#'.join(node_names[offsets[k]:offsets[k+1]]) for k in range(len(self))]
+		return self.path_strings
+
+	# Edge ids (in G, a graph_fun.CompactGraph) of the consecutive edges of every path, and the number of hops
+	# of every path. Graphs derived from the same unweighted network share edge ids, so this is computed once
+	# Raises ValueError if a path uses a pair of nodes which is not an edge of G
+	def get_path_edges(self, G):
+		if self.path_edges is None:
+			offsets, path_nodes = self.get_packed_paths()
+			is_last = np.zeros(len(path_nodes), dtype = bool)
+			is_last[offsets[1:] - 1] = True
+			u = path_nodes[:-1][~is_last[:-1]]
+			v = path_nodes[1:][~is_last[:-1]]
+			edge_ids = G.get_edge_ids(u, v)
+			if np.any(edge_ids < 0):
+				k = np.flatnonzero(edge_ids < 0)[0]
+				raise ValueError("Edge " + G.nodes[u[k]] + " -> " + G.nodes[v[k]] + " of a path is not in the network")
+			self.path_edges = (edge_ids, np.diff(offsets) - 1)
+		return self.path_edges
+
+	# Path-edge incidence matrix over the distinct edges used by the paths (see net_fun.get_path_edge_matrix)
+	# Returns (edge ids of the columns, incidence matrix)
+	def get_path_edge_matrix(self, G):
+		if self.path_edge_matrix is None:
+			edge_ids, num_hops = self.get_path_edges(G)
+			column_edges, edge_columns = np.unique(edge_ids, return_inverse = True)
+			self.path_edge_matrix = (column_edges, net_fun.get_path_edge_matrix(edge_columns, num_hops, len(column_edges)))
+		return self.path_edge_matrix
+
+	# Cost of every path in G, a graph_fun.CompactGraph sharing the topology of the graph the paths were found in
+	# NaN for paths using an edge that G dropped (eg: with a non-positive weight), ValueError for a pair of nodes
+	# which is not an edge of its topology (see get_path_edges)
+	def get_costs_in_graph(self, G):
+		column_edges, incidence = self.get_path_edge_matrix(G)
+		return incidence @ G.weights[column_edges]
+
+	# Boolean array, True for paths going through at least one of the given node ids
+	def get_paths_with_nodes(self, node_ids):
+		offsets, path_nodes = self.get_packed_paths()
+		on_path = np.isin(path_nodes, np.asarray(list(node_ids), dtype = np.int64))
+		counts = np.add.reduceat(on_path.astype(np.int64), offsets[:-1]) if len(self) > 0 else np.zeros(0)
+		return counts > 0
+
+	# Pandas dataframe in the format used by the Pij files
+	# Index will be the full path, with nodes separated by #
+	# The column value will be the cost of that path (or the given costs, eg: in a randomized network)
+	def to_frame(self, costs = None):
+		if costs is None:
+			costs = self.costs
+		return pd.DataFrame(costs, index = self.get_path_strings(), columns = [0])
@@ -1,5 +1,19 @@
 import numpy as np
 
+import path_functions as path_fun
+import profile_functions as prof_fun
+import shortest_path_functions as sp_fun
+
+# How the percentile selection gets the shortest paths (see get_sp_paths_percentile_norm_cost)
+PERCENTILE_MODES = ('in_memory', 'streaming', 'bounded')
+
+# In the bounded mode, the normalized cost cutoff is estimated from the shortest paths of this many sources
+# as the percentile of their normalized costs, CUTOFF_PERCENTILE_MARGIN percentiles above the requested one
+CUTOFF_SAMPLE_SOURCES = 100
+CUTOFF_PERCENTILE_MARGIN = 5
+# If the cutoff turns out to be below the percentile threshold, it is multiplied by this factor and the search is run again
+CUTOFF_GROWTH = 2
+
 def get_Pij_percentile_norm_cost(Pij, percentile, path_length_thresh):
 	# Add new columns 1 -> path length (number of hops)
 	# 2 -> normalised cost (cost/path length)
@@ -27,3 +41,188 @@ def get_Pij_percentile_norm_cost(Pij, percentile, path_length_thresh):
 	#print("Done dropping the column with normalized costs")
 
 	return Pij
+
+# Same selection as get_Pij_percentile_norm_cost, for paths given as a path_fun.PathSet
+# Hop counts come from the predecessors, so no path strings are built or split
+# Returns a PathSet with the retained paths, sorted by normalized cost
+def get_paths_percentile_norm_cost(paths, percentile, path_length_thresh):
+	# Only retain paths whose length >= path_length_thresh
+	hops = paths.get_hops()
+	long_paths = np.flatnonzero(hops >= path_length_thresh)
+
+	# Sort by normalized cost (cost/path length), with the same sort as pandas' sort_values
+	norm_costs = paths.costs[long_paths]/hops[long_paths]
+	order = np.argsort(norm_costs, kind = 'quicksort')
+	long_paths = long_paths[order]
+	norm_costs = norm_costs[order]
+
+	# Get cost corresponding to percentile
+	path_cost_thresh = np.percentile(norm_costs, percentile)
+
+	# Keep only rows with length >= path_length_thresh AND cost < path_cost_thresh
+	return paths.subset(long_paths[norm_costs < path_cost_thresh])
+
+# Ranks (0-based) of the two sorted values np.percentile interpolates between, for n values,
+# and the interpolation weight. Mirrors numpy's computation (method 'linear')
+def get_percentile_ranks(n, percentile):
+	q = np.float64(percentile)/100
+	virtual_index = (n - 1)*q
+	if virtual_index >= n - 1:
+		previous_index = next_index = n - 1
+	elif virtual_index < 0:
+		previous_index = next_index = 0
+	else:
+		previous_index = int(np.floor(virtual_index))
+		next_index = previous_index + 1
+	return previous_index, next_index, virtual_index - previous_index
+
+# Interpolate between the values at the ranks of get_percentile_ranks, as np.percentile does
+def interpolate_percentile(previous_value, next_value, gamma):
+	diff = next_value - previous_value
+	if gamma >= 0.5:
+		return next_value - diff*(1 - gamma)
+	return previous_value + diff*gamma
+
+# Cost, hops and normalized cost of the paths with length >= path_length_thresh from one source,
+# for an item (source, targets, costs, pred) of sp_fun.iter_sp_from_sources
+def get_long_paths_from_source(sp_result, path_length_thresh):
+	source, targets, costs, pred = sp_result
+	hops = path_fun.get_hops(pred[None, :], np.zeros(len(targets), dtype = np.int32), targets)
+	long_paths = hops >= path_length_thresh
+	return targets[long_paths], costs[long_paths], hops[long_paths], costs[long_paths]/hops[long_paths]
+
+# Same selection as get_paths_percentile_norm_cost, without holding all shortest paths in memory
+# G -> graph_fun.CompactGraph, engine and workers select the shortest path engine (see sp_fun.SP_ENGINES)
+# Shortest paths are consumed source by source, in two passes over the sources:
+# 1. Keep only the normalized costs of the long paths, as float32, and find the float32 values at the
+#    ranks np.percentile interpolates between (np.partition, no full sort)
+# 2. Search again. Rounding to float32 keeps the order of the costs, so the exact (float64) values at these
+#    ranks are among the paths whose float32 cost lies between the two float32 values. Only paths whose
+#    float32 cost is at most the upper one are packed, without keeping the predecessors of any source
+# The threshold is the one np.percentile would give on all normalized costs, so the same paths are retained
+# Returns a PathSet with the retained paths, sorted by normalized cost (ties in source order)
+def get_paths_percentile_norm_cost_streaming(G, percentile, path_length_thresh, engine = 'dijkstra', workers = 1):
+	# Pass 1
+	norm_costs_32 = []
+	for sp_result in sp_fun.iter_sp_from_sources(G, engine, workers):
+		norm_costs_32.append(get_long_paths_from_source(sp_result, path_length_thresh)[3].astype(np.float32))
+	norm_costs_32 = np.concatenate(norm_costs_32) if len(norm_costs_32) > 0 else np.zeros(0, dtype = np.float32)
+	num_long_paths = len(norm_costs_32)
+	print("Got normalized costs for ", num_long_paths, " node-pairs with length >= ", path_length_thresh)
+	if num_long_paths == 0:
+		return path_fun.PathSet.concat(G.nodes, [])
+
+	previous_index, next_index, gamma = get_percentile_ranks(num_long_paths, percentile)
+	norm_costs_32.partition([previous_index, next_index])
+	lower_32, upper_32 = norm_costs_32[previous_index], norm_costs_32[next_index]
+	num_below = np.count_nonzero(norm_costs_32 < lower_32)
+	del norm_costs_32
+
+	# Pass 2
+	tied_norm_costs = []
+	candidates = []
+	candidate_norm_costs = []
+	for sp_result in sp_fun.iter_sp_from_sources(G, engine, workers):
+		targets, costs, hops, norm_costs = get_long_paths_from_source(sp_result, path_length_thresh)
+		rounded = norm_costs.astype(np.float32)
+		tied_norm_costs.append(norm_costs[(rounded >= lower_32) & (rounded <= upper_32)])
+		keep = rounded <= upper_32
+		if np.any(keep):
+			source, pred = sp_result[0], sp_result[3]
+			candidates.append(path_fun.PathSet(G.nodes, np.full(np.count_nonzero(keep), source), targets[keep], costs[keep], pred[None, :], np.zeros(np.count_nonzero(keep), dtype = np.int32), hops[keep]))
+			candidates[-1].get_packed_paths()
+			candidate_norm_costs.append(norm_costs[keep])
+	tied_norm_costs = np.concatenate(tied_norm_costs)
+	candidates = path_fun.PathSet.concat(G.nodes, candidates)
+	candidate_norm_costs = np.concatenate(candidate_norm_costs) if len(candidate_norm_costs) > 0 else np.zeros(0)
+
+	# Get cost corresponding to percentile
+	tied_ranks = [previous_index - num_below, next_index - num_below]
+	tied_norm_costs.partition(tied_ranks)
+	path_cost_thresh = interpolate_percentile(tied_norm_costs[tied_ranks[0]], tied_norm_costs[tied_ranks[1]], gamma)
+
+	# Keep only rows with length >= path_length_thresh AND cost < path_cost_thresh
+	retained = np.flatnonzero(candidate_norm_costs < path_cost_thresh)
+	retained = retained[np.argsort(candidate_norm_costs[retained], kind = 'stable')]
+	return candidates.subset(retained)
+
+# Estimate a normalized cost cutoff above the percentile threshold from the shortest paths of
+# CUTOFF_SAMPLE_SOURCES sources, evenly spread over the nodes of G
+def estimate_norm_cost_cutoff(G, percentile, path_length_thresh, engine = 'dijkstra', workers = 1):
+	sources = G.get_active_nodes()
+	sources = np.unique(sources[np.linspace(0, len(sources) - 1, min(CUTOFF_SAMPLE_SOURCES, len(sources))).astype(int)])
+	norm_costs = [get_long_paths_from_source(sp_result, path_length_thresh)[3] for sp_result in sp_fun.iter_sp_from_sources(G, engine, workers, sources)]
+	norm_costs = np.concatenate(norm_costs) if len(norm_costs) > 0 else np.zeros(0)
+	if len(norm_costs) == 0:
+		return np.inf
+	return np.percentile(norm_costs, min(100, percentile + CUTOFF_PERCENTILE_MARGIN))
+
+# Same selection as get_paths_percentile_norm_cost, keeping only the shortest paths under a normalized cost cutoff
+# G -> graph_fun.CompactGraph, engine and workers select the shortest path engine (see sp_fun.SP_ENGINES)
+# norm_cost_cutoff -> normalized cost cutoff, estimated by estimate_norm_cost_cutoff if None. 0 (or less) for no cutoff
+# Each shortest path search only emits the paths with length >= path_length_thresh and normalized cost
+# below the cutoff, and counts the paths with length >= path_length_thresh. As long as the cutoff is above
+# the values at the ranks np.percentile interpolates between, these values are among the emitted paths and
+# the threshold is exact. Otherwise the cutoff is raised (CUTOFF_GROWTH) and the search is run again
+# Returns a PathSet with the retained paths, sorted by normalized cost (ties in source order)
+def get_paths_percentile_norm_cost_bounded(G, percentile, path_length_thresh, engine = 'dijkstra', workers = 1, norm_cost_cutoff = None):
+	if norm_cost_cutoff is None:
+		norm_cost_cutoff = estimate_norm_cost_cutoff(G, percentile, path_length_thresh, engine, workers)
+	if not norm_cost_cutoff > 0:
+		norm_cost_cutoff = np.inf
+	while True:
+		print("Searching for shortest paths with normalized cost below ", norm_cost_cutoff)
+		candidates = []
+		num_long_paths = 0
+		for source, paths, source_long_paths in sp_fun.iter_bounded_sp_from_sources(G, path_length_thresh, norm_cost_cutoff, engine, workers):
+			if len(paths) > 0:
+				candidates.append(paths)
+			num_long_paths += source_long_paths
+		candidates = path_fun.PathSet.concat(G.nodes, candidates)
+		print("Got ", len(candidates), " of ", num_long_paths, " node-pairs with length >= ", path_length_thresh)
+		if num_long_paths == 0:
+			return candidates
+		previous_index, next_index, gamma = get_percentile_ranks(num_long_paths, percentile)
+		if len(candidates) > next_index or norm_cost_cutoff == np.inf:
+			break
+		norm_cost_cutoff = norm_cost_cutoff*CUTOFF_GROWTH
+		print("Normalized cost cutoff is below the percentile threshold, raising it")
+
+	# Get cost corresponding to percentile
+	candidate_norm_costs = candidates.costs/candidates.get_hops()
+	ranked_norm_costs = candidate_norm_costs.copy()
+	ranked_norm_costs.partition([previous_index, next_index])
+	path_cost_thresh = interpolate_percentile(ranked_norm_costs[previous_index], ranked_norm_costs[next_index], gamma)
+
+	# Keep only rows with length >= path_length_thresh AND cost < path_cost_thresh
+	retained = np.flatnonzero(candidate_norm_costs < path_cost_thresh)
+	retained = retained[np.argsort(candidate_norm_costs[retained], kind = 'stable')]
+	return candidates.subset(retained)
+
+# Shortest paths of G (graph_fun.CompactGraph) retained by the percentile selection
+# mode -> 'in_memory' (all shortest paths as one PathSet, then get_paths_percentile_norm_cost),
+# 'streaming' (get_paths_percentile_norm_cost_streaming) or 'bounded' (get_paths_percentile_norm_cost_bounded,
+# with norm_cost_cutoff as the cutoff)
+# The search and selection are profiled as stages shortest_paths and percentile_selection (in_memory),
+# or shortest_paths_percentile (streaming and bounded, where they are interleaved)
+def get_sp_paths_percentile_norm_cost(G, percentile, path_length_thresh, engine = 'dijkstra', workers = 1, mode = 'in_memory', norm_cost_cutoff = None):
+	if mode not in PERCENTILE_MODES:
+		raise ValueError("Unknown percentile mode " + mode + ", use one of " + ", ".join(PERCENTILE_MODES))
+	if mode == 'streaming':
+		with prof_fun.stage('shortest_paths_percentile') as record:
+			Pij = get_paths_percentile_norm_cost_streaming(G, percentile, path_length_thresh, engine, workers)
+			record['items'] = len(Pij)
+		return Pij
+	if mode == 'bounded':
+		with prof_fun.stage('shortest_paths_percentile') as record:
+			Pij = get_paths_percentile_norm_cost_bounded(G, percentile, path_length_thresh, engine, workers, norm_cost_cutoff)
+			record['items'] = len(Pij)
+		return Pij
+	with prof_fun.stage('shortest_paths') as record:
+		Pij = sp_fun.get_all_sp_paths(G, engine, workers)
+		record['items'] = len(Pij)
+	print("Got shortest path costs for ", len(Pij), " node-pairs")
+	with prof_fun.stage('percentile_selection') as record:
+		Pij = get_paths_percentile_norm_cost(Pij, percentile, path_length_thresh)
+		record['items'] = len(Pij)
+	return Pij
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Pij files pass path costs from the Pij scripts (activated/repressed_response_Pijs.py) to fdr_rand_pijs_boxcox.py
+# Two formats are supported:
+# 1. A folder of tab-delimited files, one per trial: <prefix>_actual.txt for the actual data and
+#    <prefix>_<i>.txt for randomization i, each indexed by the path string (nodes separated by #)
+# 2. A single .npz file holding the whole (paths x trials) matrix:
+#    nodes, offsets, path_nodes -> paths, packed as in path_fun.PathSet (path k is nodes[path_nodes[offsets[k]:offsets[k+1]]])
+#    actual -> cost of every path in the actual data
+#    randomized -> (paths x trials) costs of the same paths in every randomization
+#    num_trials -> (only with adaptive randomizations) number of trials run for every path. The randomized costs of
+#    path k are randomized[k, :num_trials[k]], the rest of the row is NaN
+#    The file is written and read in one go, and path strings are only built for the final text output
+#    A shard (the Pij scripts with shard=start:end) is an .npz file as above, holding the randomizations of a range of
+#    trials only, plus: trials -> the trial numbers of the columns of randomized, total_trials -> number of trials of
+#    the whole run, seed -> master seed of the per-trial seeds. Shards are merged into one .npz file by merge_pij_shards.py
+# 3. A single .npz file of per-path statistics of the randomized costs, instead of the costs themselves (output=stats,
+#    see online_fun.get_online_path_cost_stats): nodes, offsets, path_nodes and actual as above, plus the arrays of the statistics
+
+# Output formats of the Pij scripts (output option): 'txt' -> format 1, 'npz' -> format 2, 'stats' -> format 3
+PIJ_OUTPUTS = ('txt', 'npz', 'stats')
+
+# paths -> path_fun.PathSet, actual_costs -> array (paths), randomized_costs -> array (paths x trials)
+# num_trials -> None, or the number of trials of every path (see above)
+def write_pij_npz(fname, paths, randomized_costs, actual_costs = None, num_trials = None):
+	if actual_costs is None:
+		actual_costs = paths.costs
+	offsets, path_nodes = paths.get_packed_paths()
+	arrays = {'nodes': paths.nodes.astype(str), 'offsets': offsets, 'path_nodes': path_nodes, 'actual': actual_costs, 'randomized': randomized_costs}
+	if num_trials is not None:
+		arrays['num_trials'] = num_trials
+	np.savez(fname, **arrays)
+
+# Shard of the randomizations of trials (see above), with per-trial seeds derived from seed
+def write_pij_shard_npz(fname, paths, randomized_costs, trials, total_trials, seed):
+	offsets, path_nodes = paths.get_packed_paths()
+	np.savez(fname, nodes = paths.nodes.astype(str), offsets = offsets, path_nodes = path_nodes, actual = paths.costs, randomized = randomized_costs, trials = np.asarray(trials), total_trials = np.array(total_trials), seed = np.array(seed))
+
+# True for an .npz file written by write_pij_shard_npz
+def is_pij_shard(pij_fname):
+	if os.path.isdir(pij_fname):
+		return False
+	with np.load(pij_fname) as pij_file:
+		return 'total_trials' in pij_file.files
+
+# Merge shards written by write_pij_shard_npz into one .npz file of all trials (as written by write_pij_npz)
+# The shards must be of the same paths, actual costs, number of trials and seed, and their trials must cover
+# every trial of the run exactly once. Columns are put in trial order, so the merged file does not depend on the
+# way the trials were split
+def merge_pij_shards(shard_fnames, out_fname):
+	shards = []
+	for fname in shard_fnames:
+		with np.load(fname) as pij_file:
+			shards.append({key: pij_file[key] for key in pij_file.files})
+		print("Read ", len(shards[-1]['trials']), " trials of ", len(shards[-1]['actual']), " paths from ", fname)
+	first = shards[0]
+	for fname, shard in zip(shard_fnames, shards):
+		for key in ('nodes', 'offsets', 'path_nodes', 'actual', 'total_trials', 'seed'):
+			if not np.array_equal(shard[key], first[key]):
+				raise ValueError("Shard " + fname + " differs from shard " + shard_fnames[0] + " in " + key + ": shards must come from the same run")
+	total_trials = int(first['total_trials'])
+	trials = np.concatenate([shard['trials'] for shard in shards])
+	if len(trials) != total_trials or not np.array_equal(np.sort(trials), np.arange(total_trials)):
+		raise ValueError("Shards hold " + str(len(trials)) + " trials (" + str(len(np.unique(trials))) + " distinct), they must hold trials 0 to " + str(total_trials - 1) + " once each")
+	randomized_costs = np.empty((len(first['actual']), total_trials))
+	randomized_costs[:, trials] = np.concatenate([shard['randomized'] for shard in shards], axis = 1)
+	np.savez(out_fname, nodes = first['nodes'], offsets = first['offsets'], path_nodes = first['path_nodes'], actual = first['actual'], randomized = randomized_costs)
+	return total_trials
+
+# Returns (path strings, actual costs, randomized costs (paths x trials))
+def read_pij_npz(fname):
+	with np.load(fname) as pij_file:
+		nodes = pij_file['nodes'].astype(object)
+		offsets = pij_file['offsets']
+		path_nodes = pij_file['path_nodes']
+		actual_costs = pij_file['actual']
+		randomized_costs = pij_file['randomized']
+	return get_path_strings(nodes, offsets, path_nodes), actual_costs, randomized_costs
+
+# Path strings of paths packed as in path_fun.PathSet
+def get_path_strings(nodes, offsets, path_nodes):
+	node_names = nodes[path_nodes]
+	return ['#'.join(node_names[offsets[k]:offsets[k+1]]) for k in range(len(offsets) - 1)]
+
+# paths -> path_fun.PathSet, stats -> dict of arrays (see online_fun.get_online_path_cost_stats)
+def write_pij_stats_npz(fname, paths, stats):
+	offsets, path_nodes = paths.get_packed_paths()
+	np.savez(fname, nodes = paths.nodes.astype(str), offsets = offsets, path_nodes = path_nodes, actual = paths.costs, **stats)
+
+# True for an .npz file written by write_pij_stats_npz
+def is_pij_stats(pij_fname):
+	if os.path.isdir(pij_fname):
+		return False
+	with np.load(pij_fname) as pij_file:
+		return 'randomized' not in pij_file.files
+
+# Returns (path strings, actual costs, dict of the arrays of the statistics)
+def read_pij_stats(fname):
+	with np.load(fname) as pij_file:
+		arrays = {key: pij_file[key] for key in pij_file.files}
+	path_strings = get_path_strings(arrays.pop('nodes').astype(object), arrays.pop('offsets'), arrays.pop('path_nodes'))
+	actual_costs = arrays.pop('actual')
+	print("Read statistics of ", len(path_strings), " paths from ", fname)
+	return path_strings, actual_costs, arrays
+
+# Number of trials of every path of an .npz Pij file, or None if all paths have all trials (or for a folder of Pij files)
+def read_pij_num_trials(pij_fname):
+	if os.path.isdir(pij_fname):
+		return None
+	with np.load(pij_fname) as pij_file:
+		if 'num_trials' not in pij_file.files:
+			return None
+		return pij_file['num_trials']
+
+# Pij dataframe as used by fdr_rand_pijs_boxcox.py, indexed by path string
+# Column 'actual' -> actual data, columns '0', '1', ... -> randomizations
+def get_pij_frame(path_strings, actual_costs, randomized_costs):
+	pij = pd.DataFrame(randomized_costs, index = path_strings, columns = [str(i) for i in range(randomized_costs.shape[1])])
+	pij.insert(0, 'actual', actual_costs)
+	return pij
+
+# Read the randomized Pij files, and concat them to the actual pij dataframe
+# All files are read first and concatenated once, so each column is only copied once
+def concat_randomised_pij_values(pij, rand_pij_files):
+	rand_pijs = [pij]
+	for i, f in enumerate(rand_pij_files):
+		print(f)
+		temp = pd.read_csv(f, sep = '\t')
+		temp = temp.set_index(temp.columns.values[0])
+		temp.columns = [str(i)]
+		rand_pijs.append(temp)
+	return pd.concat(rand_pijs, axis = 1)
+
+# Read a folder of Pij text files
+def read_pij_files(dir_name):
+	# Get all pij fnames
+	actual_data_fname = ""
+	rand_pij_files = []
+	for f in os.listdir(dir_name):
+		if os.path.isfile(os.path.join(dir_name, f)) and f.endswith(".txt"):
+			if "actual" in f:
+				actual_data_fname = os.path.join(dir_name, f)
+			else:
+				rand_pij_files.append(os.path.join(dir_name, f))
+	print("Found ", len(rand_pij_files), " files")
+	print("Actual data fname = ", actual_data_fname)
+
+	# Read actual data
+	pij = pd.read_table(actual_data_fname)
+	pij = pij.set_index(pij.columns.values[0]) # This allows us to access values by i#j
+	pij.columns = ['actual']
+	print("Actual pij has ", pij.shape[0], " rows and ", pij.shape[1], " columns")
+	print(pij.head())
+
+	# Read randomisations and concat to pij dataframe
+	pij = concat_randomised_pij_values(pij, rand_pij_files)
+	print("After reading all randomized pijs, we have ", pij.shape[0], " rows and ", pij.shape[1], " columns")
+	print(pij.head())
+	return pij
+
+# Read Pij values from either a folder of text files or an .npz file
+def read_pij(pij_fname):
+	if os.path.isdir(pij_fname):
+		return read_pij_files(pij_fname)
+	pij = get_pij_frame(*read_pij_npz(pij_fname))
+	print("Read ", pij.shape[0], " paths and ", pij.shape[1] - 1, " randomizations from ", pij_fname)
+	print(pij.head())
+	return pij
@@ -0,0 +1,219 @@
+import os
+
+import numpy as np
+
+import microarray_functions as mic_fun
+import percentile_functions as perc_fun
+import randomization_functions as rand_fun
+import zscore_functions as zscore_fun
+import fdr_functions as fdr_fun
+import topnet_functions as topnet_fun
+import parallel_functions as par_fun
+import shortest_path_functions as sp_fun
+
+# In-process version of get_Activated_Response_TopNet.sh / get_Repressed_Response_TopNet.sh
+# All steps (response network, top paths, randomizations, z-scores, BH correction, TopNet) run on arrays held
+# in memory, so the expression data and the network are read once for any number of samples
+
+# Response directions, and the type of weighted network each of them uses (see net_fun.get_node_weights)
+RESPONSE_TYPES = {'activated': 'activated_response', 'repressed': 'repressed_response'}
+
+# Files written to the output folder of a job, as named in the shell pipelines
+RESPONSE_NW_FNAME = 'response_network.txt'
+ZSCORES_FNAME = 'Pij_zscores.txt'
+FDR_FNAME = 'Pij_zscores_fdr.txt'
+TOPNET_FNAME = 'TopNet.txt'
+
+# Direction of a job running both responses, and the files it writes (see run_combined_response_pipeline)
+BOTH_DIRECTIONS = 'both'
+UNION_TOPNET_FNAME = 'Response_TopNet.txt'
+
+# Where the randomized SI values of a job come from
+# 'per_job' -> every job draws its own values with np.random.default_rng(seed), from the genes of its response
+#		network, as the Pij scripts do. A job gives the same TopNet edges as the shell pipeline with the same seed
+#		(see run_response_pipeline)
+# 'shared' -> values are drawn once for all genes, and every job uses the rows of its genes. Restructuring SI for a
+#		(perturbation, control) pair only reorders its columns, so every job draws from the same values of each gene
+DRAWS = ('shared', 'per_job')
+
+# Read a manifest of jobs: one job per line, tab-delimited
+# perturbation sample, control sample, direction (activated, repressed or both), and optionally a job name
+# (default: perturbation_control_direction), which is the name of the job's output folder
+# Empty lines and lines starting with # are skipped
+# Returns a list of (perturbation, control, direction, name)
+def read_manifest(fname):
+	jobs = []
+	with open(fname) as f:
+		for line in f:
+			fields = line.rstrip('\n').split('\t')
+			if fields[0].strip() == '' or fields[0].startswith('#'):
+				continue
+			if len(fields) < 3 or (fields[2] not in RESPONSE_TYPES and fields[2] != BOTH_DIRECTIONS):
+				raise ValueError("Manifest line " + line.rstrip('\n') + " should be perturbation, control, direction (" + ", ".join(list(RESPONSE_TYPES) + [BOTH_DIRECTIONS]) + ") and an optional name")
+			name = fields[3] if len(fields) > 3 and fields[3] != '' else '_'.join(fields[:3])
+			jobs.append((fields[0], fields[1], fields[2], name))
+	return jobs
+
+# Top paths of the actual response network
+# G_unweighted -> graph_fun.CompactGraph, SI -> restructured SI (see mic_fun.restructure_SI)
+# Writes the response network to response_nw_fname
+# Returns (paths, G_response, SI) with paths a path_fun.PathSet of the top paths, and SI restricted to
+# the genes of the response network
+def get_response_top_paths(G_unweighted, SI, direction, response_nw_fname, percentile, path_length_thresh, options):
+	G_response = G_unweighted.get_weighted_graph(mic_fun.get_relevant_SI(SI), RESPONSE_TYPES[direction])
+	response_nodes = G_response.get_active_node_names()
+	print("Got ", direction, " response network with ", len(response_nodes), " nodes and ", G_response.edge_mask().sum(), " edges")
+	SI = SI.drop(set(SI.index) - set(response_nodes))
+	G_response.write_weighted_edgelist(response_nw_fname)
+
+	paths = perc_fun.get_sp_paths_percentile_norm_cost(G_response, percentile, path_length_thresh, options['sp_engine'], options['workers'], options['percentile_mode'], options['norm_cost_cutoff'])
+	print("After taking percentile cutoff, got ", len(paths), " ", direction, " response paths")
+	return paths, G_response, SI
+
+# Randomized SI values for the genes of SI (num_trials x genes x 2)
+# shared_randomized_SI -> values drawn once for the genes of shared_index (see DRAWS), or None to draw them
+# for these genes with np.random.default_rng(seed), as the Pij scripts do
+def get_job_randomized_SI(SI, num_trials, seed, shared_randomized_SI = None, shared_index = None):
+	if shared_randomized_SI is None:
+		return mic_fun.get_randomized_single_sample_mult_pert_trials(SI, num_trials, np.random.default_rng(seed))
+	return shared_randomized_SI[:, shared_index.get_indexer(SI.index), :]
+
+# Run the response pipeline of one direction for one (perturbation, control) pair
+# SI -> restructured SI (see mic_fun.restructure_SI), out_dir -> output folder (files RESPONSE_NW_FNAME, ...)
+# options -> dict with sp_engine, workers, percentile_mode, norm_cost_cutoff, zscores and seed
+# shared_randomized_SI, shared_index -> see get_job_randomized_SI
+# Returns (G_response, support): the response network and the number of significant paths through each of its edges
+# The TopNet has the edges extract_fdr_network.py gives, listed in the order of the unweighted network rather than of the
+# written response network, and p-values may differ from the shell pipeline's in the last digit, as they skip the text z-score file
+def run_response_pipeline(G_unweighted, SI, direction, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options, shared_randomized_SI = None, shared_index = None):
+	os.makedirs(out_dir, exist_ok = True)
+	paths, G_response, SI = get_response_top_paths(G_unweighted, SI, direction, os.path.join(out_dir, RESPONSE_NW_FNAME), percentile, path_length_thresh, options)
+
+	# Cost of the top paths in every randomized response network
+	randomized_SI = get_job_randomized_SI(SI, num_trials, options['seed'], shared_randomized_SI, shared_index)
+	randomized_costs = rand_fun.get_randomized_path_costs(G_unweighted, randomized_SI, SI.index, paths, RESPONSE_TYPES[direction])
+	print("Got cost of ", direction, " response paths for ", num_trials, " trials")
+
+	# Z-scores, skipping paths from a node to itself (as fdr_rand_pijs_boxcox.py does)
+	path_strings = paths.get_path_strings()
+	kept = np.flatnonzero([ij.split('#')[0] != ij.split('#')[1] for ij in path_strings])
+	path_strings = [path_strings[k] for k in kept]
+	zscores = zscore_fun.get_zscores_pvals(np.column_stack((paths.costs[kept], randomized_costs[kept])), options['zscores'], options['workers'])
+	zscore_fun.write_zscores(os.path.join(out_dir, ZSCORES_FNAME), path_strings, zscores)
+
+	# Benjamini-Hochberg correction
+	zscore_column, pval_column = zscores[:, 2], zscores[:, 3]
+	tested, reject, bh_pvals = fdr_fun.get_bh_corrected_pvals(zscore_column, pval_column, qscore_thresh)
+	tested = np.flatnonzero(tested)
+	fdr_fun.write_bh_output(os.path.join(out_dir, FDR_FNAME), [path_strings[k] for k in tested], zscore_column[tested], pval_column[tested], bh_pvals, reject)
+
+	# TopNet: edges of the paths whose q-score <= qscore_thresh
+	significant = kept[tested[bh_pvals <= qscore_thresh]]
+	print(len(significant), " ", direction, " response node pairs have significant zscores")
+	support = topnet_fun.get_edge_support(G_response, paths.subset(significant))
+	topnet_fun.write_topnet(G_response, support, os.path.join(out_dir, TOPNET_FNAME))
+	print("Got ", (support > 0).sum(), " edges in ", direction, " response TopNet")
+	return G_response, support
+
+# Set in each worker process by init_combined_worker
+# (G_unweighted, SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options, randomized_SI, randomized_index)
+combined_data = None
+
+def init_combined_worker(*args):
+	global combined_data
+	combined_data = args
+
+# Run the response pipeline of one direction of run_combined_response_pipeline, writing to the direction's folder
+def run_combined_direction(direction):
+	G_unweighted, SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options, randomized_SI, randomized_index = combined_data
+	G_response, support = run_response_pipeline(G_unweighted, SI, direction, os.path.join(out_dir, direction), percentile, path_length_thresh, qscore_thresh, num_trials, options, randomized_SI, randomized_index)
+	return support
+
+# Run the activated and the repressed response pipelines for one (perturbation, control) pair, and
+# write the union of their TopNets (unweighted, as get_union_response_TopNet.py does) to out_dir/UNION_TOPNET_FNAME
+# Each direction writes its files to out_dir/activated and out_dir/repressed (see run_response_pipeline)
+# Both response networks share the topology of G_unweighted, and the randomized SI values are drawn once for both.
+# Both networks keep the genes with a positive SI in both samples, so these are the same values the Pij
+# scripts would draw with the same seed, and each direction gives the TopNet edges of its shell pipeline
+# With options['workers'] > 1, both directions run at once, each on half of the workers
+# Returns a dict of direction -> number of significant paths through each edge of G_unweighted
+def run_combined_response_pipeline(G_unweighted, SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options, shared_randomized_SI = None, shared_index = None):
+	os.makedirs(out_dir, exist_ok = True)
+	directions = list(RESPONSE_TYPES)
+	if shared_randomized_SI is None:
+		SI_relevant = mic_fun.get_relevant_SI(SI)
+		response_genes = set()
+		for direction in directions:
+			response_genes.update(G_unweighted.get_weighted_graph(SI_relevant, RESPONSE_TYPES[direction]).get_active_node_names())
+		response_SI = SI[SI.index.isin(response_genes)]
+		shared_randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(response_SI, num_trials, np.random.default_rng(options['seed']))
+		shared_index = response_SI.index
+
+	if options['workers'] > 1:
+		direction_options = dict(options, workers = max(1, options['workers'] // len(directions)))
+		initargs = (G_unweighted, SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, direction_options, shared_randomized_SI, shared_index)
+		with par_fun.get_process_executor(len(directions), init_combined_worker, initargs) as executor:
+			supports = list(executor.map(run_combined_direction, directions))
+	else:
+		init_combined_worker(G_unweighted, SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options, shared_randomized_SI, shared_index)
+		supports = [run_combined_direction(direction) for direction in directions]
+
+	union_support = sum(supports)
+	topnet_fun.write_unweighted_topnet(G_unweighted, union_support, os.path.join(out_dir, UNION_TOPNET_FNAME))
+	print("Got union response TopNet with ", (union_support > 0).sum(), " edges")
+	return dict(zip(directions, supports))
+
+# Set in each worker process by init_batch_worker
+# (G_unweighted, SI, shared_randomized_SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options)
+batch_data = None
+
+def init_batch_worker(*args):
+	global batch_data
+	batch_data = args
+
+# Run one job of a batch (see read_manifest), in a worker process
+def run_batch_job(job):
+	G_unweighted, SI, shared_randomized_SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options = batch_data
+	perturbation_sample, control_sample, direction, name = job
+	print("######################## Job ", name, " ########################")
+	job_SI = mic_fun.restructure_SI(SI, perturbation_sample, control_sample)
+	if direction == BOTH_DIRECTIONS:
+		supports = run_combined_response_pipeline(G_unweighted, job_SI, os.path.join(out_dir, name), percentile, path_length_thresh, qscore_thresh, num_trials, options, shared_randomized_SI, SI.index)
+		return name, (sum(supports.values()) > 0).sum()
+	G_response, support = run_response_pipeline(G_unweighted, job_SI, direction, os.path.join(out_dir, name), percentile, path_length_thresh, qscore_thresh, num_trials, options, shared_randomized_SI, SI.index)
+	return name, (support > 0).sum()
+
+# Run all jobs of a batch against one network and one expression matrix
+# jobs -> list of (perturbation, control, direction, name), see read_manifest
+# options -> as in run_response_pipeline, plus draws (see DRAWS) and jobs (number of jobs run at once)
+# Jobs are spread over a pool of options['jobs'] processes, which share the network, SI and the shared draws.
+# Worker processes cannot start processes of their own, so each job then runs on one process
+# Jobs with direction BOTH_DIRECTIONS run run_combined_response_pipeline in the job's folder
+# Yields (job name, number of TopNet edges, or of union TopNet edges for BOTH_DIRECTIONS) as jobs finish
+def run_batch(G_unweighted, SI, jobs, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options):
+	if options['draws'] not in DRAWS:
+		raise ValueError("Unknown draws " + options['draws'] + ", use one of " + ", ".join(DRAWS))
+	if options['sp_engine'] not in sp_fun.SP_ENGINES:
+		raise ValueError("Unknown sp_engine " + options['sp_engine'] + ", use one of " + ", ".join(sp_fun.SP_ENGINES))
+	if options['percentile_mode'] not in perc_fun.PERCENTILE_MODES:
+		raise ValueError("Unknown percentile_mode " + options['percentile_mode'] + ", use one of " + ", ".join(perc_fun.PERCENTILE_MODES))
+	for perturbation_sample, control_sample, direction, name in jobs:
+		for sample in (perturbation_sample, control_sample):
+			if sample not in SI.columns:
+				raise ValueError("Sample " + sample + " of job " + name + " is not in the microarray data")
+
+	shared_randomized_SI = None
+	if options['draws'] == 'shared':
+		shared_randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, num_trials, np.random.default_rng(options['seed']))
+		print("Drew randomized SI values for ", num_trials, " trials and ", SI.shape[0], " genes, shared by all jobs")
+
+	if options['jobs'] > 1:
+		options = dict(options, workers = 1)
+	initargs = (G_unweighted, SI, shared_randomized_SI, out_dir, percentile, path_length_thresh, qscore_thresh, num_trials, options)
+	if options['jobs'] <= 1:
+		init_batch_worker(*initargs)
+		for job in jobs:
+			yield run_batch_job(job)
+	else:
+		with par_fun.get_process_pool(options['jobs'], init_batch_worker, initargs) as pool:
+			yield from pool.imap_unordered(run_batch_job, jobs)
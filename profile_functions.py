@@ -0,0 +1,94 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+try:
+	import resource
+except ImportError: # not available on Windows
+	resource = None
+
+# Per-stage instrumentation shared by the PathExt scripts
+# A script calls init_profiling once (with the profile and cprofile_stage options), wraps its stages in
+# `with prof_fun.stage('name') as record:` and calls write_report at the end. Functions called by the script can open
+# stages of their own, which are nested under the current one (names are joined with /, eg: 'actual_paths/shortest_paths')
+# For every stage, the report holds the wall time, the peak RSS of the process (and of its finished worker processes)
+# at the end of the stage, and any counts the script stores in record['items'] (eg: number of paths)
+# Peak RSS is the peak since the process started, as reported by the OS: a stage raising it is the one that allocated most
+# Stages run in worker processes are not recorded
+# If no report file is given, stages are still timed (it is cheap) but nothing is written
+
+# Number of lines of the cProfile summary printed for the profiled stage
+CPROFILE_LINES = 30
+
+# Set by init_profiling
+report_fname = None
+cprofile_stage = None
+stages = []
+open_stages = []
+start_time = time.perf_counter()
+
+# report -> JSON file for the report, or None. profiled_stage -> full name of a stage to run under cProfile, or None
+# The cProfile statistics of that stage are written to <report>.<stage>.prof (if there is a report) and summarized on stdout
+def init_profiling(report = None, profiled_stage = None):
+	global report_fname, cprofile_stage, stages, open_stages, start_time
+	report_fname = report
+	cprofile_stage = profiled_stage
+	stages = []
+	open_stages = []
+	start_time = time.perf_counter()
+
+# Peak RSS in MB of this process, and of its finished child processes (None where unknown)
+def get_peak_rss_mb():
+	if resource is None:
+		return None, None
+	# ru_maxrss is in kB on Linux, in bytes on macOS
+	scale = 1.0/2**20 if sys.platform == 'darwin' else 1.0/2**10
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*scale, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss*scale
+
+@contextlib.contextmanager
+def stage(name):
+	open_stages.append(name)
+	full_name = '/'.join(open_stages)
+	record = {'name': full_name}
+	profiler = None
+	if full_name == cprofile_stage or name == cprofile_stage:
+		profiler = cProfile.Profile()
+		profiler.enable()
+	stage_start = time.perf_counter()
+	try:
+		yield record
+	finally:
+		record['wall_time_s'] = time.perf_counter() - stage_start
+		if profiler is not None:
+			profiler.disable()
+			write_cprofile(profiler, full_name)
+		record['peak_rss_mb'], record['peak_children_rss_mb'] = get_peak_rss_mb()
+		open_stages.pop()
+		stages.append(record)
+		if report_fname is not None:
+			print("Stage ", full_name, " took ", round(record['wall_time_s'], 3), " s")
+
+def write_cprofile(profiler, full_name):
+	summary = io.StringIO()
+	pstats.Stats(profiler, stream = summary).sort_stats('cumulative').print_stats(CPROFILE_LINES)
+	print(summary.getvalue())
+	if report_fname is not None:
+		profile_fname = report_fname + '.' + full_name.replace('/', '.') + '.prof'
+		profiler.dump_stats(profile_fname)
+		print("Wrote cProfile statistics of stage ", full_name, " to ", profile_fname)
+
+# Write the JSON report (if a report file was given): the command line, total wall time and peak RSS, and the stages
+# in the order they finished
+def write_report():
+	if report_fname is None:
+		return
+	peak_rss_mb, peak_children_rss_mb = get_peak_rss_mb()
+	report = {'script': os.path.basename(sys.argv[0]), 'argv': sys.argv[1:], 'wall_time_s': time.perf_counter() - start_time, 'peak_rss_mb': peak_rss_mb, 'peak_children_rss_mb': peak_children_rss_mb, 'stages': stages}
+	with open(report_fname, 'w') as f:
+		json.dump(report, f, indent = 1, default = int)
+	print("Wrote profiling report to ", report_fname)
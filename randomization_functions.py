@@ -0,0 +1,100 @@
+import numpy as np
+
+import network_functions as net_fun
+import microarray_functions as mic_fun
+
+# Upper bound on the number of (trial, path edge) weights held in memory at once
+MAX_BATCH_WEIGHTS = 2**25
+
+# Randomization modes of the Pij scripts (randomization option of activated/repressed_response_Pijs.py)
+# 'batched' -> all trials drawn and scored at once (see get_randomized_path_costs)
+# 'per_trial' -> trials drawn and scored one at a time, with the same values as 'batched'
+# 'adaptive' -> trials run in rounds, only for the paths whose significance is not settled (see adapt_fun)
+RANDOMIZATIONS = ('batched', 'per_trial', 'adaptive')
+
+# How the trials are seeded (seeding option of the Pij scripts)
+# 'stream' -> all trials drawn one after the other from one generator
+# 'per_trial' -> every trial drawn from its own generator (see mic_fun.get_trial_rng and get_seeded_randomized_path_costs)
+SEEDINGS = ('stream', 'per_trial')
+
+# What the cost of the paths in a randomized network depends on, computed once for all trials
+# G -> graph_fun.CompactGraph, the unweighted network the paths were found in
+# SI_index -> genes of the randomized SI values, paths -> path_fun.PathSet of the paths to get the cost of
+# Returns (src_rows, dst_rows, incidence): the SI rows of the two nodes of every edge used by the paths,
+# and the path-edge incidence matrix over these edges
+# Raises ValueError if a path uses a pair of nodes which is not an edge of G (see PathSet.get_path_edges)
+def get_path_cost_inputs(G, SI_index, paths):
+	node_rows = G.get_node_rows(SI_index)
+	column_edges, incidence = paths.get_path_edge_matrix(G)
+	return node_rows[G.src[column_edges]], node_rows[G.dst[column_edges]], incidence
+
+# Cost of the paths for randomized SI values (num_trials, genes, 2), with path_cost_inputs from get_path_cost_inputs
+# Only the node weights of the genes and the edges used by the paths are computed, no network is built
+# Returns a numpy array (paths x trials), with the costs PathSet.get_costs_in_graph gives in the randomized response networks
+def get_path_costs_from_SI(path_cost_inputs, randomized_SI, nw_type):
+	src_rows, dst_rows, incidence = path_cost_inputs
+	node_weights, positive = net_fun.get_node_weights(randomized_SI, nw_type)
+	keep, edge_weights = net_fun.get_edge_weights(node_weights, positive, src_rows, dst_rows, nw_type)
+	return incidence @ edge_weights.T
+
+# Number of trials scored at once, so that at most MAX_BATCH_WEIGHTS (trial, value) weights are held in memory
+# path_cost_inputs -> from get_path_cost_inputs, num_paths -> number of paths scored
+# num_values -> number of SI values drawn for every trial, when these are larger than the edge weights (0 otherwise)
+def get_trials_per_batch(path_cost_inputs, num_paths, num_values = 0):
+	return max(1, MAX_BATCH_WEIGHTS // max(1, len(path_cost_inputs[0]), num_paths, num_values))
+
+# Cost of every path in every randomized network, without building the randomized networks
+# G -> graph_fun.CompactGraph, the unweighted network the paths were found in
+# randomized_SI -> numpy array (num_trials, genes, 2) of randomized SI values, rows ordered like SI_index
+# paths -> path_fun.PathSet of the paths to get the cost of
+# nw_type -> type of weighted network (see net_fun.get_node_weights)
+# Node weights are computed for all genes of all trials at once, and only the edges used by the
+# paths are weighted. The costs of all paths in all trials are then a single sparse product of the
+# path-edge incidence matrix with the (edges x trials) weight matrix
+# Returns a numpy array (paths x trials). NaN for a path using an edge that is absent from a randomized
+# network (SI not positive for one of its nodes)
+def get_randomized_path_costs(G, randomized_SI, SI_index, paths, nw_type):
+	num_trials = randomized_SI.shape[0]
+	path_cost_inputs = get_path_cost_inputs(G, SI_index, paths)
+
+	costs = np.empty((len(paths), num_trials))
+	trials_per_batch = get_trials_per_batch(path_cost_inputs, len(paths))
+	for start in range(0, num_trials, trials_per_batch):
+		end = min(start + trials_per_batch, num_trials)
+		costs[:, start:end] = get_path_costs_from_SI(path_cost_inputs, randomized_SI[start:end], nw_type)
+	return costs
+
+# Cost of every path in the randomized networks of the given trials, with per-trial seeds
+# (see mic_fun.get_randomized_single_sample_mult_pert_seeded_trials), as get_randomized_path_costs gets them
+# G, SI, paths, nw_type -> as for get_randomized_path_costs (SI as a pandas dataframe), trials -> trial numbers
+# Trials are drawn and scored in batches, so the randomized SI values of all trials are never held at once
+# Returns a numpy array (paths x len(trials)). Column k only depends on seed and trials[k]
+def get_seeded_randomized_path_costs(G, SI, paths, nw_type, trials, seed):
+	path_cost_inputs = get_path_cost_inputs(G, SI.index, paths)
+	costs = np.empty((len(paths), len(trials)))
+	trials_per_batch = get_trials_per_batch(path_cost_inputs, len(paths))
+	for start in range(0, len(trials), trials_per_batch):
+		end = min(start + trials_per_batch, len(trials))
+		randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_seeded_trials(SI, trials[start:end], seed)
+		costs[:, start:end] = get_path_costs_from_SI(path_cost_inputs, randomized_SI, nw_type)
+	return costs
+
+# Cost of every path in num_trials randomized networks of multi-sample data, without building the randomized networks
+# SI_replicates -> pandas dataframe indexed by gene, with the k1 perturbed samples followed by the k2 control samples
+# Every trial shuffles the values of each gene across the samples and takes the medians of the perturbed and control
+# samples (see mic_fun.get_shuffled_median_SI_trials). G, paths, nw_type -> as for get_randomized_path_costs
+# Trials are drawn and scored in batches of trials_per_batch (by default, see get_trials_per_batch), so the
+# shuffled values of all trials are never held at once. Trials are drawn one after the other, so any batch size gives the same values
+# Returns a numpy array (paths x trials)
+def get_shuffled_median_path_costs(G, SI_replicates, paths, nw_type, num_perturbed_samples, num_trials, rng, trials_per_batch = None):
+	SI_values = SI_replicates.to_numpy(dtype = float)
+	num_control_samples = SI_values.shape[1] - num_perturbed_samples
+	path_cost_inputs = get_path_cost_inputs(G, SI_replicates.index, paths)
+	costs = np.empty((len(paths), num_trials))
+	if trials_per_batch is None:
+		trials_per_batch = get_trials_per_batch(path_cost_inputs, len(paths), SI_values.size)
+	for start in range(0, num_trials, trials_per_batch):
+		end = min(start + trials_per_batch, num_trials)
+		randomized_SI = mic_fun.get_shuffled_median_SI_trials(SI_values, num_perturbed_samples, num_control_samples, end - start, rng)
+		costs[:, start:end] = get_path_costs_from_SI(path_cost_inputs, randomized_SI, nw_type)
+	return costs
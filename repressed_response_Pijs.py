@@ -11,101 +11,111 @@
 # or a summarised value (eg: median expression across a cohort)
 # Column names for the control and the perturbation of interest are given as inputs
 
-import pandas as pd
-import random
-random.seed(1)
-import networkx as nx
 import numpy as np
 import sys
 import math
 
 import microarray_functions as mic_fun
-import network_functions as net_fun
 import percentile_functions as perc_fun
+import graph_functions as graph_fun
+import shortest_path_functions as sp_fun
+import profile_functions as prof_fun
+import response_functions as resp_fun
 
 # SI is given as a pandas dataframe, indexed by gene
 # column 0 -> disease gene expression values
 # column 1 -> healthy gene expression values
-def combine_data_get_sp_paths_costs_repressed(G_unweighted, SI, response_nw_fname, paths):
+# G_unweighted is a graph_fun.CompactGraph. The response network shares its topology, only the edge weights are new
+# sp_engine and workers select the shortest path engine (see sp_fun.SP_ENGINES)
+# Only the shortest paths retained by the percentile selection are returned if a percentile is given
+# (see perc_fun.get_sp_paths_percentile_norm_cost), else all shortest paths
+# Randomized data never goes through here: the cost of the paths in a randomized network only needs node weights
+# (see rand_fun.get_path_costs_from_SI)
+def combine_data_get_sp_paths_costs_repressed(G_unweighted, SI, response_nw_fname, sp_engine = 'dijkstra', workers = 1, percentile = None, path_length_thresh = None, percentile_mode = 'in_memory', norm_cost_cutoff = None):
 	SI_relevant = mic_fun.get_relevant_SI(SI)
 
-	# Map gene expression values onto unweighted network
-	G_response = net_fun.get_repressed_response_network(SI_relevant, G_unweighted)
-	print("Got response network with ", len(G_response.nodes()), " nodes and ", len(G_response.edges()), " edges")
+	with prof_fun.stage('response_network') as record:
+		# Map gene expression values onto unweighted network
+		G_response = G_unweighted.get_weighted_graph(SI_relevant, 'repressed_response')
+		response_nodes = G_response.get_active_node_names()
+		print("Got response network with ", len(response_nodes), " nodes and ", G_response.edge_mask().sum(), " edges")
 
-	# Drop SI values for genes which don't map to response network
-	genes_to_drop = set(SI.index) - set(G_response.nodes())
-	SI = SI.drop(genes_to_drop)
+		# Drop SI values for genes which don't map to response network
+		genes_to_drop = set(SI.index) - set(response_nodes)
+		SI = SI.drop(genes_to_drop)
 
-	if len(paths) == 0: # Actual data
 		# Write the response network to file
-		nx.write_weighted_edgelist(G_response, response_nw_fname, delimiter = '\t')
-		# Get all-pairs-shortest-path costs
-		# Return value is a pandas dataframe, indexed by the string src#dest
-		Pij = net_fun.get_all_sp_paths_costs(G_response)
-		print("Got shortest path costs for ", Pij.shape[0], " node-pairs")
-	elif len(paths) > 0: # Randomized data
-		# Get cost of the same paths that are the shortest in the actual dataset
-		Pij = net_fun.get_costs_of_given_paths(G_response, paths)
-		print("Got cost of paths which are shortest in the actual data")
+		G_response.write_weighted_edgelist(response_nw_fname)
+		record['items'] = len(response_nodes)
+	# Get all-pairs-shortest-paths, or only the ones retained by the percentile selection
+	# Return value is a path_fun.PathSet (node pairs, costs and predecessors or packed paths, no path strings)
+	if percentile is None:
+		Pij = sp_fun.get_all_sp_paths(G_response, sp_engine, workers)
+		print("Got shortest path costs for ", len(Pij), " node-pairs")
+	else:
+		Pij = perc_fun.get_sp_paths_percentile_norm_cost(G_response, percentile, path_length_thresh, sp_engine, workers, percentile_mode, norm_cost_cutoff)
 
 	return Pij, SI
 
 
-if len(sys.argv) != 10:
-	print("argv[1] = microarray data file (tab-delimited, with header)")
-	print("argv[2] = name of perturbation sample to study")
-	print("argv[3] = name of control sample")
-	print("argv[4] = unweighted (directed) network file")
-	print("argv[5] = percentile threshold")
-	print("argv[6] = path length threshold")
-	print("argv[7] = number of randomizations")
-	print("argv[8] = output file for repressed response base network")
-	print("argv[9] = output file prefix for Pij")
+if len(sys.argv) < 10:
+	resp_fun.print_usage('repressed')
 	sys.exit(1)
 
 # Set inputs
 data_fname = sys.argv[1]
-perturbation_sample = sys.argv[2] # This is the perturbation we want to study
-control_sample = sys.argv[3]
+perturbation_samples = sys.argv[2].split(',') # This is the perturbation we want to study
+control_samples = sys.argv[3].split(',')
+median_mode = len(perturbation_samples) > 1 or len(control_samples) > 1 # Multiple replicates, summarized by their median
 unweighted_nw_fname = sys.argv[4]
 percentile = float(sys.argv[5]) # We'll only keep paths whose cost < this threshold
 path_length_thresh = int(sys.argv[6]) # We'll only keep paths with length >= this threshold
 num_trials = int(sys.argv[7])
 response_nw_fname = sys.argv[8]
 output_fname_prefix = sys.argv[9]
+options, trials = resp_fun.get_pij_options(sys.argv[10:], num_trials, median_mode) # trials -> randomizations run here
+prof_fun.init_profiling(options['profile'], options['cprofile_stage'])
+rng = np.random.default_rng(options['seed'])
 
 # Read microarray data
 # Column 0 -> gene labels. Make this the index
 # Columns 1 through m -> a control, and various perturbed conditions
-SI = pd.read_csv(data_fname, sep = '\t', na_values=' ')
-SI = SI.set_index(SI.columns[0])
-SI = mic_fun.restructure_SI(SI, perturbation_sample, control_sample) # This gives SI restructured such that
-								     # column 0 -> perturbation to study, 
-								     # column 1 -> control, 
-								     # columns 2 to m -> other perturbations
+# SI is restructured such that column 0 -> perturbation to study, column 1 -> control, columns 2 to m -> other perturbations
+# With replicates, columns 0 and 1 are their medians, and SI_replicates holds the perturbation replicates followed by the control replicates
+with prof_fun.stage('read_SI') as record:
+	SI, SI_replicates = resp_fun.read_response_SI(data_fname, perturbation_samples, control_samples, options['cache'], options['cache_dir'])
+	record['items'] = SI.shape[0]
 print("Read microarray data with ", SI.shape[0], " rows and ", SI.shape[1], " columns")
 
 # Read unweighted network
-G_unweighted = nx.read_edgelist(unweighted_nw_fname, delimiter = "\t", nodetype = str, create_using = nx.DiGraph())
-print("Read network with ", len(G_unweighted.nodes()), " nodes and ", len(G_unweighted.edges()), " edges")
+# It is loaded once into a compact graph, which all response networks (actual and randomized) share
+with prof_fun.stage('read_network') as record:
+	G_unweighted = graph_fun.read_network(unweighted_nw_fname, options['cache'], options['cache_dir'])
+	record['items'] = G_unweighted.number_of_edges()
+print("Read network with ", G_unweighted.number_of_nodes(), " nodes and ", G_unweighted.number_of_edges(), " edges")
 
 # Compute Pij in actual data
-Pij, SI = combine_data_get_sp_paths_costs_repressed(G_unweighted, SI, response_nw_fname, []) # Give an empty list as the paths argument
+with prof_fun.stage('actual_paths') as record:
+	Pij, SI = combine_data_get_sp_paths_costs_repressed(G_unweighted, SI, response_nw_fname, options['sp_engine'], options['workers'], percentile, path_length_thresh, options['percentile_mode'], options['norm_cost_cutoff'])
+	record['items'] = len(Pij)
+if SI_replicates is not None:
+	SI_replicates = SI_replicates.loc[SI.index]
 print("After dropping genes which don't map to our network, got SI for ", SI.shape[0], " genes and ", SI.shape[1], " samples")
-Pij = perc_fun.get_Pij_percentile_norm_cost(Pij, percentile, path_length_thresh)
-print("After taking percentile cutoff, Pij has ", Pij.shape[0], " rows and ", Pij.shape[1], " columns")
-print(Pij.head())
-Pij.to_csv(output_fname_prefix+"_actual.txt", sep = "\t")
+print("After taking percentile cutoff, Pij has ", len(Pij), " rows")
+if options['output'] == 'txt':
+	Pij_actual = Pij.to_frame() # Path strings are only built for the paths we keep
+	print(Pij_actual.head())
+	Pij_actual.to_csv(output_fname_prefix+"_actual.txt", sep = "\t")
 
 # Randomized data
-for i in range(num_trials):
-	print("######################## Trial ", i, " ########################")
+# Pij_randomized holds the cost of the shortest paths in actual dataset in every randomized network (paths x trials)
+# trials_run -> number of trials of every path, with adaptive randomizations (None when all paths have all trials)
+# stats -> running statistics of the randomized costs of every path, with output=stats
+with prof_fun.stage('randomization') as record:
+	Pij_randomized, trials_run, stats = resp_fun.get_randomized_pij(G_unweighted, SI, SI_replicates, Pij, 'repressed_response', len(perturbation_samples), num_trials, trials, options, rng)
+	record['items'] = len(Pij) * len(trials) if trials_run is None else trials_run.sum()
 
-	randomized_SI = mic_fun.get_randomized_single_sample_mult_pert(SI)
-	print("After shuffling, got SI values for ", randomized_SI.shape[0], " genes and ", randomized_SI.shape[1], " samples")
+with prof_fun.stage('write_pij'):
+	resp_fun.write_randomized_pij(output_fname_prefix, Pij, Pij_randomized, trials_run, stats, num_trials, trials, options)
 
-	# Give shortest paths in actual dataset as the paths argument
-	Pij, randomized_SI = combine_data_get_sp_paths_costs_repressed(G_unweighted, randomized_SI, response_nw_fname, list(Pij.index))
-
-	Pij.to_csv(output_fname_prefix+"_"+str(i)+".txt", sep = "\t")
+prof_fun.write_report()
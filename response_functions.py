@@ -0,0 +1,185 @@
+import sys
+
+import numpy as np
+
+import microarray_functions as mic_fun
+import option_functions as opt_fun
+import randomization_functions as rand_fun
+import adaptive_functions as adapt_fun
+import online_functions as online_fun
+import checkpoint_functions as ckpt_fun
+import pij_functions as pij_fun
+import shortest_path_functions as sp_fun
+import percentile_functions as perc_fun
+
+# Steps shared by the Pij scripts, activated_response_Pijs.py and repressed_response_Pijs.py, which only differ
+# in the type of response network (nw_type, see net_fun.get_node_weights)
+
+# Default values of the optional arguments of the Pij scripts
+PIJ_OPTIONS = {'workers': 1, 'sp_engine': 'dijkstra', 'randomization': 'batched', 'seed': 1, 'output': 'txt', 'percentile_mode': 'in_memory', 'norm_cost_cutoff': None, 'cache': True, 'cache_dir': None, 'trial_batch': 100, 'min_trials': adapt_fun.ADAPTIVE_MIN_TRIALS, 'qscore': 0.05, 'settle_sigma': 4.0, 'pilot_trials': online_fun.PILOT_TRIALS, 'checkpoint': None, 'checkpoint_trials': ckpt_fun.CHECKPOINT_TRIALS, 'seeding': 'stream', 'shard': None, 'profile': None, 'cprofile_stage': None}
+
+# response_name -> 'activated' or 'repressed'
+def print_usage(response_name):
+	print("argv[1] = microarray data file (tab-delimited, with header)")
+	print("argv[2] = name of perturbation sample to study, or comma separated names of its replicates")
+	print("argv[3] = name of control sample, or comma separated names of its replicates")
+	print("		With replicates, the response network is built from the median of the perturbation and of the control replicates,")
+	print("		and every randomization shuffles the values of each gene across all these replicates before taking the medians")
+	print("argv[4] = unweighted (directed) network file")
+	print("argv[5] = percentile threshold")
+	print("argv[6] = path length threshold")
+	print("argv[7] = number of randomizations (with randomization=adaptive, the largest number of randomizations of a path)")
+	print("argv[8] = output file for " + response_name + " response base network")
+	print("argv[9] = output file prefix for Pij")
+	print("Optional arguments, given as name=value after the ones above:")
+	print("workers = number of processes used for the shortest path search (default 1)")
+	print("sp_engine = shortest path engine: dijkstra, scipy or networkx (default dijkstra)")
+	print("randomization = batched (score all randomizations at once, without building randomized networks)")
+	print("		or per_trial (draw and score one randomization at a time)")
+	print("		or adaptive (run randomizations in rounds, and stop randomizing paths whose significance is settled). Default batched")
+	print("		adaptive needs output=npz")
+	print("seed = seed for the random number generator used for the randomizations (default 1)")
+	print("seeding = stream (all randomizations are drawn one after the other from one generator seeded with seed)")
+	print("		or per_trial (randomization i is drawn from its own generator, derived from seed and i). Default stream")
+	print("		per_trial gives the same randomizations however the trials are split into shards")
+	print("shard = start:end to only run randomizations start to end - 1 of the argv[7] randomizations (with seeding=per_trial and output=npz),")
+	print("		writing a shard to merge with the others with merge_pij_shards.py (default: all randomizations)")
+	print("trial_batch = number of randomizations per round, for randomization=adaptive, at least min_trials (default 100)")
+	print("min_trials = number of randomizations every path gets before it can be settled, for randomization=adaptive (default " + str(adapt_fun.ADAPTIVE_MIN_TRIALS) + ")")
+	print("qscore = q-score cutoff the significance of paths is judged against, for randomization=adaptive (default 0.05)")
+	print("settle_sigma = a path is settled when its z-score is this many standard errors away from the cutoff, for randomization=adaptive (default 4)")
+	print("output = txt (one Pij file per trial: <prefix>_actual.txt, <prefix>_0.txt, ...)")
+	print("		or npz (a single <prefix>.npz file with the paths x trials matrix)")
+	print("		or stats (a single <prefix>.npz file with running statistics of every path, accumulated as trials are scored,")
+	print("		without holding the paths x trials matrix; see online_functions.py for the Box-Cox approximation). Default txt")
+	print("pilot_trials = number of trials the Box-Cox lambdas are fitted on, for output=stats (default 100)")
+	print("percentile_mode = in_memory (hold all shortest paths, then select the top percentile)")
+	print("		or streaming (select the top percentile source by source, in two passes over the sources)")
+	print("		or bounded (each shortest path search only keeps paths under a normalized cost cutoff). Default in_memory")
+	print("norm_cost_cutoff = normalized cost (cost/hops) cutoff for percentile_mode=bounded, 0 for no cutoff (default: estimated from a sample of sources)")
+	print("cache = 1 to reuse preprocessed network and microarray data cached from earlier runs on the same files, 0 to always parse them (default 1)")
+	print("cache_dir = folder for the cache files (default: .pathext_cache next to each input file)")
+	print("checkpoint = file to save the completed randomizations and the random number generator state to, every checkpoint_trials trials")
+	print("		If the file exists, the run resumes from it, and gives the same output as an uninterrupted run. Removed once the output is written")
+	print("		Not with randomization=adaptive or output=stats (default: no checkpoints)")
+	print("checkpoint_trials = number of randomizations between checkpoints (default " + str(ckpt_fun.CHECKPOINT_TRIALS) + ")")
+	print("profile = JSON file for a report of the wall time, peak memory and item counts of every stage (default: no report)")
+	print("cprofile_stage = name of a stage to run under cProfile, as named in the report (eg: actual_paths/shortest_paths)")
+
+# Parse the optional arguments of the Pij scripts (see PIJ_OPTIONS), and exit with a message if they cannot be used together
+# median_mode -> True if the samples have replicates
+# Returns (options, trials), with trials the range of randomizations run (all of them, or those of the shard)
+def get_pij_options(args, num_trials, median_mode):
+	options = opt_fun.parse_options(args, PIJ_OPTIONS, {'norm_cost_cutoff': float})
+	opt_fun.check_choice(options, 'randomization', rand_fun.RANDOMIZATIONS)
+	opt_fun.check_choice(options, 'output', pij_fun.PIJ_OUTPUTS)
+	opt_fun.check_choice(options, 'seeding', rand_fun.SEEDINGS)
+	opt_fun.check_choice(options, 'sp_engine', sp_fun.SP_ENGINES)
+	opt_fun.check_choice(options, 'percentile_mode', perc_fun.PERCENTILE_MODES)
+	if options['randomization'] == 'adaptive' and options['output'] != 'npz':
+		print("randomization=adaptive gives paths different numbers of trials, which only output=npz can hold")
+		sys.exit(1)
+	if options['randomization'] == 'adaptive' and not 1 <= options['min_trials'] <= options['trial_batch']:
+		print("randomization=adaptive needs 1 <= min_trials <= trial_batch: with fewer trials, the significance of a path cannot be judged")
+		sys.exit(1)
+	if options['checkpoint'] is not None and (options['randomization'] == 'adaptive' or options['output'] == 'stats'):
+		print("checkpoint can only be used with randomization=batched or per_trial, and output=txt or npz")
+		sys.exit(1)
+	# Shards are only consistent with each other with per-trial seeds
+	if options['shard'] is not None:
+		options['seeding'] = 'per_trial'
+	if options['seeding'] == 'per_trial' and (options['randomization'] == 'adaptive' or options['output'] == 'stats' or options['checkpoint'] is not None):
+		print("seeding=per_trial (and shard) can only be used with randomization=batched or per_trial, output=txt or npz, and without checkpoint")
+		sys.exit(1)
+	if median_mode and (options['randomization'] == 'adaptive' or options['output'] == 'stats' or options['checkpoint'] is not None or options['seeding'] == 'per_trial'):
+		print("Replicates can only be used with randomization=batched or per_trial, output=txt or npz, seeding=stream, and without checkpoint")
+		sys.exit(1)
+	trials = range(num_trials) # Randomizations run here
+	if options['shard'] is not None:
+		shard_start, shard_end = (int(x) for x in options['shard'].split(':'))
+		if options['output'] != 'npz' or not 0 <= shard_start < shard_end <= num_trials:
+			print("shard needs output=npz and 0 <= start < end <= number of randomizations")
+			sys.exit(1)
+		trials = range(shard_start, shard_end)
+	return options, trials
+
+# Read the microarray data for the given perturbation and control samples (lists of sample names)
+# Returns (SI, SI_replicates):
+# SI -> column 0 -> perturbation to study, column 1 -> control, columns 2 to m -> other perturbations (see mic_fun.restructure_SI)
+#	With replicates, column 0 -> median of the perturbation replicates, column 1 -> median of the control replicates
+# SI_replicates -> None without replicates, else the perturbation replicates followed by the control replicates
+def read_response_SI(data_fname, perturbation_samples, control_samples, use_cache = True, cache_dir = None):
+	SI = mic_fun.read_SI(data_fname, use_cache, cache_dir)
+	if len(perturbation_samples) == 1 and len(control_samples) == 1:
+		return mic_fun.restructure_SI(SI, perturbation_samples[0], control_samples[0]), None
+	SI_replicates = SI[perturbation_samples + control_samples]
+	return mic_fun.get_median_SI(SI_replicates, len(perturbation_samples), len(control_samples)), SI_replicates
+
+# Cost of the paths Pij (a path_fun.PathSet found in the actual response network) in every randomized network
+# G_unweighted -> graph_fun.CompactGraph, SI, SI_replicates -> as returned by read_response_SI, restricted to the genes
+# of the actual response network. num_perturbed_samples -> number of perturbation replicates
+# options, trials -> as returned by get_pij_options, rng -> random number generator of the stream seeding
+# Returns (Pij_randomized, trials_run, stats):
+# Pij_randomized -> cost of every path in every randomized network of trials (paths x trials), None with output=stats
+# trials_run -> number of trials of every path, with adaptive randomizations (None when all paths have all trials)
+# stats -> running statistics of the costs of every path with output=stats (see online_fun.get_online_path_cost_stats), else None
+def get_randomized_pij(G_unweighted, SI, SI_replicates, Pij, nw_type, num_perturbed_samples, num_trials, trials, options, rng):
+	Pij_randomized, trials_run, stats = None, None, None
+	if options['output'] == 'stats':
+		# Trials are scored in chunks and folded into running statistics, whatever the randomization mode
+		stats = online_fun.get_online_path_cost_stats(G_unweighted, SI, Pij, nw_type, num_trials, options['pilot_trials'], rng)
+	elif SI_replicates is not None:
+		# Shuffle the replicates of every gene and take the medians, for a batch of trials at a time (one with
+		# randomization=per_trial, which gives the same values) and get the cost of the paths in every randomized network at once
+		trials_per_batch = 1 if options['randomization'] == 'per_trial' else None
+		Pij_randomized = rand_fun.get_shuffled_median_path_costs(G_unweighted, SI_replicates, Pij, nw_type, num_perturbed_samples, num_trials, rng, trials_per_batch)
+		print("Got cost of paths which are shortest in the actual data, for ", num_trials, " trials of shuffled replicates")
+	elif options['seeding'] == 'per_trial':
+		# Every trial is drawn from its own generator, so a shard gets the same values as the full run
+		Pij_randomized = rand_fun.get_seeded_randomized_path_costs(G_unweighted, SI, Pij, nw_type, trials, options['seed'])
+		print("Got cost of paths which are shortest in the actual data, for trials ", trials.start, " to ", trials.stop - 1)
+	elif options['checkpoint'] is not None:
+		# Trials are run in chunks, with a checkpoint after each, and the same values as in batched or per_trial mode
+		Pij_randomized = ckpt_fun.get_checkpointed_randomized_path_costs(G_unweighted, SI, Pij, nw_type, num_trials, rng, options['seed'], options['seeding'], options['checkpoint'], options['checkpoint_trials'])
+		print("Got cost of paths which are shortest in the actual data, for ", num_trials, " trials")
+	elif options['randomization'] == 'batched':
+		# Draw all randomized SI values up front, as a (num_trials x genes x 2) array
+		# and get the cost of the paths in every randomized network at once
+		randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, num_trials, rng)
+		print("After shuffling, got SI values for ", num_trials, " trials, ", randomized_SI.shape[1], " genes and ", randomized_SI.shape[2], " samples")
+		Pij_randomized = rand_fun.get_randomized_path_costs(G_unweighted, randomized_SI, SI.index, Pij, nw_type)
+		print("Got cost of paths which are shortest in the actual data, for ", num_trials, " trials")
+	elif options['randomization'] == 'adaptive':
+		Pij_randomized, trials_run = adapt_fun.get_adaptive_randomized_path_costs(G_unweighted, SI, Pij, nw_type, num_trials, options['trial_batch'], options['qscore'], options['settle_sigma'], rng, options['workers'], options['min_trials'])
+		print("Got cost of paths which are shortest in the actual data, for ", trials_run.sum(), " (path, trial) pairs instead of ", len(Pij) * num_trials)
+	else:
+		# Draw and score one trial at a time. Trials are drawn in the same order as in batched mode, so both give the same values
+		# The randomized response network is never built: the edges of the paths are looked up once, and every trial
+		# only computes node weights and the weights of these edges
+		path_cost_inputs = rand_fun.get_path_cost_inputs(G_unweighted, SI.index, Pij)
+		Pij_randomized = np.empty((len(Pij), num_trials))
+		for i in range(num_trials):
+			print("######################## Trial ", i, " ########################")
+			randomized_SI = mic_fun.get_randomized_single_sample_mult_pert_trials(SI, 1, rng)
+			Pij_randomized[:, i] = rand_fun.get_path_costs_from_SI(path_cost_inputs, randomized_SI, nw_type)[:, 0]
+			print("Got cost of paths which are shortest in the actual data")
+	return Pij_randomized, trials_run, stats
+
+# Write the randomized Pij in the format given by options['output'] (see pij_fun.PIJ_OUTPUTS), or as a shard
+# Pij_randomized, trials_run, stats -> as returned by get_randomized_pij
+# The actual Pij of output=txt is written by the Pij scripts as soon as the paths are found
+def write_randomized_pij(output_fname_prefix, Pij, Pij_randomized, trials_run, stats, num_trials, trials, options):
+	if options['output'] == 'stats':
+		pij_fun.write_pij_stats_npz(output_fname_prefix+".npz", Pij, stats)
+		print("Wrote statistics of actual and randomized Pij to ", output_fname_prefix+".npz")
+	elif options['shard'] is not None:
+		pij_fun.write_pij_shard_npz(output_fname_prefix+".npz", Pij, Pij_randomized, trials, num_trials, options['seed'])
+		print("Wrote actual Pij and randomized Pij of trials ", trials.start, " to ", trials.stop - 1, " to ", output_fname_prefix+".npz")
+	elif options['output'] == 'npz':
+		pij_fun.write_pij_npz(output_fname_prefix+".npz", Pij, Pij_randomized, num_trials = trials_run)
+		print("Wrote actual and randomized Pij to ", output_fname_prefix+".npz")
+	else:
+		for i in range(num_trials):
+			Pij.to_frame(Pij_randomized[:, i]).to_csv(output_fname_prefix+"_"+str(i)+".txt", sep = "\t")
+	if options['checkpoint'] is not None:
+		ckpt_fun.remove_checkpoint(options['checkpoint'])
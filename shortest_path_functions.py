@@ -0,0 +1,191 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import scipy.sparse.csgraph
+
+import graph_functions as graph_fun
+import network_functions as net_fun
+import parallel_functions as par_fun
+import path_functions as path_fun
+
+# Shortest path engines for the all-pairs shortest path step
+# 'networkx' -> nx.all_pairs_dijkstra_path, as in network_functions (reference implementation, single core)
+# 'dijkstra' -> single-source Dijkstra from every source on the CSR arrays of a graph_fun.CompactGraph,
+#		spread over a pool of worker processes. It visits nodes and breaks ties exactly like networkx,
+#		so it returns the same paths and costs (in the order networkx 1.11 lists them)
+# 'scipy'    -> scipy.sparse.csgraph.dijkstra (C implementation) with predecessor matrices, spread over
+#		the same pool. Path costs are the same; when two shortest paths have exactly the same cost,
+#		it may pick a different one than networkx
+SP_ENGINES = ('dijkstra', 'scipy', 'networkx')
+
+# Sources are handed to the workers in chunks of this size
+SOURCES_PER_CHUNK = 64
+
+# Set in each worker process by init_sp_worker
+worker_csr = None
+
+def init_sp_worker(indptr, indices, weights):
+	global worker_csr
+	worker_csr = (indptr, indices, weights)
+
+# Single-source Dijkstra on CSR arrays (weights indexed like indices)
+# Mirrors networkx's Dijkstra: successors are scanned in CSR order, the heap breaks ties on
+# insertion order, and a predecessor is only replaced by a strictly shorter path
+# Returns (reached, dist, pred)
+# reached -> nodes in the order they were first reached, starting with the source
+# dist -> dict node -> cost of the shortest path from the source
+# pred -> dict node -> previous node on that path (-1 for the source)
+def single_source_dijkstra(indptr, indices, weights, source):
+	dist = {}
+	seen = {source: 0}
+	pred = {source: -1}
+	reached = [source]
+	fringe = [(0, 0, source)]
+	c = 1
+	while fringe:
+		(d, _, v) = heapq.heappop(fringe)
+		if v in dist:
+			continue # already searched this node
+		dist[v] = d
+		for k in range(indptr[v], indptr[v+1]):
+			u = indices[k]
+			vu_dist = d + weights[k]
+			if u in dist:
+				if vu_dist < dist[u]:
+					raise ValueError("Contradictory paths found: negative weights?")
+			elif u not in seen or vu_dist < seen[u]:
+				if u not in seen:
+					reached.append(u)
+				seen[u] = vu_dist
+				heapq.heappush(fringe, (vu_dist, c, u))
+				c += 1
+				pred[u] = v
+	return reached, dist, pred
+
+# Shortest paths from a chunk of sources, run in a worker process
+# For every source, returns (source, targets, costs, pred)
+# targets -> reachable nodes other than the source (int array), costs -> cost of the shortest path to each of them
+# pred -> predecessor of every node on its shortest path from the source (-1 if none)
+def get_sp_chunk(args):
+	sources, engine = args
+	indptr, indices, weights = worker_csr
+	num_nodes = len(indptr) - 1
+	results = []
+	if engine == 'scipy':
+		csgraph = scipy.sparse.csr_matrix((weights, indices, indptr), shape = (num_nodes, num_nodes))
+		dist, pred = scipy.sparse.csgraph.dijkstra(csgraph, directed = True, indices = sources, return_predecessors = True)
+		for i, source in enumerate(sources):
+			targets = np.flatnonzero(np.isfinite(dist[i]))
+			targets = targets[targets != source]
+			results.append((source, targets, dist[i][targets], np.where(pred[i] < 0, -1, pred[i]).astype(np.int32)))
+	else:
+		indptr, indices, weights = indptr.tolist(), indices.tolist(), weights.tolist()
+		for source in sources:
+			reached, dist, pred = single_source_dijkstra(indptr, indices, weights, source)
+			pred_array = np.full(num_nodes, -1, dtype = np.int32)
+			pred_array[list(pred.keys())] = list(pred.values())
+			results.append((source, np.array(reached[1:], dtype = np.int64), np.array([dist[t] for t in reached[1:]]), pred_array))
+	return results
+
+# Iterate over the shortest paths of G (a graph_fun.CompactGraph), one source at a time
+# Sources are the nodes of the weighted network, in networkx's node order
+# Yields (source, targets, costs, pred), see get_sp_chunk
+def iter_sp_from_sources(G, engine = 'dijkstra', workers = 1, sources = None):
+	if engine not in SP_ENGINES:
+		raise ValueError("Unknown shortest path engine " + engine + ", use one of " + ", ".join(SP_ENGINES))
+	indptr, indices, weights = G.get_weighted_csr()
+	if sources is None:
+		sources = G.get_active_nodes()
+	chunks = [(sources[i:i+SOURCES_PER_CHUNK].tolist(), engine) for i in range(0, len(sources), SOURCES_PER_CHUNK)]
+	if workers <= 1:
+		init_sp_worker(indptr, indices, weights)
+		for chunk in chunks:
+			yield from get_sp_chunk(chunk)
+	else:
+		with par_fun.get_process_pool(workers, init_sp_worker, (indptr, indices, weights)) as pool:
+			for results in pool.imap(get_sp_chunk, chunks):
+				yield from results
+
+# Like get_sp_chunk, but only keeps the paths with at least path_length_thresh hops and a normalized cost
+# (cost/hops) below norm_cost_cutoff. The kept paths are packed in the worker, so predecessors never leave it
+# For every source, returns (source, paths, num_long_paths)
+# paths -> path_fun.PathSet of the kept paths (packed), num_long_paths -> number of paths with enough hops
+def get_bounded_sp_chunk(args):
+	sources, engine, path_length_thresh, norm_cost_cutoff = args
+	results = []
+	for source, targets, costs, pred in get_sp_chunk((sources, engine)):
+		hops = path_fun.get_hops(pred[None, :], np.zeros(len(targets), dtype = np.int32), targets)
+		long_paths = hops >= path_length_thresh
+		keep = np.flatnonzero(long_paths & (costs/np.maximum(hops, 1) < norm_cost_cutoff))
+		paths = path_fun.PathSet(None, np.full(len(keep), source), targets[keep], costs[keep], pred[None, :], np.zeros(len(keep), dtype = np.int32), hops[keep])
+		paths.get_packed_paths()
+		results.append((source, paths, np.count_nonzero(long_paths)))
+	return results
+
+# Iterate over the shortest paths of G kept by get_bounded_sp_chunk, one source at a time
+# Yields (source, paths, num_long_paths), see get_bounded_sp_chunk (the PathSets have no node names)
+def iter_bounded_sp_from_sources(G, path_length_thresh, norm_cost_cutoff, engine = 'dijkstra', workers = 1, sources = None):
+	if engine not in SP_ENGINES:
+		raise ValueError("Unknown shortest path engine " + engine + ", use one of " + ", ".join(SP_ENGINES))
+	indptr, indices, weights = G.get_weighted_csr()
+	if sources is None:
+		sources = G.get_active_nodes()
+	chunks = [(sources[i:i+SOURCES_PER_CHUNK].tolist(), engine, path_length_thresh, norm_cost_cutoff) for i in range(0, len(sources), SOURCES_PER_CHUNK)]
+	if workers <= 1:
+		init_sp_worker(indptr, indices, weights)
+		for chunk in chunks:
+			yield from get_bounded_sp_chunk(chunk)
+	else:
+		with par_fun.get_process_pool(workers, init_sp_worker, (indptr, indices, weights)) as pool:
+			for results in pool.imap(get_bounded_sp_chunk, chunks):
+				yield from results
+
+# All-pairs shortest paths of G (a graph_fun.CompactGraph, or a weighted nx.DiGraph), as a path_fun.PathSet
+# Paths are kept as source/target ids, costs and predecessor rows, without building path strings
+def get_all_sp_paths(G, engine = 'dijkstra', workers = 1):
+	G = to_compact_graph(G)
+	return path_fun.PathSet.from_sp_results(G.nodes, iter_sp_from_sources(G, engine, workers))
+
+# Returns the same pandas dataframe as net_fun.get_all_sp_paths_costs
+# Index will be the full path, with nodes separated by #
+# The column value will be the cost of that path
+# G can be a graph_fun.CompactGraph or a weighted nx.DiGraph
+def get_all_sp_paths_costs(G, engine = 'dijkstra', workers = 1):
+	if engine == 'networkx':
+		return net_fun.get_all_sp_paths_costs(to_networkx(G))
+	return get_all_sp_paths(G, engine, workers).to_frame()
+
+# Return only shortest paths involving at least one node of interest
+# Same output as net_fun.get_sp_paths_costs_nodes
+def get_sp_paths_costs_nodes(G, noi, engine = 'dijkstra', workers = 1):
+	if engine == 'networkx':
+		return net_fun.get_sp_paths_costs_nodes(to_networkx(G), noi)
+	G = to_compact_graph(G)
+	paths = get_all_sp_paths(G, engine, workers)
+	noi_ids = [G.node_index[node] for node in noi if node in G.node_index]
+	return paths.subset(paths.get_paths_with_nodes(noi_ids)).to_frame()
+
+# Same output as net_fun.get_sp_costs: costs of all shortest paths, indexed by src#dest
+def get_sp_costs(G, engine = 'dijkstra', workers = 1):
+	if engine == 'networkx':
+		return net_fun.get_sp_costs(to_networkx(G))
+
+	G = to_compact_graph(G)
+	nodes = G.nodes
+	sp_costs = {}
+	for source, targets, costs, pred in iter_sp_from_sources(G, engine, workers):
+		for target, cost in zip(targets.tolist(), costs.tolist()):
+			sp_costs[nodes[source]+'#'+nodes[target]] = cost
+	return pd.DataFrame.from_dict(sp_costs, orient = 'index')
+
+def to_compact_graph(G):
+	if isinstance(G, graph_fun.CompactGraph):
+		return G
+	return graph_fun.CompactGraph.from_weighted_networkx(G)
+
+def to_networkx(G):
+	if isinstance(G, graph_fun.CompactGraph):
+		return G.to_networkx()
+	return G
@@ -0,0 +1,67 @@
+import numpy as np
+
+# A TopNet is made of the edges of a set of paths (the top or significant paths)
+# Edges are marked in an array over the edge ids of a graph_fun.CompactGraph: support[e] is the number
+# of paths going through edge e, and the TopNet is made of the edges with support > 0
+
+# Paths given as strings are turned into edge ids this many edges at a time
+EDGES_PER_CHUNK = 2**20
+
+# Add the paths through edges u -> v (integer arrays of node ids, one entry per edge of every path) to support
+def add_edge_support(G, support, u, v):
+	edge_ids = G.get_edge_ids(u, v)
+	if np.any(edge_ids < 0):
+		k = np.flatnonzero(edge_ids < 0)[0]
+		raise ValueError("Edge " + G.nodes[u[k]] + " -> " + G.nodes[v[k]] + " of a path is not in the network")
+	support += np.bincount(edge_ids, minlength = len(support))
+
+# Number of paths going through every edge of G (a graph_fun.CompactGraph)
+# paths -> path_fun.PathSet of paths found in G (or in a graph sharing its topology)
+def get_edge_support(G, paths):
+	edge_ids, num_hops = paths.get_path_edges(G)
+	return np.bincount(edge_ids, minlength = G.number_of_edges())
+
+# Same as get_edge_support, for paths given as strings with nodes separated by # (eg: 'a#b#c')
+# The strings are consumed one at a time, so path_strings can be any iterable
+def get_edge_support_from_path_strings(G, path_strings):
+	support = np.zeros(G.number_of_edges(), dtype = np.int64)
+	u, v = [], []
+	for path_str in path_strings:
+		path = [G.node_index[node] for node in path_str.split('#')]
+		u.extend(path[:-1])
+		v.extend(path[1:])
+		if len(u) >= EDGES_PER_CHUNK:
+			add_edge_support(G, support, u, v)
+			u, v = [], []
+	add_edge_support(G, support, u, v)
+	return support
+
+# Write the TopNet: edges with support > 0, as node1 \t node2 \t weight (weight in G)
+def write_topnet(G, support, fname):
+	edges = np.flatnonzero(support > 0)
+	with open(fname, 'w') as outfile:
+		for e, weight in zip(edges.tolist(), G.weights[edges].tolist()):
+			outfile.write( G.nodes[G.src[e]] + "\t" )
+			outfile.write( G.nodes[G.dst[e]] + "\t" )
+			outfile.write( str(weight) + "\n" )
+
+# Write the TopNet without weights, as node1 \t node2 (eg: the union of TopNets of graphs sharing G's topology,
+# whose support arrays are added up)
+def write_unweighted_topnet(G, support, fname):
+	edges = np.flatnonzero(support > 0)
+	with open(fname, 'w') as outfile:
+		for e in edges.tolist():
+			outfile.write( G.nodes[G.src[e]] + "\t" )
+			outfile.write( G.nodes[G.dst[e]] + "\n" )
+
+# Write the support of the TopNet edges, as node1 \t node2 \t weight \t number of paths through the edge
+# Edges are listed by decreasing support
+def write_edge_support(G, support, fname):
+	edges = np.flatnonzero(support > 0)
+	edges = edges[np.argsort(-support[edges], kind = 'stable')]
+	with open(fname, 'w') as outfile:
+		for e, weight in zip(edges.tolist(), G.weights[edges].tolist()):
+			outfile.write( G.nodes[G.src[e]] + "\t" )
+			outfile.write( G.nodes[G.dst[e]] + "\t" )
+			outfile.write( str(weight) + "\t" )
+			outfile.write( str(support[e]) + "\n" )
@@ -0,0 +1,205 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import scipy.special
+import scipy.stats
+import scipy.stats.mstats
+
+import parallel_functions as par_fun
+
+# Columns of the z-score file written by fdr_rand_pijs_boxcox.py (the index column is 'ij')
+ZSCORE_COLUMNS = ['normaltest_before_boxcox', 'normaltest_after_boxcox', 'zscore_after_boxcox', 'two_sided_pval_for_zscore']
+
+# Box-Cox lambdas are first searched on the integer grid LAMBDA_GRID_MIN, ..., LAMBDA_GRID_MAX
+# and then refined by golden-section search between the neighbours of the best grid point
+LAMBDA_GRID_MIN = -10
+LAMBDA_GRID_MAX = 10
+GOLDEN_SECTION_ITERATIONS = 48
+
+# Z-score methods, see get_zscores_pvals
+ZSCORE_METHODS = ('batched', 'per_row')
+
+# Upper bound on the number of (path, trial) values handled at once by the batched method
+MAX_BLOCK_VALUES = 2**22
+# Number of paths handled at once by the per-row method
+PATHS_PER_ROW_BLOCK = 10000
+# Largest difference between the batched and per-row results accepted by check_zscore_methods.py
+ZSCORE_METHODS_TOLERANCE = 1e-6
+
+# We get a value, and a list as inputs
+# Apply Box-Cox transformation to the list to make sure it is normally distributed
+# Carry out normaltest to verify that it is normally distributed
+# Get z-score of that value in that list
+# Get p-value for that z-score, with the assumption that the distribution is normally distributed
+# Return tuple (normaltest before Box-Cox, normaltest after Box-Cox, z-score, two sided p-value of z-score)
+def get_zscore_pval_boxcox(val, list_vals):
+	list_vals.append(val)
+	normaltest_before_boxcox = scipy.stats.mstats.normaltest(list_vals)
+	list_vals_boxcox = scipy.stats.boxcox(list_vals)[0]
+	normaltest_after_boxcox = scipy.stats.mstats.normaltest(list_vals_boxcox)
+	new_val = list_vals_boxcox[-1]
+	list_vals = list_vals[:-1]
+	zscore = (new_val - np.mean(list_vals_boxcox))/np.std(list_vals_boxcox)
+	two_sided_zscore_pval = scipy.stats.norm.sf(abs(zscore))*2
+	return (normaltest_before_boxcox[1], normaltest_after_boxcox[1], zscore, two_sided_zscore_pval)
+
+# Variance of the Box-Cox transform of every row, up to a factor that does not depend on lambda
+# centered_log_values -> log of the values minus the mean log of each row, lmbda -> one lambda per row
+# With m the mean log of a row, the Box-Cox log-likelihood is -N*m - N/2 * log(var(expm1(lmbda*c)/lmbda))
+# (c = centered log values), so the maximum likelihood lambda is the one minimizing this variance
+def get_boxcox_var(centered_log_values, lmbda):
+	lmbda = lmbda[:, None]
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		transformed = np.expm1(lmbda*centered_log_values)/lmbda
+	transformed = np.where(lmbda == 0, centered_log_values, transformed)
+	return np.var(transformed, axis = 1)
+
+# Maximum likelihood Box-Cox lambda of every row of values (rows x samples), as scipy.stats.boxcox finds it
+# Rows must be positive, finite and not constant (the others get NaN)
+# All rows are searched at once: a shared grid of lambdas, followed by golden-section search
+# Rows whose best grid lambda is at the edge of the grid are handed to scipy.stats.boxcox_normmax
+def get_boxcox_lambdas(values):
+	lambdas = np.full(values.shape[0], np.nan)
+	valid = np.all(np.isfinite(values) & (values > 0), axis = 1) & np.any(values != values[:, :1], axis = 1)
+	if not np.any(valid):
+		return lambdas
+	log_values = np.log(values[valid])
+	centered_log_values = log_values - log_values.mean(axis = 1, keepdims = True)
+	num_rows = centered_log_values.shape[0]
+
+	grid = np.arange(LAMBDA_GRID_MIN, LAMBDA_GRID_MAX + 1, dtype = float)
+	grid_vars = np.column_stack([get_boxcox_var(centered_log_values, np.full(num_rows, l)) for l in grid])
+	best = np.argmin(grid_vars, axis = 1)
+
+	# Golden-section search on [best - 1, best + 1]
+	invphi = (np.sqrt(5) - 1)/2
+	a = grid[np.maximum(best - 1, 0)]
+	b = grid[np.minimum(best + 1, len(grid) - 1)]
+	c = b - invphi*(b - a)
+	d = a + invphi*(b - a)
+	fc = get_boxcox_var(centered_log_values, c)
+	fd = get_boxcox_var(centered_log_values, d)
+	for _ in range(GOLDEN_SECTION_ITERATIONS):
+		left = fc < fd # the minimum is in [a, d]
+		b = np.where(left, d, b)
+		a = np.where(left, a, c)
+		new = np.where(left, b - invphi*(b - a), a + invphi*(b - a))
+		f_new = get_boxcox_var(centered_log_values, new)
+		c, d, fc, fd = np.where(left, new, d), np.where(left, c, new), np.where(left, f_new, fd), np.where(left, fc, f_new)
+	valid_lambdas = (a + b)/2
+
+	at_edge = (best == 0) | (best == len(grid) - 1)
+	valid_rows = values[valid]
+	for k in np.flatnonzero(at_edge):
+		valid_lambdas[k] = scipy.stats.boxcox_normmax(valid_rows[k], method = 'mle')
+	lambdas[valid] = valid_lambdas
+	return lambdas
+
+# Batched version of get_zscore_pval_boxcox, for a block of paths at once
+# actual_values -> array (paths), randomized_values -> array (paths x trials)
+# Returns an array (paths x 4) with the columns of get_zscore_pval_boxcox
+# Rows that scipy.stats.boxcox rejects (not positive, not finite or constant) get NaN
+def get_zscores_pvals_boxcox_block(actual_values, randomized_values):
+	values = np.column_stack((randomized_values, actual_values)) # the actual value comes last, as in get_zscore_pval_boxcox
+	lambdas = get_boxcox_lambdas(values)
+	with np.errstate(all = 'ignore'):
+		values_boxcox = scipy.special.boxcox(values, lambdas[:, None])
+		zscores = (values_boxcox[:, -1] - np.mean(values_boxcox, axis = 1))/np.std(values_boxcox, axis = 1)
+		normaltest_before_boxcox = scipy.stats.normaltest(values, axis = 1)[1]
+		normaltest_after_boxcox = scipy.stats.normaltest(values_boxcox, axis = 1)[1]
+	two_sided_zscore_pvals = scipy.stats.norm.sf(np.abs(zscores))*2
+	return np.column_stack((normaltest_before_boxcox, normaltest_after_boxcox, zscores, two_sided_zscore_pvals))
+
+# Per-row version of get_zscores_pvals_boxcox_block, calling get_zscore_pval_boxcox for every path
+def get_zscores_pvals_boxcox_rows(actual_values, randomized_values):
+	results = np.empty((len(actual_values), len(ZSCORE_COLUMNS)))
+	for k in range(len(actual_values)):
+		results[k] = get_zscore_pval_boxcox(actual_values[k], list(randomized_values[k]))
+	return results
+
+# Set in each worker process by init_zscore_worker
+worker_values = None
+worker_shm = None
+
+# values are read from a shared memory block (values_shape and dtype float) instead of being pickled to
+# every worker. If no block name is given, values is the array itself (when run in the main process)
+def init_zscore_worker(shm_name, values_shape, values = None):
+	global worker_values, worker_shm
+	if shm_name is not None:
+		worker_shm = shared_memory.SharedMemory(name = shm_name)
+		values = np.ndarray(values_shape, dtype = float, buffer = worker_shm.buf)
+	worker_values = values
+
+# Z-scores of the rows start to end of the (paths x (1 + trials)) matrix, run in a worker process
+def get_zscores_chunk(args):
+	start, end, method = args
+	values = worker_values[start:end]
+	if method == 'batched':
+		return get_zscores_pvals_boxcox_block(values[:, 0], values[:, 1:])
+	return get_zscores_pvals_boxcox_rows(values[:, 0], values[:, 1:])
+
+# Box-Cox z-scores and p-values of all paths
+# values -> array (paths x (1 + trials)), column 0 -> actual cost, columns 1 to trials -> randomized costs
+# method -> 'batched' (get_zscores_pvals_boxcox_block) or 'per_row' (get_zscore_pval_boxcox for every path)
+# The batched method agrees with the per-row one to within ZSCORE_METHODS_TOLERANCE (the lambdas agree to the tolerance
+# of scipy's optimizer), as check_zscore_methods.py checks. Rows with a NaN (eg: a path through an edge dropped from a
+# randomized network) get NaN with the batched method, while the per-row method raises numpy.ma.MaskError
+# Rows are processed in blocks. With workers > 1, the blocks are spread over a pool of worker processes
+# which read the matrix from shared memory; results are collected in row order
+# num_trials -> None if every path has all trials, else the number of trials of every path (its randomized costs are
+# columns 1 to num_trials, eg: with adaptive randomizations, see adapt_fun.get_adaptive_randomized_path_costs)
+# Returns an array (paths x 4) with columns ZSCORE_COLUMNS
+def get_zscores_pvals(values, method = 'batched', workers = 1, num_trials = None):
+	if method not in ZSCORE_METHODS:
+		raise ValueError("Unknown z-score method " + method + ", use one of " + ", ".join(ZSCORE_METHODS))
+	if num_trials is not None:
+		# Paths with the same number of trials are scored together
+		results = np.empty((values.shape[0], len(ZSCORE_COLUMNS)))
+		for n in np.unique(num_trials):
+			rows = np.flatnonzero(num_trials == n)
+			print("Computing zscores of ", len(rows), " paths with ", n, " trials")
+			results[rows] = get_zscores_pvals(values[rows, :1 + n], method, workers)
+		return results
+	values = np.ascontiguousarray(values, dtype = float)
+	num_paths = values.shape[0]
+	rows_per_block = PATHS_PER_ROW_BLOCK if method == 'per_row' else max(1, MAX_BLOCK_VALUES // values.shape[1])
+	if workers > 1:
+		rows_per_block = max(1, min(rows_per_block, -(-num_paths // (4*workers)))) # at least 4 blocks per worker
+	chunks = [(start, min(start + rows_per_block, num_paths), method) for start in range(0, num_paths, rows_per_block)]
+
+	results = np.empty((num_paths, len(ZSCORE_COLUMNS)))
+	if workers <= 1 or num_paths == 0:
+		init_zscore_worker(None, values.shape, values)
+		for chunk in chunks:
+			results[chunk[0]:chunk[1]] = get_zscores_chunk(chunk)
+			print("Done working with ", chunk[1], "rows")
+		return results
+
+	shm = shared_memory.SharedMemory(create = True, size = values.nbytes)
+	try:
+		np.ndarray(values.shape, dtype = float, buffer = shm.buf)[:] = values
+		with par_fun.get_process_pool(workers, init_zscore_worker, (shm.name, values.shape)) as pool:
+			for chunk, chunk_results in zip(chunks, pool.imap(get_zscores_chunk, chunks)):
+				results[chunk[0]:chunk[1]] = chunk_results
+				print("Done working with ", chunk[1], "rows")
+	finally:
+		shm.close()
+		shm.unlink()
+	return results
+
+# Write the z-score file read by benjamini_hochberg_boxcox.py: one row per path (ij), columns ZSCORE_COLUMNS
+def write_zscores(out_fname, path_strings, zscores):
+	zscores = pd.DataFrame(zscores, index = path_strings, columns = ZSCORE_COLUMNS)
+	zscores.to_csv(out_fname, sep = '\t', index_label = 'ij', na_rep = 'nan')
+
+# Largest absolute difference between the batched and per-row results of values (as for get_zscores_pvals),
+# for every column of ZSCORE_COLUMNS. A value which is NaN with one method only counts as an infinite difference
+# Rows with a NaN are skipped, as the per-row method cannot score them
+def compare_zscore_methods(values):
+	values = values[~np.isnan(values).any(axis = 1)]
+	batched = get_zscores_pvals(values, 'batched')
+	per_row = get_zscores_pvals(values, 'per_row')
+	differences = np.abs(batched - per_row)
+	differences[np.isnan(batched) != np.isnan(per_row)] = np.inf
+	return np.fmax.reduce(differences, axis = 0, initial = 0.0)